@@ -1,84 +1,266 @@
 import os
-from flask import Flask, render_template, request, redirect, url_for, flash, session, send_from_directory
-from pymongo import MongoClient
+from flask import (Flask, Request, Response, render_template, request, redirect, url_for, flash,
+                   session, jsonify, stream_with_context, abort)
 from bson.objectid import ObjectId
-from werkzeug.utils import secure_filename
-from dotenv import load_dotenv
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.security import safe_join
+from pymongo.errors import DuplicateKeyError
 from datetime import datetime
+import threading
+import time
+import mimetypes
+import uuid
 import urllib.parse
+import click
+import config
+from database import MongoConnection, LazyDatabase
+from sqlite_store import SQLiteDatabase
+from search import ProductSearch
+from autocomplete import SuggestionIndex
+from pagination import (keyset_page, parse_page_size, product_totals, InvalidCursor,
+                        PRODUCT_CARD_PROJECTION, ADMIN_PRODUCT_PROJECTION)
+from cart_service import price_cart, UserCarts
+from product_cache import ProductCache
+from facets import ProductFilters, FacetCache, category_label, facets_from_products
+from invalidation import create_bus, PRODUCT_CHANNEL, USER_CHANNEL, SESSION_CHANNEL, CART_CHANNEL
+from auth import UserLoader, current_user, login_required, DEFAULT_NOTIFICATIONS, DEFAULT_ADDRESS
+from server_session import ServerSessionInterface
+from order_stats import ORDER_LIST_PROJECTION, get_user_stats, record_order
+from indexes import ensure_indexes, missing_indexes, check_query_shapes
+import image_pipeline
+from assets import AssetServer, is_fingerprinted
+from uploads import receive_upload, UploadError, extension
+from blobstore import BlobStore, is_blob_key
+from jobs import JobQueue, JobWorker
+import inventory
+from profiling import Instrumentation
+import catalog_io
+import order_export
+from migrations import MigrationRunner, MigrationLocked
 
-load_dotenv()
+# La importación del catálogo acepta archivos más grandes que el resto de
+# las rutas; el tope se aplica igual antes de leer el cuerpo
+class AppRequest(Request):
+    @property
+    def max_content_length(self):
+        if self.endpoint == 'catalog_import':
+            return config.CATALOG_IMPORT_MAX_BYTES
+        return super().max_content_length
 
 app = Flask(__name__)
-app.secret_key = os.getenv('SECRET_KEY', 'dev-secret-key-123')
-
-# Configuración de MongoDB para Render
-MONGO_URI = os.getenv('MONGO_URI')
-if not MONGO_URI:
-    # Si no hay MONGO_URI, usa una base de datos local (SQLite alternativa)
-    print("⚠️  MONGO_URI no encontrada. Usando modo sin base de datos.")
-    # Aquí podrías agregar una alternativa como SQLite
-
-try:
-    if MONGO_URI:
-        client = MongoClient(MONGO_URI)
-        db = client.get_database()
-        client.admin.command('ping')
-        print("✅ Conectado a MongoDB correctamente")
-    else:
-        db = None
-        print("⚠️  Modo sin base de datos activado")
-except Exception as e:
-    print(f"❌ Error conectando a MongoDB: {e}")
-    db = None
-    
-# Util: validar extensiones
-def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXT
-
-# Función helper para asegurar que el usuario tenga notificaciones
-def ensure_user_notifications(user):
-    if user is None:
-        return None
-    if 'notifications' not in user:
-        user['notifications'] = {
-            'email_promociones': True,
-            'email_pedidos': True,
-            'email_recetas': True,
-            'sms_notificaciones': False
-        }
-    return user
-
-# Función helper para asegurar que el usuario tenga dirección
-def ensure_user_address(user):
-    if user is None:
-        return None
-    if 'direccion' not in user:
-        user['direccion'] = {
-            'calle': '',
-            'numero_exterior': '',
-            'numero_interior': '',
-            'colonia': '',
-            'ciudad': 'Guadalajara',
-            'estado': 'Jalisco',
-            'codigo_postal': '',
-            'referencias': ''
-        }
-    return user
+app.request_class = AppRequest
+app.secret_key = config.SECRET_KEY
+app.config['UPLOAD_FOLDER'] = config.UPLOAD_FOLDER
+app.config['MAX_CONTENT_LENGTH'] = config.MAX_CONTENT_LENGTH
+os.makedirs(config.UPLOAD_FOLDER, exist_ok=True)
 
-# Función helper para obtener usuario seguro con todas las estructuras
-def get_safe_user(user_id):
-    if not user_id:
-        return None
-    
+# Archivos estáticos e imágenes con ETag fuerte, huella de contenido y, si se
+# configura, entrega por el proxy (X-Sendfile / X-Accel-Redirect)
+asset_server = AssetServer(
+    app.static_folder,
+    sendfile=config.SENDFILE_MODE,
+    max_age=config.STATIC_MAX_AGE,
+    accel_prefixes={
+        config.UPLOAD_FOLDER: config.X_ACCEL_IMAGES_PREFIX,
+        app.static_folder: config.X_ACCEL_STATIC_PREFIX
+    }
+)
+app.jinja_env.globals['asset_url'] = asset_server.url
+
+# Almacenamiento: MongoDB (Render) o SQLite embebido para un solo nodo. Ambos
+# exponen la misma interfaz de colecciones, así que las rutas no cambian.
+# El cliente de MongoDB se crea perezosamente en cada proceso (después del
+# fork de gunicorn), sin ping bloqueante al importar
+if config.STORAGE_BACKEND == 'mongo':
+    if not config.MONGO_URI:
+        raise RuntimeError("STORAGE_BACKEND=mongo requiere MONGO_URI")
+    mongo = MongoConnection(
+        config.MONGO_URI,
+        maxPoolSize=config.MONGO_MAX_POOL_SIZE,
+        minPoolSize=config.MONGO_MIN_POOL_SIZE,
+        maxIdleTimeMS=config.MONGO_MAX_IDLE_TIME_MS,
+        waitQueueTimeoutMS=config.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        connectTimeoutMS=config.MONGO_CONNECT_TIMEOUT_MS,
+        socketTimeoutMS=config.MONGO_SOCKET_TIMEOUT_MS,
+        serverSelectionTimeoutMS=config.MONGO_SERVER_SELECTION_TIMEOUT_MS
+    )
+    db = LazyDatabase(mongo)
+elif config.STORAGE_BACKEND == 'sqlite':
+    print(f"⚠️  Sin MongoDB: usando SQLite local en {config.SQLITE_PATH}")
+    mongo = None
+    db = SQLiteDatabase(config.SQLITE_PATH)
+else:
+    raise RuntimeError(f"STORAGE_BACKEND desconocido: {config.STORAGE_BACKEND}")
+
+# Instrumentación opcional por request: consultas y tiempo de base, render,
+# perfil por muestreo; se registra antes de que se cree el cliente de MongoDB
+instrumentation = None
+if config.INSTRUMENT:
+    instrumentation = Instrumentation(
+        app, db,
+        query_budget=config.QUERY_BUDGET,
+        panel=config.INSTRUMENT_PANEL,
+        profile_rate=config.PROFILE_SAMPLE_RATE,
+        profile_interval=config.PROFILE_INTERVAL_MS / 1000
+    )
+
+# Búsqueda del catálogo: 'mongo' (índice de texto) o 'local' (índice invertido en memoria)
+search_engine = ProductSearch(
+    db,
+    backend=config.SEARCH_BACKEND or ('mongo' if mongo is not None else 'local'),
+    limit=config.SEARCH_LIMIT
+)
+
+# Sugerencias del buscador (índice de prefijos en memoria, sin consultar la base)
+suggestion_index = SuggestionIndex(db)
+
+# Caché del catálogo en proceso; las rutas de admin la invalidan al escribir
+product_cache = ProductCache(
+    db.products,
+    maxsize=config.PRODUCT_CACHE_SIZE,
+    ttl=config.PRODUCT_CACHE_TTL,
+    snapshot_max=config.CATALOG_SNAPSHOT_MAX
+)
+
+# Conteos por categoría del catálogo (una agregación $facet por combinación de filtros)
+facet_cache = FacetCache(db.products, ttl=config.PRODUCT_CACHE_TTL)
+app.jinja_env.globals['category_label'] = category_label
+
+# Bus de invalidación entre workers: 'local', 'unix' (sockets) o 'mongo' (change stream)
+cache_bus = create_bus(config.CACHE_BUS, db=db, directory=config.CACHE_BUS_DIR)
+
+# Cambios de un producto: limpiar caché y reindexar la búsqueda en este worker
+def on_product_invalidated(pid):
+    product_cache.invalidate(pid)
+    facet_cache.invalidate()
+    search_engine.refresh_product(pid)
+    suggestion_index.refresh_product(pid)
+
+cache_bus.subscribe(PRODUCT_CHANNEL, on_product_invalidated)
+
+# Archivos subidos: una sola copia por contenido (SHA-256) en UPLOAD_FOLDER/ab/cd/,
+# con conteo de referencias en db.blobs
+blob_store = BlobStore(config.UPLOAD_FOLDER, db.blobs)
+
+# Guardar la imagen de un producto; las variantes se generan una sola vez por
+# contenido. Devuelve (clave del blob, variantes)
+def store_product_image(file):
+    received = receive_upload(file, blob_store.root,
+                              config.PRODUCT_IMAGE_MAX_BYTES, config.ALLOWED_EXT)
+    key, meta = blob_store.add(received)
+    return key, blob_variants(key, meta)
+
+# Variantes de un blob de imagen (se generan la primera vez y quedan en su documento)
+def blob_variants(key, meta):
+    variants = meta.get('variants')
+    if variants is None:
+        variants = image_pipeline.generate_variants(blob_store.root, key)
+        blob_store.set_meta(key, variants=variants)
+    return variants
+
+# Soltar la imagen de un producto; si nadie más la usa se borran archivo y variantes
+def release_product_image(producto):
+    image = producto.get('image')
+    if not image:
+        return
     try:
-        user = db.users.find_one({'_id': ObjectId(user_id)})
-        if user:
-            user = ensure_user_notifications(user)
-            user = ensure_user_address(user)
-        return user
-    except:
-        return None
+        if blob_store.release(image):
+            image_pipeline.remove_variants(blob_store.root, image, producto.get('image_variants'))
+            if is_blob_key(image):
+                blob_store.prune(image)
+    except Exception as e:
+        print(f"Error eliminando imagen: {e}")
+
+# Cola de trabajos en segundo plano (procesamiento de recetas, etc.)
+job_queue = JobQueue(
+    db.jobs,
+    visibility_timeout=config.JOB_VISIBILITY_TIMEOUT,
+    max_attempts=config.JOB_MAX_ATTEMPTS,
+    retry_delay=config.JOB_RETRY_DELAY,
+    keep_seconds=config.JOB_KEEP_SECONDS
+)
+job_worker = JobWorker(job_queue, threads=config.JOB_WORKERS, poll_interval=config.JOB_POLL_INTERVAL)
+
+# Arranque por proceso (una vez, en el primer request de cada worker)
+_process_started = None
+_process_lock = threading.Lock()
+
+@app.before_request
+def start_process_services():
+    global _process_started
+    if _process_started == os.getpid():
+        return
+    with _process_lock:
+        if _process_started == os.getpid():
+            return
+        _process_started = os.getpid()
+        # Crear/verificar índices (idempotente); desactivar con ENSURE_INDEXES=0
+        if config.ENSURE_INDEXES:
+            try:
+                for collection, name, status in ensure_indexes(db):
+                    if status != 'ok':
+                        print(f"⚠️  Índice {collection}.{name}: {status}")
+                job_queue.ensure_indexes()
+                session_interface.ensure_indexes()
+                user_carts.ensure_indexes()
+            except Exception as e:
+                print(f"❌ Error verificando índices: {e}")
+        # Los datos deben estar migrados antes de servir (flask migrate); si
+        # falta la 1, el cargador de usuarios completa los valores por defecto
+        try:
+            pending = MigrationRunner(db).pending()
+            user_loader.fill_defaults = any(version == 1 for version, _ in pending)
+            if pending:
+                print(f"⚠️  Migraciones pendientes: {', '.join(f'{v} {n}' for v, n in pending)} "
+                      f"(ejecuta `flask --app app migrate`)")
+        except Exception as e:
+            print(f"❌ Error revisando migraciones: {e}")
+        # Índice de sugerencias del catálogo de este proceso
+        try:
+            suggestion_index.ensure_built()
+        except Exception as e:
+            print(f"❌ Error construyendo sugerencias: {e}")
+    cache_bus.ensure_started()
+    job_worker.start()
+    
+# Usuario de la sesión: caché corta en proceso + carga única por request (flask.g)
+user_loader = UserLoader(db.users, ttl=config.USER_CACHE_TTL)
+app.extensions['user_loader'] = user_loader
+cache_bus.subscribe(USER_CHANNEL, user_loader.invalidate)
+
+# Sesiones del lado del servidor: la cookie solo lleva un id aleatorio y los
+# datos (usuario, carrito anónimo, mensajes) viven en db.sessions con TTL
+session_interface = ServerSessionInterface(
+    db.sessions,
+    ttl=config.SESSION_TTL,
+    cache_ttl=config.SESSION_CACHE_TTL,
+    publish=lambda sid: cache_bus.publish(SESSION_CHANNEL, sid)
+)
+app.session_interface = session_interface
+cache_bus.subscribe(SESSION_CHANNEL, session_interface.invalidate)
+
+# Carrito de usuarios con sesión iniciada, por id de usuario (entre dispositivos)
+user_carts = UserCarts(db.carts, ttl=config.USER_CART_TTL, cache_ttl=config.SESSION_CACHE_TTL)
+cache_bus.subscribe(CART_CHANNEL, user_carts.invalidate)
+
+# Carrito actual: el del usuario si inició sesión, si no el de la sesión anónima
+def load_cart():
+    user_id = session.get('user')
+    if user_id:
+        return user_carts.get(user_id)
+    return dict(session.get('cart', {}))
+
+def save_cart(cart):
+    user_id = session.get('user')
+    if user_id:
+        user_carts.save(user_id, cart)
+        cache_bus.publish(CART_CHANNEL, user_id)
+    else:
+        session['cart'] = cart
+
+@app.template_global()
+def cart_count():
+    return len(load_cart())
 
 # Context processor para año actual
 @app.context_processor
@@ -88,23 +270,52 @@ def inject_current_year():
 # RUTA: Home - catálogo con búsqueda
 @app.route('/')
 def index():
-    query = request.args.get('q', '')
+    query = request.args.get('q', '').strip()
+    filters = ProductFilters.from_args(request.args)
+    page = None
+    total = None
     if query:
-        productos = list(db.products.find({
-            '$or': [
-                {'name': {'$regex': query, '$options': 'i'}},
-                {'description': {'$regex': query, '$options': 'i'}}
-            ]
-        }))
+        # Búsqueda con precio/activo aplicados en la consulta; la categoría se
+        # filtra aquí para que las facetas cuenten los mismos resultados
+        results = search_engine.search(query, filter=filters.query(include_category=False))
+        facets = facets_from_products(results)
+        productos = [p for p in results if filters.matches_category(p)]
     else:
-        productos = list(db.products.find())
-    return render_template('index.html', productos=productos, query=query)
+        facets = facet_cache.get(filters)
+        page_size = parse_page_size(request.args.get('per_page'), config.PAGE_SIZE)
+        after = request.args.get('after')
+        try:
+            snapshot = None if filters else product_cache.snapshot()
+            if snapshot is not None:
+                page = snapshot.page(page_size, after)
+                total = len(snapshot)
+            else:
+                # Filtros resueltos por la base (índice category/created_at/_id)
+                page = keyset_page(db.products, filters.query(), projection=PRODUCT_CARD_PROJECTION,
+                                   page_size=page_size, after=after)
+                total = facets.count(filters.category)
+        except InvalidCursor:
+            return redirect(url_for('index', **filters.args()))
+        productos = page.items
+    return render_template('index.html', productos=productos, query=query, page=page, total=total,
+                           filters=filters, facets=facets)
+
+# RUTA: Sugerencias del buscador (JSON); se responden desde memoria
+@app.route('/search/suggest')
+def search_suggest():
+    query = request.args.get('q', '').strip()[:100]
+    result = suggestion_index.suggest(query, limit=config.SUGGEST_LIMIT)
+    for cat in result['categories']:
+        cat['url'] = url_for('index', category=cat['category'])
+    for prod in result['products']:
+        prod['url'] = url_for('product_detail', pid=prod['id'])
+    return jsonify(dict(result, query=query))
 
 # RUTA: Ver producto
 @app.route('/product/<pid>')
 def product_detail(pid):
     try:
-        producto = db.products.find_one({'_id': ObjectId(pid)})
+        producto = product_cache.get(pid)
         if not producto:
             flash('Producto no encontrado')
             return redirect(url_for('index'))
@@ -123,15 +334,20 @@ def add_to_cart(pid):
             return redirect(url_for('product_detail', pid=pid))
         
         # Verificar que el producto existe
-        producto = db.products.find_one({'_id': ObjectId(pid)})
+        producto = product_cache.get(pid)
         if not producto:
             flash('Producto no encontrado')
             return redirect(url_for('index'))
         
-        cart = session.get('cart', {})
+        cart = load_cart()
         str_pid = str(pid)
+        # Aviso temprano con las existencias en caché; el descuento real y
+        # definitivo se hace al confirmar el pedido
+        if inventory.tracks_stock(producto) and cart.get(str_pid, 0) + cantidad > producto['stock']:
+            flash(f'⚠️ Solo hay {max(producto["stock"], 0)} pieza(s) disponibles de {producto["name"]}')
+            return redirect(url_for('product_detail', pid=pid))
         cart[str_pid] = cart.get(str_pid, 0) + cantidad
-        session['cart'] = cart
+        save_cart(cart)
         flash(f'✅ {producto["name"]} añadido al carrito')
         return redirect(url_for('product_detail', pid=pid))
     except Exception as e:
@@ -140,32 +356,14 @@ def add_to_cart(pid):
 
 @app.route('/cart')
 def cart():
-    cart = session.get('cart', {})
-    items = []
-    total = 0.0
-    
-    for pid, qty in cart.items():
-        try:
-            prod = db.products.find_one({'_id': ObjectId(pid)})
-            if prod:
-                subtotal = float(prod['price']) * qty
-                total += subtotal
-                items.append({
-                    'producto': prod, 
-                    'cantidad': qty, 
-                    'subtotal': subtotal,
-                    'id': pid
-                })
-        except:
-            continue
-    
-    return render_template('cart.html', items=items, total=total)
+    priced = price_cart(db.products, load_cart(), cache=product_cache)
+    return render_template('cart.html', items=priced.items, total=priced.total)
 
 @app.route('/cart/update/<pid>', methods=['POST'])
 def update_cart(pid):
     try:
         cantidad = int(request.form.get('cantidad', 1))
-        cart = session.get('cart', {})
+        cart = load_cart()
         str_pid = str(pid)
         
         if cantidad <= 0:
@@ -174,7 +372,7 @@ def update_cart(pid):
         else:
             cart[str_pid] = cantidad
             
-        session['cart'] = cart
+        save_cart(cart)
         flash('Carrito actualizado')
     except:
         flash('Error al actualizar carrito')
@@ -183,68 +381,88 @@ def update_cart(pid):
 
 @app.route('/cart/remove/<pid>')
 def remove_from_cart(pid):
-    cart = session.get('cart', {})
+    cart = load_cart()
     str_pid = str(pid)
     if str_pid in cart:
         del cart[str_pid]
-        session['cart'] = cart
+        save_cart(cart)
         flash('Producto eliminado del carrito')
     return redirect(url_for('cart'))
 
 # RUTA: Checkout (simulado)
 @app.route('/checkout', methods=['GET','POST'])
 def checkout():
-    cart = session.get('cart', {})
+    # Llave de idempotencia del formulario: un doble envío no crea dos pedidos
+    idempotency_key = request.form.get('idempotency_key', '').strip()[:64] or None
+    if request.method == 'POST' and idempotency_key:
+        if db.orders.find_one({'idempotency_key': idempotency_key}, {'_id': 1}):
+            flash('✅ Tu orden ya fue registrada.')
+            return redirect(url_for('index'))
+
+    cart = load_cart()
     if not cart:
         flash('Carrito vacío')
         return redirect(url_for('index'))
-        
-    if request.method == 'POST':
-        user_email = request.form.get('email', '').strip()
-        address = request.form.get('address', '').strip()
-        
-        if not user_email:
-            flash('Por favor ingresa tu correo electrónico')
-            return redirect(url_for('checkout'))
-        
-        # Crear orden
-        order = {
-            'user_email': user_email,
-            'address': address,
-            'items': [],
-            'total': 0.0,
-            'status': 'pendiente',
-            'created_at': datetime.utcnow()
-        }
-        
-        total = 0.0
-        for pid, qty in cart.items():
-            try:
-                prod = db.products.find_one({'_id': ObjectId(pid)})
-                if prod:
-                    subtotal = float(prod['price']) * qty
-                    total += subtotal
-                    order['items'].append({
-                        'product_id': prod['_id'],
-                        'name': prod['name'],
-                        'qty': qty, 
-                        'price': prod['price'],
-                        'subtotal': subtotal
-                    })
-            except:
-                continue
-        
-        order['total'] = total
-        
-        try:
-            db.orders.insert_one(order)
-            session['cart'] = {}
-            flash('✅ ¡Orden creada con éxito! Te contactaremos pronto.')
-            return redirect(url_for('index'))
-        except Exception as e:
-            flash('Error al crear la orden')
     
-    return render_template('checkout.html')
+    if request.method != 'POST':
+        priced = price_cart(db.products, cart, cache=product_cache)
+        return render_template('checkout.html', items=priced.items, total=priced.total,
+                               idempotency_key=uuid.uuid4().hex)
+
+    user_email = request.form.get('email', '').strip()
+    address = request.form.get('address', '').strip()
+    
+    if not user_email:
+        flash('Por favor ingresa tu correo electrónico')
+        return redirect(url_for('checkout'))
+    
+    # Precios y existencias leídos de la base (no de la caché) al confirmar
+    priced = price_cart(db.products, cart)
+    if not priced:
+        flash('Los productos de tu carrito ya no están disponibles')
+        save_cart({})
+        return redirect(url_for('index'))
+    
+    # Descontar existencias con la condición de precio y stock; si algo no
+    # alcanza no se crea la orden y el carrito queda como estaba
+    try:
+        inventory.reserve(db.products, priced.items)
+    except inventory.StockError as e:
+        flash(f'⚠️ {e.message()}')
+        return redirect(url_for('cart'))
+    except Exception as e:
+        print(f"❌ Error reservando existencias: {e}")
+        flash('Error al crear la orden')
+        return redirect(url_for('checkout'))
+    
+    # Crear orden
+    order = {
+        'user_email': user_email,
+        'address': address,
+        'items': priced.order_items(),
+        'total': priced.total,
+        'status': 'pendiente',
+        'created_at': datetime.utcnow()
+    }
+    if idempotency_key:
+        order['idempotency_key'] = idempotency_key
+    
+    try:
+        db.orders.insert_one(order)
+    except DuplicateKeyError:
+        # Otro envío con la misma llave ganó la carrera: devolver lo descontado
+        inventory.release(db.products, priced.items)
+        flash('✅ Tu orden ya fue registrada.')
+        return redirect(url_for('index'))
+    except Exception as e:
+        inventory.release(db.products, priced.items)
+        flash('Error al crear la orden')
+        return redirect(url_for('checkout'))
+    
+    record_order(db, order)
+    save_cart({})
+    flash('✅ ¡Orden creada con éxito! Te contactaremos pronto.')
+    return redirect(url_for('index'))
 
 # RUTA: Registro
 @app.route('/register', methods=['GET','POST'])
@@ -273,22 +491,8 @@ def register():
             'telefono': telefono,
             'created_at': datetime.utcnow(),
             'role': 'user',
-            'notifications': {
-                'email_promociones': True,
-                'email_pedidos': True,
-                'email_recetas': True,
-                'sms_notificaciones': False
-            },
-            'direccion': {
-                'calle': '',
-                'numero_exterior': '',
-                'numero_interior': '',
-                'colonia': '',
-                'ciudad': 'Guadalajara',
-                'estado': 'Jalisco',
-                'codigo_postal': '',
-                'referencias': ''
-            }
+            'notifications': dict(DEFAULT_NOTIFICATIONS),
+            'direccion': dict(DEFAULT_ADDRESS)
         }
         
         try:
@@ -308,8 +512,15 @@ def login():
         
         user = db.users.find_one({'email': email, 'password': password})
         if user:
+            # Nuevo id de sesión al iniciar sesión; el carrito anónimo se
+            # suma al que el usuario ya tenía guardado
+            session.regenerate()
             session['user'] = str(user['_id'])
             session['user_email'] = user['email']
+            anon_cart = session.pop('cart', None)
+            if anon_cart:
+                user_carts.merge(session['user'], anon_cart)
+                cache_bus.publish(CART_CHANNEL, session['user'])
             flash(f'✅ Bienvenido {user.get("nombre", user["email"])}')
             return redirect(url_for('index'))
         flash('❌ Credenciales incorrectas')
@@ -325,15 +536,9 @@ def logout():
 
 # RUTA: Perfil principal
 @app.route('/profile')
+@login_required
 def profile():
-    user_id = session.get('user')
-    if not user_id:
-        return redirect(url_for('login'))
-    
-    user = get_safe_user(user_id)
-    if not user:
-        flash('Usuario no encontrado')
-        return redirect(url_for('login'))
+    user = current_user()
     
     # Obtener órdenes y recetas de forma segura
     try:
@@ -348,48 +553,37 @@ def profile():
 
 # RUTA: Historial completo de compras
 @app.route('/profile/order-history')
+@login_required
 def order_history():
-    user_id = session.get('user')
-    if not user_id:
-        return redirect(url_for('login'))
-    
-    user = get_safe_user(user_id)
-    if not user:
-        flash('Usuario no encontrado')
-        return redirect(url_for('login'))
+    user = current_user()
     
-    # Obtener todos los pedidos del usuario
+    # Pedidos paginados; las estadísticas vienen del resumen precalculado
+    page_size = parse_page_size(request.args.get('per_page'), config.ORDER_PAGE_SIZE)
     try:
-        orders = list(db.orders.find({'user_email': user['email']}).sort('created_at', -1))
+        page = keyset_page(db.orders, {'user_email': user['email']},
+                           projection=ORDER_LIST_PROJECTION, page_size=page_size,
+                           after=request.args.get('after'))
+        orders = page.items
+        stats = get_user_stats(db, user['email'])
+    except InvalidCursor:
+        return redirect(url_for('order_history'))
     except Exception as e:
+        page = None
         orders = []
+        stats = {'total_orders': 0, 'total_spent': 0.0, 'pending_orders': 0, 'completed_orders': 0}
         print(f"Error obteniendo historial de pedidos: {e}")
     
-    # Estadísticas
-    total_orders = len(orders)
-    total_spent = sum(order.get('total', 0) for order in orders)
-    pending_orders = len([order for order in orders if order.get('status') == 'pendiente'])
-    completed_orders = len([order for order in orders if order.get('status') == 'completado'])
-    
     return render_template('order_history.html', 
                          user=user,
                          orders=orders,
-                         total_orders=total_orders,
-                         total_spent=total_spent,
-                         pending_orders=pending_orders,
-                         completed_orders=completed_orders)
+                         page=page,
+                         **stats)
 
 # RUTA: Detalle de pedido individual
 @app.route('/profile/order/<order_id>')
+@login_required
 def order_detail(order_id):
-    user_id = session.get('user')
-    if not user_id:
-        return redirect(url_for('login'))
-    
-    user = get_safe_user(user_id)
-    if not user:
-        flash('Usuario no encontrado')
-        return redirect(url_for('login'))
+    user = current_user()
     
     try:
         order = db.orders.find_one({'_id': ObjectId(order_id), 'user_email': user['email']})
@@ -404,15 +598,9 @@ def order_detail(order_id):
 
 # RUTA: Reordenar pedido
 @app.route('/profile/order/<order_id>/reorder', methods=['POST'])
+@login_required
 def reorder(order_id):
-    user_id = session.get('user')
-    if not user_id:
-        return redirect(url_for('login'))
-    
-    user = get_safe_user(user_id)
-    if not user:
-        flash('Usuario no encontrado')
-        return redirect(url_for('login'))
+    user = current_user()
     
     try:
         # Obtener el pedido original
@@ -428,7 +616,11 @@ def reorder(order_id):
                 product_id = str(item['product_id'])
                 cart[product_id] = item.get('qty', 1)
         
-        session['cart'] = cart
+        # Descartar en una sola consulta los productos que ya no existen
+        priced = price_cart(db.products, cart, cache=product_cache)
+        save_cart(priced.as_session_cart())
+        if priced.missing:
+            flash(f'⚠️ {len(priced.missing)} producto(s) del pedido ya no están disponibles')
         flash('✅ Productos añadidos al carrito. Revisa y completa tu pedido.')
         return redirect(url_for('cart'))
         
@@ -438,15 +630,9 @@ def reorder(order_id):
 
 # RUTA: Editar perfil
 @app.route('/profile/edit', methods=['GET', 'POST'])
+@login_required
 def edit_profile():
-    user_id = session.get('user')
-    if not user_id:
-        return redirect(url_for('login'))
-    
-    user = get_safe_user(user_id)
-    if not user:
-        flash('Usuario no encontrado')
-        return redirect(url_for('login'))
+    user = current_user()
     
     if request.method == 'POST':
         # Actualizar información del usuario
@@ -473,9 +659,10 @@ def edit_profile():
         
         try:
             db.users.update_one(
-                {'_id': ObjectId(user_id)},
+                {'_id': user['_id']},
                 {'$set': update_data}
             )
+            cache_bus.publish(USER_CHANNEL, user['_id'])
             flash('✅ Perfil actualizado correctamente')
             return redirect(url_for('profile'))
         except Exception as e:
@@ -485,23 +672,18 @@ def edit_profile():
 
 # RUTA: Cambiar contraseña
 @app.route('/profile/change-password', methods=['GET', 'POST'])
+@login_required
 def change_password():
-    user_id = session.get('user')
-    if not user_id:
-        return redirect(url_for('login'))
-    
-    user = get_safe_user(user_id)
-    if not user:
-        flash('Usuario no encontrado')
-        return redirect(url_for('login'))
+    user = current_user()
     
     if request.method == 'POST':
         current_password = request.form.get('current_password')
         new_password = request.form.get('new_password')
         confirm_password = request.form.get('confirm_password')
         
-        # Verificar contraseña actual (en producción usar hashing)
-        if user.get('password') != current_password:
+        # Verificar contraseña actual (en producción usar hashing);
+        # la contraseña no viaja en la caché de usuarios
+        if not db.users.find_one({'_id': user['_id'], 'password': current_password}, {'_id': 1}):
             flash('❌ La contraseña actual es incorrecta')
             return redirect(url_for('change_password'))
         
@@ -515,12 +697,13 @@ def change_password():
         
         try:
             db.users.update_one(
-                {'_id': ObjectId(user_id)},
+                {'_id': user['_id']},
                 {'$set': {
                     'password': new_password,
                     'updated_at': datetime.utcnow()
                 }}
             )
+            cache_bus.publish(USER_CHANNEL, user['_id'])
             flash('✅ Contraseña actualizada correctamente')
             return redirect(url_for('profile'))
         except Exception as e:
@@ -530,15 +713,9 @@ def change_password():
 
 # RUTA: Mis recetas
 @app.route('/profile/prescriptions')
+@login_required
 def my_prescriptions():
-    user_id = session.get('user')
-    if not user_id:
-        return redirect(url_for('login'))
-    
-    user = get_safe_user(user_id)
-    if not user:
-        flash('Usuario no encontrado')
-        return redirect(url_for('login'))
+    user = current_user()
     
     try:
         prescriptions = list(db.prescriptions.find({'email': user['email']}).sort('uploaded_at', -1))
@@ -547,31 +724,32 @@ def my_prescriptions():
     
     return render_template('my_prescriptions.html', prescriptions=prescriptions, user=user)
 
+# RUTA: Archivo de una receta, solo para su dueño (o admin) y sin caché
+@app.route('/profile/prescriptions/<pid>/file')
+@login_required
+def prescription_file(pid):
+    user = current_user()
+    try:
+        prescription = db.prescriptions.find_one({'_id': ObjectId(pid)}, {'email': 1, 'filename': 1})
+    except Exception:
+        abort(404)
+    if prescription is None or (prescription.get('email') != user['email'] and user.get('role') != 'admin'):
+        abort(404)
+    return asset_server.send(blob_store.root, prescription['filename'], private=True)
+
 # RUTA: Direcciones guardadas
 @app.route('/profile/addresses')
+@login_required
 def my_addresses():
-    user_id = session.get('user')
-    if not user_id:
-        return redirect(url_for('login'))
-    
-    user = get_safe_user(user_id)
-    if not user:
-        flash('Usuario no encontrado')
-        return redirect(url_for('login'))
+    user = current_user()
     
     return render_template('my_addresses.html', user=user)
 
 # RUTA: Configuración de notificaciones
 @app.route('/profile/notifications', methods=['GET', 'POST'])
+@login_required
 def notification_settings():
-    user_id = session.get('user')
-    if not user_id:
-        return redirect(url_for('login'))
-    
-    user = get_safe_user(user_id)
-    if not user:
-        flash('Usuario no encontrado')
-        return redirect(url_for('login'))
+    user = current_user()
     
     if request.method == 'POST':
         notification_settings = {
@@ -584,9 +762,10 @@ def notification_settings():
         
         try:
             db.users.update_one(
-                {'_id': ObjectId(user_id)},
+                {'_id': user['_id']},
                 {'$set': {'notifications': notification_settings}}
             )
+            cache_bus.publish(USER_CHANNEL, user['_id'])
             flash('✅ Configuración de notificaciones actualizada')
             return redirect(url_for('profile'))
         except Exception as e:
@@ -610,15 +789,16 @@ def upload_prescription():
             flash('Por favor selecciona un archivo')
             return redirect(request.url)
         
-        if not allowed_file(file.filename):
-            flash('Tipo de archivo no permitido. Use PNG, JPG, JPEG o GIF')
+        try:
+            received = receive_upload(file, blob_store.root,
+                                      config.PRESCRIPTION_MAX_BYTES, config.PRESCRIPTION_EXT)
+        except UploadError as e:
+            flash(f'❌ {e}')
             return redirect(request.url)
         
+        filename = None
         try:
-            filename = secure_filename(f"{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}_{file.filename}")
-            path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(path)
-            
+            filename, _ = blob_store.add(received)
             doc = {
                 'email': user_email, 
                 'filename': filename,
@@ -629,13 +809,96 @@ def upload_prescription():
             }
             
             db.prescriptions.insert_one(doc)
+            # El resto (revisión del archivo, etc.) corre fuera del request
+            job_queue.enqueue('prescription.process', {'prescription_id': doc['_id']})
             flash('✅ Receta subida correctamente. Será revisada por nuestro equipo.')
             return redirect(url_for('index'))
         except Exception as e:
+            if filename:
+                blob_store.release(filename)
             flash('Error al subir la receta')
     
     return render_template('upload_prescription.html')
 
+# Trabajo: revisar el archivo de una receta recién subida y pasarla de
+# 'pending' a 'processed' (lista para la revisión del equipo)
+@job_queue.handler('prescription.process')
+def process_prescription(payload):
+    prescription = db.prescriptions.find_one({'_id': payload['prescription_id']})
+    if prescription is None or prescription.get('status') != 'pending':
+        return 'omitida'
+    path = os.path.join(blob_store.root, prescription['filename'])
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"Archivo de receta no encontrado: {prescription['filename']}")
+    info = {
+        'size': os.path.getsize(path),
+        'content_type': mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    }
+    if info['content_type'].startswith('image/'):
+        size = image_pipeline.image_size(path)
+        if size:
+            info['width'], info['height'] = size
+    db.prescriptions.update_one(
+        {'_id': prescription['_id'], 'status': 'pending'},
+        {'$set': {'status': 'processed', 'processed_at': datetime.utcnow(), 'file': info}}
+    )
+    return 'processed'
+
+# Imágenes de la importación del catálogo: una clave del blob store o un
+# nombre de archivo dentro de `images_dir`. Cada archivo se importa una vez
+# por corrida; los demás productos que lo usan solo suman una referencia
+def catalog_image_resolver(images_dir):
+    resolved = {}
+
+    def resolve(name):
+        if name in resolved:
+            key, variants = resolved[name]
+            return (key, variants) if blob_store.incref(key) else None
+        if is_blob_key(name):
+            meta = blob_store.incref(name)
+            if meta is None:
+                return None
+            key = name
+        else:
+            path = safe_join(images_dir, name) if images_dir else None
+            if not path or not os.path.isfile(path) or extension(path) not in config.ALLOWED_EXT:
+                return None
+            key, meta = blob_store.import_file(path)
+        resolved[name] = (key, blob_variants(key, meta))
+        return resolved[name]
+
+    return resolve
+
+# Importar un archivo del catálogo (CSV/JSONL) por lotes; al final se
+# invalida el catálogo completo en todos los workers
+def import_catalog(path, fmt, batch_size=None, images_dir=None, progress=None):
+    importer = catalog_io.CatalogImporter(
+        db.products,
+        batch_size=batch_size or config.CATALOG_BATCH_SIZE,
+        resolve_image=catalog_image_resolver(images_dir or config.CATALOG_IMAGES_DIR),
+        release_image=release_product_image,
+        progress=progress
+    )
+    try:
+        with open(path, 'rb') as stream:
+            return importer.run(stream, fmt)
+    finally:
+        cache_bus.publish(PRODUCT_CHANNEL)
+
+# Trabajo: importación subida desde Admin. El avance se guarda en el trabajo
+# (y renueva su plazo) después de cada lote
+@job_queue.handler('catalog.import')
+def run_catalog_import(payload):
+    def progress(report):
+        job_queue.heartbeat({'payload.import_id': payload['import_id']}, progress=report.as_dict())
+
+    try:
+        report = import_catalog(payload['path'], payload['format'], progress=progress)
+    finally:
+        if os.path.exists(payload['path']):
+            os.remove(payload['path'])
+    return report.as_dict()
+
 # RUTA: Admin - gestionar productos
 @app.route('/admin/products', methods=['GET','POST'])
 def admin_products():
@@ -649,6 +912,12 @@ def admin_products():
         desc = request.form.get('description', '').strip()
         category = request.form.get('category', 'general').strip()
         
+        try:
+            stock = inventory.parse_stock(request.form.get('stock'))
+        except ValueError:
+            flash('Existencias inválidas')
+            return redirect(url_for('admin_products'))
+        
         if not name or not price:
             flash('Nombre y precio son obligatorios')
             return redirect(url_for('admin_products'))
@@ -664,12 +933,12 @@ def admin_products():
         
         file = request.files.get('image')
         filename = None
+        variants = None
         if file and file.filename != '':
-            if allowed_file(file.filename):
-                filename = secure_filename(f"{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}_{file.filename}")
-                file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-            else:
-                flash('Tipo de imagen no permitido')
+            try:
+                filename, variants = store_product_image(file)
+            except UploadError as e:
+                flash(f'❌ {e}')
                 return redirect(url_for('admin_products'))
         
         prod = {
@@ -678,23 +947,135 @@ def admin_products():
             'description': desc,
             'category': category,
             'image': filename,
+            'image_variants': variants,
             'created_at': datetime.utcnow(),
             'active': True
         }
+        if stock is not None:
+            prod['stock'] = stock
         
         try:
             db.products.insert_one(prod)
+            cache_bus.publish(PRODUCT_CHANNEL, prod['_id'])
             flash('✅ Producto creado exitosamente')
             return redirect(url_for('admin_products'))
         except Exception as e:
+            release_product_image(prod)
             flash('Error al crear producto')
     
+    page_size = parse_page_size(request.args.get('per_page'), config.ADMIN_PAGE_SIZE)
     try:
-        productos = list(db.products.find().sort('created_at', -1))
+        page = keyset_page(db.products, projection=ADMIN_PRODUCT_PROJECTION,
+                           page_size=page_size, after=request.args.get('after'))
+        productos = page.items
+        totals = product_totals(db.products)
+    except InvalidCursor:
+        return redirect(url_for('admin_products'))
     except:
+        page = None
         productos = []
+        totals = {'total': 0, 'active': 0, 'with_image': 0, 'with_category': 0}
     
-    return render_template('admin_products.html', productos=productos)
+    try:
+        imports = recent_catalog_imports()
+    except Exception:
+        imports = []
+    
+    return render_template('admin_products.html', productos=productos, page=page, totals=totals,
+                           imports=imports, order_statuses=order_export.STATUSES)
+
+# RUTA: Importar catálogo (solo admin). El archivo se guarda por bloques y
+# se procesa en la cola de trabajos; la página de admin muestra el avance
+@app.route('/admin/catalog/import', methods=['POST'])
+def catalog_import():
+    if not session.get('user'):
+        flash('Por favor inicia sesión')
+        return redirect(url_for('login'))
+    file = request.files.get('catalog')
+    if not file or file.filename == '':
+        flash('Selecciona un archivo CSV o JSONL')
+        return redirect(url_for('admin_products'))
+    fmt = catalog_io.detect_format(file.filename, default=None)
+    if fmt is None:
+        flash('❌ Tipo de archivo no permitido. Use CSV o JSONL')
+        return redirect(url_for('admin_products'))
+    import_id = uuid.uuid4().hex
+    os.makedirs(config.CATALOG_IMPORT_FOLDER, exist_ok=True)
+    path = os.path.join(config.CATALOG_IMPORT_FOLDER, f"{import_id}.{fmt}")
+    file.save(path)
+    # Una importación a medias no se repite (los renglones sin id ni sku se duplicarían)
+    job_queue.enqueue('catalog.import', {'import_id': import_id, 'path': path, 'format': fmt,
+                                         'filename': file.filename}, max_attempts=1)
+    flash(f'✅ Importación de {file.filename} en proceso')
+    return redirect(url_for('admin_products'))
+
+# RUTA: Estado de las últimas importaciones del catálogo (solo admin)
+@app.route('/admin/catalog/imports')
+def catalog_imports():
+    if not session.get('user'):
+        flash('Por favor inicia sesión')
+        return redirect(url_for('login'))
+    return jsonify([dict(job, _id=str(job['_id'])) for job in recent_catalog_imports()])
+
+def recent_catalog_imports(limit=5):
+    return list(db.jobs.find(
+        {'name': 'catalog.import'},
+        {'payload.filename': 1, 'status': 1, 'progress': 1, 'result': 1, 'error': 1,
+         'created_at': 1, 'finished_at': 1}
+    ).sort('created_at', -1).limit(limit))
+
+# RUTA: Exportar catálogo (solo admin) en CSV o JSONL, en streaming desde el
+# cursor: memoria constante sin importar el tamaño del catálogo
+@app.route('/admin/catalog/export')
+def catalog_export():
+    if not session.get('user'):
+        flash('Por favor inicia sesión')
+        return redirect(url_for('login'))
+    fmt = request.args.get('format', 'csv')
+    if fmt not in catalog_io.FORMATS:
+        flash('Formato de exportación inválido')
+        return redirect(url_for('admin_products'))
+    rows = catalog_io.export_rows(db.products, fmt, batch_size=config.CATALOG_BATCH_SIZE)
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    filename = f"catalogo-{datetime.utcnow():%Y%m%d}.{fmt}"
+    return Response(stream_with_context(rows), mimetype=f'{mimetype}; charset=utf-8',
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+# RUTA: Exportar pedidos (solo admin) en CSV o JSONL, filtrados por fechas
+# (?from=&to=, AAAA-MM-DD) y estado (?status=, repetible). Se entrega en
+# streaming desde el cursor: memoria constante aunque sea un año de pedidos.
+# ?lines=1 exporta un renglón por producto
+@app.route('/admin/orders/export')
+def orders_export():
+    if not session.get('user'):
+        flash('Por favor inicia sesión')
+        return redirect(url_for('login'))
+    fmt = request.args.get('format', 'csv')
+    try:
+        if fmt not in order_export.FORMATS:
+            raise ValueError('Formato de exportación inválido')
+        filters = order_export.OrderFilters.from_args(request.args)
+    except ValueError as e:
+        flash(f'❌ {e}')
+        return redirect(url_for('admin_products'))
+    rows = order_export.export_orders(db.orders, filters, fmt, lines=request.args.get('lines') == '1',
+                         batch_size=config.ORDER_EXPORT_BATCH_SIZE)
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(stream_with_context(rows), mimetype=f'{mimetype}; charset=utf-8',
+                    headers={'Content-Disposition': f'attachment; filename="{filters.filename(fmt)}"'})
+
+# RUTA: Reporte de pedidos (solo admin): conteo e ingresos por día y por
+# estado con los mismos filtros que la exportación
+@app.route('/admin/orders/report')
+def orders_report():
+    if not session.get('user'):
+        flash('Por favor inicia sesión')
+        return redirect(url_for('login'))
+    try:
+        filters = order_export.OrderFilters.from_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(order_export.order_report(db.orders, filters))
 
 # RUTA: Eliminar producto (solo admin)
 @app.route('/admin/products/delete/<pid>', methods=['POST'])
@@ -714,14 +1095,9 @@ def delete_product(pid):
         result = db.products.delete_one({'_id': ObjectId(pid)})
         
         if result.deleted_count > 0:
-            # También eliminar la imagen si existe
-            if producto.get('image'):
-                try:
-                    image_path = os.path.join(app.config['UPLOAD_FOLDER'], producto['image'])
-                    if os.path.exists(image_path):
-                        os.remove(image_path)
-                except Exception as e:
-                    print(f"Error eliminando imagen: {e}")
+            cache_bus.publish(PRODUCT_CHANNEL, pid)
+            # También soltar la imagen (se borra si ningún otro producto la usa)
+            release_product_image(producto)
             
             flash('✅ Producto eliminado correctamente')
         else:
@@ -740,6 +1116,7 @@ def edit_product(pid):
         return redirect(url_for('login'))
     
     try:
+        # Sin caché: el formulario muestra las existencias actuales
         producto = db.products.find_one({'_id': ObjectId(pid)})
         if not producto:
             flash('Producto no encontrado')
@@ -756,32 +1133,37 @@ def edit_product(pid):
                 'updated_at': datetime.utcnow()
             }
             
+            try:
+                stock = inventory.parse_stock(request.form.get('stock'))
+                stock_original = inventory.parse_stock(request.form.get('stock_original'))
+            except ValueError:
+                flash('❌ Existencias inválidas')
+                return redirect(url_for('edit_product', pid=pid))
+            update = {'$set': update_data}
+            if stock is None:
+                update['$unset'] = {'stock': ''}
+            elif stock_original is not None and inventory.tracks_stock(producto):
+                # Ajuste relativo: no pisa las ventas hechas mientras se editaba
+                if stock != stock_original:
+                    update['$inc'] = {'stock': stock - stock_original}
+            else:
+                update_data['stock'] = stock
+            
             # Manejar nueva imagen si se subió
             file = request.files.get('image')
             if file and file.filename != '':
-                if allowed_file(file.filename):
-                    # Eliminar imagen anterior si existe
-                    if producto.get('image'):
-                        try:
-                            old_image_path = os.path.join(app.config['UPLOAD_FOLDER'], producto['image'])
-                            if os.path.exists(old_image_path):
-                                os.remove(old_image_path)
-                        except Exception as e:
-                            print(f"Error eliminando imagen anterior: {e}")
-                    
-                    # Guardar nueva imagen
-                    filename = secure_filename(f"{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}_{file.filename}")
-                    file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                    update_data['image'] = filename
-                else:
-                    flash('Tipo de imagen no permitido')
+                # Guardar nueva imagen; la anterior se suelta al guardar el producto
+                try:
+                    update_data['image'], update_data['image_variants'] = store_product_image(file)
+                except UploadError as e:
+                    flash(f'❌ {e}')
                     return redirect(url_for('edit_product', pid=pid))
             
             try:
-                db.products.update_one(
-                    {'_id': ObjectId(pid)},
-                    {'$set': update_data}
-                )
+                db.products.update_one({'_id': ObjectId(pid)}, update)
+                if 'image' in update_data:
+                    release_product_image(producto)
+                cache_bus.publish(PRODUCT_CHANNEL, pid)
                 flash('✅ Producto actualizado correctamente')
                 return redirect(url_for('admin_products'))
             except Exception as e:
@@ -793,10 +1175,61 @@ def edit_product(pid):
         flash('❌ Error al cargar el producto')
         return redirect(url_for('admin_products'))
 
-# Ruta para servir imágenes estáticas
-@app.route('/images/<filename>')
+# RUTA: Métricas de la caché de productos (solo admin)
+@app.route('/admin/cache-stats')
+def cache_stats():
+    if not session.get('user'):
+        flash('Por favor inicia sesión')
+        return redirect(url_for('login'))
+    return jsonify(dict(product_cache.stats(), facets=facet_cache.stats(), users=user_loader.stats(),
+                        suggestions=suggestion_index.stats(), sessions=session_interface.stats(),
+                        carts=user_carts.stats(), bus=cache_bus.stats()))
+
+# RUTA: Últimos requests instrumentados (INSTRUMENT=1, solo admin)
+@app.route('/admin/requests')
+def request_stats():
+    if not session.get('user'):
+        flash('Por favor inicia sesión')
+        return redirect(url_for('login'))
+    if instrumentation is None:
+        return jsonify({'error': 'Instrumentación desactivada (INSTRUMENT=1)'}), 404
+    return jsonify(instrumentation.stats())
+
+# RUTA: Estado de la conexión y del pool de MongoDB de este worker (solo admin)
+@app.route('/admin/db-stats')
+def db_stats():
+    if not session.get('user'):
+        flash('Por favor inicia sesión')
+        return redirect(url_for('login'))
+    return jsonify(mongo.stats() if mongo else db.stats())
+
+# Ruta para servir imágenes estáticas. Con ?v=thumb|medium|full entrega la
+# variante redimensionada en el mejor formato que acepte el navegador.
+# Los nombres con huella de contenido se cachean como inmutables. Las recetas
+# comparten el blob store pero solo salen por prescription_file
+@app.route('/images/<path:filename>')
 def images(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    immutable = is_blob_key(filename) or is_fingerprinted(filename)
+    if is_blob_key(filename) and db.prescriptions.find_one({'filename': filename}, {'_id': 1}):
+        abort(404)
+    variant = request.args.get('v')
+    if variant:
+        name = image_pipeline.pick_variant(app.config['UPLOAD_FOLDER'], filename,
+                                           variant, request.accept_mimetypes)
+        if name:
+            return asset_server.send(app.config['UPLOAD_FOLDER'], name,
+                                     immutable=immutable, vary='Accept')
+    return asset_server.send(app.config['UPLOAD_FOLDER'], filename, immutable=immutable)
+
+# CSS/JS con huella de contenido (ver asset_url en las plantillas)
+@app.route('/assets/<path:filename>')
+def assets(filename):
+    return asset_server.send_asset(filename)
+
+# srcset de las imágenes de producto para las plantillas
+@app.template_global()
+def image_srcset(producto):
+    return image_pipeline.srcset(url_for, producto)
 
 # Ruta para limpiar la base de datos (solo desarrollo)
 @app.route('/admin/clean')
@@ -806,50 +1239,175 @@ def admin_clean():
         db.users.delete_many({})
         db.orders.delete_many({})
         db.prescriptions.delete_many({})
+        cache_bus.publish(PRODUCT_CHANNEL)
         flash('Base de datos limpiada (solo desarrollo)')
     return redirect(url_for('index'))
 
-# Ruta para migrar usuarios existentes (solo desarrollo)
-@app.route('/admin/migrate-users')
-def migrate_users():
-    if app.debug:  # Solo en modo desarrollo
-        users = db.users.find({})
-        updated_count = 0
-        
-        for user in users:
-            update_data = {}
-            
-            # Agregar notificaciones si no existen
-            if 'notifications' not in user:
-                update_data['notifications'] = {
-                    'email_promociones': True,
-                    'email_pedidos': True,
-                    'email_recetas': True,
-                    'sms_notificaciones': False
-                }
-            
-            # Agregar dirección si no existe
-            if 'direccion' not in user:
-                update_data['direccion'] = {
-                    'calle': '',
-                    'numero_exterior': '',
-                    'numero_interior': '',
-                    'colonia': '',
-                    'ciudad': 'Guadalajara',
-                    'estado': 'Jalisco',
-                    'codigo_postal': '',
-                    'referencias': ''
-                }
-            
-            if update_data:
-                db.users.update_one(
-                    {'_id': user['_id']},
-                    {'$set': update_data}
-                )
-                updated_count += 1
-        
-        flash(f'✅ {updated_count} usuarios migrados correctamente')
-    return redirect(url_for('index'))
+# CLI: flask --app app indexes [--check]
+@app.cli.command('indexes')
+@click.option('--check', is_flag=True, help='Solo reportar índices faltantes y consultas sin índice')
+def indexes_command(check):
+    if not check:
+        for collection, name, status in ensure_indexes(db):
+            click.echo(f"{collection}.{name}: {status}")
+    for collection, name in missing_indexes(db):
+        click.echo(f"❌ Falta índice {collection}.{name}")
+    for collection, query, problem in check_query_shapes(db):
+        click.echo(f"🐢 {collection} {query}: {problem}")
+
+# Generar las variantes de imágenes de productos que aún no las tienen
+@app.cli.command('images')
+@click.option('--force', is_flag=True, help='Regenerar también las que ya tienen variantes')
+def images_command(force):
+    if not image_pipeline.enabled():
+        raise click.ClickException('Pillow no está instalado (pip install Pillow)')
+    query = {'image': {'$nin': [None, '']}}
+    if not force:
+        query['image_variants'] = None
+    for producto in db.products.find(query, {'image': 1}):
+        variants = image_pipeline.generate_variants(app.config['UPLOAD_FOLDER'], producto['image'])
+        db.products.update_one({'_id': producto['_id']}, {'$set': {'image_variants': variants}})
+        cache_bus.publish(PRODUCT_CHANNEL, producto['_id'])
+        click.echo(f"{producto['image']}: {variants['widths'] if variants else 'sin variantes'}")
+
+# Cola de trabajos: estado, o procesarla en primer plano (proceso aparte)
+@app.cli.command('jobs')
+@click.option('--work', is_flag=True, help='Procesar trabajos hasta Ctrl+C')
+@click.option('--threads', default=2, show_default=True, help='Hilos con --work')
+def jobs_command(work, threads):
+    if work:
+        job_queue.ensure_indexes()
+        worker = JobWorker(job_queue, threads=threads, poll_interval=config.JOB_POLL_INTERVAL)
+        worker.start()
+        try:
+            worker.join()
+        except KeyboardInterrupt:
+            worker.stop()
+        return
+    for status, count in job_queue.stats().items():
+        click.echo(f"{status}: {count}")
+
+# Estado del blob store; con --migrate mueve los archivos con nombre anterior
+# (timestamp_nombre.ext) al almacenamiento por contenido
+@app.cli.command('blobs')
+@click.option('--migrate', is_flag=True, help='Migrar imágenes y recetas con nombres anteriores')
+def blobs_command(migrate):
+    if migrate:
+        folder = blob_store.root
+        for collection, field in (('products', 'image'), ('prescriptions', 'filename')):
+            for doc in db[collection].find({field: {'$nin': [None, '']}}, {field: 1, 'image_variants': 1}):
+                name = doc[field]
+                path = os.path.join(folder, name)
+                if is_blob_key(name) or not os.path.isfile(path):
+                    continue
+                key, meta = blob_store.import_file(path)
+                update = {field: key}
+                if collection == 'products':
+                    update['image_variants'] = meta.get('variants')
+                    if update['image_variants'] is None:
+                        update['image_variants'] = image_pipeline.generate_variants(folder, key)
+                        blob_store.set_meta(key, variants=update['image_variants'])
+                db[collection].update_one({'_id': doc['_id']}, {'$set': update})
+                if collection == 'products':
+                    cache_bus.publish(PRODUCT_CHANNEL, doc['_id'])
+                    image_pipeline.remove_variants(folder, name, doc.get('image_variants'))
+                if not db[collection].find_one({field: name}, {'_id': 1}):
+                    os.remove(path)
+                click.echo(f"{collection}: {name} -> {key}")
+    for name, value in blob_store.stats().items():
+        click.echo(f"{name}: {value}")
+
+# Importar el catálogo desde un archivo CSV/JSONL (upsert por id o sku)
+@app.cli.command('catalog-import')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(catalog_io.FORMATS), help='Por defecto según la extensión')
+@click.option('--batch-size', default=config.CATALOG_BATCH_SIZE, show_default=True, help='Renglones por bulk_write')
+@click.option('--images', type=click.Path(exists=True, file_okay=False), help='Carpeta de imágenes (por nombre de archivo)')
+def catalog_import_command(path, fmt, batch_size, images):
+    ensure_indexes(db, ['products'])
+
+    def progress(report):
+        elapsed = time.perf_counter() - report.started
+        click.echo(f"\r{report.rows} renglones, {report.rows / elapsed:.0f}/s", nl=False)
+
+    report = import_catalog(path, fmt or catalog_io.detect_format(path), batch_size, images, progress)
+    click.echo('')
+    for lineno, message in report.errors:
+        click.echo(f"❌ Línea {lineno}: {message}")
+    if report.failed > len(report.errors):
+        click.echo(f"... y {report.failed - len(report.errors)} errores más")
+    click.echo(f"✅ {report.rows} renglones en {report.elapsed:.1f}s ({report.rows_per_sec:.0f}/s): "
+               f"{report.inserted} nuevos, {report.updated} actualizados, {report.unchanged} sin cambios, "
+               f"{report.failed} con error, {report.images} con imagen")
+
+# Exportar el catálogo a un archivo (o a la salida estándar)
+@app.cli.command('catalog-export')
+@click.option('--format', 'fmt', type=click.Choice(catalog_io.FORMATS), default='csv', show_default=True)
+@click.option('--output', type=click.File('w', encoding='utf-8'), default='-', help='Archivo de salida')
+def catalog_export_command(fmt, output):
+    started = time.perf_counter()
+    rows = 0
+    for line in catalog_io.export_rows(db.products, fmt, batch_size=config.CATALOG_BATCH_SIZE):
+        output.write(line)
+        rows += 1
+    if fmt == 'csv':
+        rows -= 1
+    elapsed = time.perf_counter() - started
+    click.echo(f"✅ {rows} productos en {elapsed:.1f}s ({rows / elapsed if elapsed else 0:.0f}/s)", err=True)
+
+# Exportar pedidos a un archivo (o a la salida estándar)
+@app.cli.command('orders-export')
+@click.option('--from', 'start', help='Fecha inicial AAAA-MM-DD (inclusive)')
+@click.option('--to', 'end', help='Fecha final AAAA-MM-DD (inclusive)')
+@click.option('--status', multiple=True, type=click.Choice(order_export.STATUSES), help='Repetible')
+@click.option('--format', 'fmt', type=click.Choice(order_export.FORMATS), default='csv', show_default=True)
+@click.option('--lines', is_flag=True, help='Un renglón por producto (CSV)')
+@click.option('--output', type=click.File('w', encoding='utf-8'), default='-', help='Archivo de salida')
+def orders_export_command(start, end, status, fmt, lines, output):
+    try:
+        filters = order_export.OrderFilters.parse(start, end, status)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    started = time.perf_counter()
+    size = 0
+    for chunk in order_export.export_orders(db.orders, filters, fmt, lines=lines, batch_size=config.ORDER_EXPORT_BATCH_SIZE):
+        output.write(chunk)
+        size += len(chunk)
+    click.echo(f"✅ {size / (1024 * 1024):.1f}MB en {time.perf_counter() - started:.1f}s", err=True)
+
+# Migraciones de datos versionadas (migrations.py): estado, o aplicar las
+# pendientes en lotes con checkpoint; si se interrumpe, se reanuda
+@app.cli.command('migrate')
+@click.option('--status', 'show_status', is_flag=True, help='Solo mostrar el estado')
+@click.option('--to', 'target', type=int, help='Aplicar hasta esta versión (inclusive)')
+@click.option('--batch-size', default=config.MIGRATION_BATCH_SIZE, show_default=True, help='Documentos por lote')
+def migrate_command(show_status, target, batch_size):
+    runner = MigrationRunner(db, batch_size=batch_size)
+    if not show_status:
+        def progress(version, counts):
+            detail = ', '.join(f"{name}={value}" for name, value in counts.items())
+            click.echo(f"\r{version}: {detail}", nl=False)
+
+        try:
+            applied = runner.run(target, progress)
+        except MigrationLocked as e:
+            raise click.ClickException(str(e))
+        finally:
+            click.echo('')
+        if applied:
+            user_loader.invalidate()
+            cache_bus.publish(USER_CHANNEL)
+        click.echo(f"✅ {len(applied)} migración(es) aplicada(s)")
+    for version, name, doc in runner.status():
+        state = doc.get('status') if doc else 'pendiente'
+        counts = ', '.join(f"{k}={v}" for k, v in (doc or {}).get('counts', {}).items())
+        click.echo(f"{version:>4} {name}: {state}{' (' + counts + ')' if counts else ''}")
+
+# Cuerpo más grande que MAX_CONTENT_LENGTH: se rechaza sin leerlo completo
+@app.errorhandler(RequestEntityTooLarge)
+def request_too_large(error):
+    flash(f'❌ El archivo es demasiado grande (máximo {request.max_content_length // (1024 * 1024)}MB)')
+    return redirect(request.referrer or url_for('index'))
 
 # Manejo de errores 404
 @app.errorhandler(404)
@@ -0,0 +1,119 @@
+# assets.py - Entrega de archivos con huella de contenido, ETag fuerte y caché larga
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+
+from flask import abort, current_app, request, url_for
+from werkzeug.security import safe_join
+from werkzeug.utils import send_file
+
+# Un año: las URLs con huella nunca cambian de contenido
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+HASH_LENGTH = 12
+SENDFILE_MODES = ('', 'x-sendfile', 'x-accel')
+
+# nombre.<huella>.ext (y variantes: nombre.<huella>.thumb.webp)
+_HASHED_RE = re.compile(r'^(?P<stem>.+)\.(?P<hash>[0-9a-f]{%d})(?P<rest>(\.[A-Za-z0-9]+)+)$' % HASH_LENGTH)
+
+
+# SHA-256 de archivos; se recalcula solo si cambian mtime o tamaño
+class FileDigests:
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def digest(self, path):
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._cache.get(path)
+        if cached and cached[0] == signature:
+            return cached[1]
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b''):
+                sha.update(chunk)
+        value = sha.hexdigest()
+        with self._lock:
+            if len(self._cache) >= self.maxsize:
+                self._cache.clear()
+            self._cache[path] = (signature, value)
+        return value
+
+
+digests = FileDigests()
+
+
+def is_fingerprinted(filename):
+    return _HASHED_RE.match(os.path.basename(filename)) is not None
+
+
+class AssetServer:
+    def __init__(self, static_folder, sendfile='', max_age=300, accel_prefixes=None):
+        if sendfile not in SENDFILE_MODES:
+            raise ValueError(f"SENDFILE_MODE inválido: {sendfile}")
+        self.static_folder = static_folder
+        self.sendfile = sendfile
+        self.max_age = max_age
+        # carpeta -> prefijo interno de nginx para X-Accel-Redirect
+        self.accel_prefixes = {os.path.abspath(k): v for k, v in (accel_prefixes or {}).items()}
+
+    # URL con huella de un archivo de static/: css/styles.css -> /assets/css/styles.<huella>.css
+    def url(self, filename):
+        path = safe_join(self.static_folder, filename)
+        if path is None or not os.path.isfile(path):
+            return url_for('static', filename=filename)
+        stem, ext = os.path.splitext(filename)
+        return url_for('assets', filename=f"{stem}.{digests.digest(path)[:HASH_LENGTH]}{ext}")
+
+    # Resolver /assets/<nombre con huella>; la huella vieja de un deploy anterior
+    # sirve el archivo actual, pero sin caché inmutable
+    def send_asset(self, filename):
+        match = _HASHED_RE.match(filename)
+        if not match:
+            return self.send(self.static_folder, filename)
+        real_name = match.group('stem') + match.group('rest')
+        path = safe_join(self.static_folder, real_name)
+        if path is None or not os.path.isfile(path):
+            abort(404)
+        current = digests.digest(path)[:HASH_LENGTH]
+        return self.send(self.static_folder, real_name, immutable=current == match.group('hash'))
+
+    # Enviar un archivo con ETag fuerte (SHA-256), 304 condicional y Cache-Control.
+    # Con SENDFILE_MODE el proxy (nginx/Apache) transmite los bytes, no el worker.
+    # private=True: datos de un usuario, ni el navegador ni un proxy los guardan
+    def send(self, folder, filename, immutable=False, vary=None, private=False):
+        path = safe_join(folder, filename)
+        if path is None or not os.path.isfile(path):
+            abort(404)
+        etag = digests.digest(path)
+        max_age = IMMUTABLE_MAX_AGE if immutable else self.max_age
+        if self.sendfile == 'x-accel':
+            prefix = self.accel_prefixes.get(os.path.abspath(folder))
+            if prefix is None:
+                raise RuntimeError(f"Sin prefijo X-Accel para {folder}")
+            response = current_app.response_class(
+                mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+            response.headers['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + filename.replace(os.sep, '/')
+            response.set_etag(etag)
+            response.make_conditional(request)
+        else:
+            response = send_file(path, request.environ, etag=etag, max_age=max_age,
+                                 use_x_sendfile=self.sendfile == 'x-sendfile',
+                                 response_class=current_app.response_class)
+        if private:
+            response.cache_control.public = False
+            response.cache_control.max_age = None
+            response.cache_control.private = True
+            response.cache_control.no_store = True
+            return response
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+        if immutable:
+            response.cache_control.immutable = True
+        if vary:
+            response.vary.add(vary)
+        return response
@@ -0,0 +1,92 @@
+# auth.py - Carga del usuario por request y decorador login_required
+import copy
+from functools import wraps
+
+from bson.objectid import ObjectId
+from flask import current_app, flash, g, redirect, session, url_for
+
+from product_cache import TTLCache
+
+# La contraseña nunca se carga ni se guarda en la caché. El resto del
+# documento es chico (perfil, dirección, notificaciones: pedidos, recetas y
+# resumen viven en sus colecciones) y las vistas de /profile lo usan completo
+USER_PROJECTION = {'password': 0}
+
+# Valores de un usuario nuevo (register); los usuarios anteriores los
+# reciben con la migración 1 (flask migrate)
+DEFAULT_NOTIFICATIONS = {
+    'email_promociones': True,
+    'email_pedidos': True,
+    'email_recetas': True,
+    'sms_notificaciones': False
+}
+DEFAULT_ADDRESS = {
+    'calle': '',
+    'numero_exterior': '',
+    'numero_interior': '',
+    'colonia': '',
+    'ciudad': 'Guadalajara',
+    'estado': 'Jalisco',
+    'codigo_postal': '',
+    'referencias': ''
+}
+
+
+# Caché corta de documentos de usuario, llave = id de usuario de la sesión.
+# Por usuario y no por id de sesión: las ediciones del perfil invalidan por
+# user_id (USER_CHANNEL) y varias sesiones del mismo usuario comparten entrada
+class UserLoader:
+    def __init__(self, users, ttl=30, maxsize=2048):
+        self.users = users
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        # Mientras la migración 1 no esté aplicada, completar en memoria a los
+        # usuarios que aún no tienen notificaciones o dirección
+        self.fill_defaults = True
+
+    def get(self, user_id):
+        if not user_id:
+            return None
+        user = self.cache.get(user_id)
+        if user is None:
+            try:
+                user = self.users.find_one({'_id': ObjectId(user_id)}, USER_PROJECTION)
+            except Exception:
+                return None
+            if user is None:
+                return None
+            if self.fill_defaults:
+                user.setdefault('notifications', copy.deepcopy(DEFAULT_NOTIFICATIONS))
+                user.setdefault('direccion', copy.deepcopy(DEFAULT_ADDRESS))
+            self.cache.set(user_id, user)
+        return dict(user)
+
+    # Invalidar después de editar el perfil (user_id=None limpia todo)
+    def invalidate(self, user_id=None):
+        if user_id is None:
+            self.cache.clear()
+        else:
+            self.cache.delete(str(user_id))
+
+    def stats(self):
+        return self.cache.stats()
+
+
+# Usuario de la sesión, cargado una sola vez por request en flask.g
+def current_user():
+    if 'current_user' not in g:
+        loader = current_app.extensions['user_loader']
+        g.current_user = loader.get(session.get('user'))
+    return g.current_user
+
+
+# Exigir sesión iniciada y un usuario existente antes de entrar a la vista
+def login_required(view):
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if not session.get('user'):
+            return redirect(url_for('login'))
+        if current_user() is None:
+            flash('Usuario no encontrado')
+            return redirect(url_for('login'))
+        return view(*args, **kwargs)
+    return wrapped
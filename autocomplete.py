@@ -0,0 +1,147 @@
+# autocomplete.py - Sugerencias mientras se escribe (índice de prefijos en memoria)
+import bisect
+import threading
+
+from bson.objectid import ObjectId
+
+from facets import category_label
+from search import fold_accents
+
+SUGGEST_PROJECTION = {'name': 1, 'price': 1, 'category': 1}
+
+# Máximo de entradas que se revisan por consulta (prefijos muy cortos)
+MAX_SCAN = 200
+
+
+def _normalize(text):
+    return ' '.join(fold_accents(text).split())
+
+
+# Llaves de un nombre: el nombre completo y cada sufijo que empieza en una
+# palabra, para que "400" encuentre "Ibuprofeno 400mg". Devuelve [(posición, llave)]
+def _name_keys(name):
+    words = _normalize(name).split(' ')
+    return [(i, ' '.join(words[i:])) for i in range(len(words)) if words[i]]
+
+
+# Arreglo ordenado de (llave, posición, pid): un prefijo se resuelve con una
+# búsqueda binaria y un recorrido corto, sin tocar la base de datos. Se
+# construye una vez por proceso y se actualiza producto por producto
+class SuggestionIndex:
+    def __init__(self, db):
+        self.db = db
+        self._keys = []           # [(llave, posición, pid)] ordenado
+        self._products = {}       # pid -> {'name', 'price', 'category'}
+        self._categories = {}     # categoría -> conteo
+        self._category_keys = []  # [(etiqueta normalizada, categoría)] ordenado
+        self._built = False
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._products)
+
+    def ensure_built(self):
+        if self._built:
+            return
+        with self._lock:
+            if not self._built:
+                self.rebuild()
+
+    def rebuild(self):
+        keys = []
+        products = {}
+        for prod in self.db.products.find({}, SUGGEST_PROJECTION):
+            pid = str(prod['_id'])
+            products[pid] = self._entry(prod)
+            keys.extend((key, pos, pid) for pos, key in _name_keys(prod.get('name')))
+        keys.sort()
+        with self._lock:
+            self._keys = keys
+            self._products = products
+            self._categories = {}
+            self._category_keys = []
+            for entry in products.values():
+                self._count_category(entry['category'], 1)
+            self._built = True
+
+    # Releer un producto después de escribirlo (pid=None: reconstruir)
+    def refresh_product(self, pid):
+        if not self._built:
+            return
+        if pid is None:
+            self._built = False
+            return
+        prod = self.db.products.find_one({'_id': ObjectId(pid)}, SUGGEST_PROJECTION)
+        with self._lock:
+            self._remove(str(pid))
+            if prod:
+                self._add(str(prod['_id']), prod)
+
+    @staticmethod
+    def _entry(prod):
+        return {
+            'name': prod.get('name') or '',
+            'price': prod.get('price'),
+            'category': prod.get('category') or 'general'
+        }
+
+    def _add(self, pid, prod):
+        entry = self._entry(prod)
+        self._products[pid] = entry
+        for pos, key in _name_keys(entry['name']):
+            bisect.insort(self._keys, (key, pos, pid))
+        self._count_category(entry['category'], 1)
+
+    def _remove(self, pid):
+        entry = self._products.pop(pid, None)
+        if entry is None:
+            return
+        for pos, key in _name_keys(entry['name']):
+            i = bisect.bisect_left(self._keys, (key, pos, pid))
+            if i < len(self._keys) and self._keys[i] == (key, pos, pid):
+                del self._keys[i]
+        self._count_category(entry['category'], -1)
+
+    def _count_category(self, category, delta):
+        count = self._categories.get(category, 0) + delta
+        if count > 0:
+            if category not in self._categories:
+                bisect.insort(self._category_keys, (_normalize(category_label(category)), category))
+            self._categories[category] = count
+        elif category in self._categories:
+            del self._categories[category]
+            self._category_keys.remove((_normalize(category_label(category)), category))
+
+    # Productos cuyo nombre (o una de sus palabras) empieza con `prefix`;
+    # primero los que empiezan así desde la primera palabra
+    def suggest(self, prefix, limit=8):
+        prefix = _normalize(prefix)
+        if not prefix:
+            return {'categories': [], 'products': []}
+        self.ensure_built()
+        with self._lock:
+            matches = {}
+            i = bisect.bisect_left(self._keys, (prefix,))
+            end = min(len(self._keys), i + MAX_SCAN)
+            while i < end:
+                key, pos, pid = self._keys[i]
+                if not key.startswith(prefix):
+                    break
+                if pos < matches.get(pid, pos + 1):
+                    matches[pid] = pos
+                i += 1
+            ranked = sorted(matches.items(), key=lambda m: (m[1] > 0, self._products[m[0]]['name'].lower()))
+            products = [dict(self._products[pid], id=pid) for pid, _ in ranked[:limit]]
+
+            categories = []
+            j = bisect.bisect_left(self._category_keys, (prefix,))
+            while j < len(self._category_keys) and self._category_keys[j][0].startswith(prefix):
+                category = self._category_keys[j][1]
+                categories.append({'category': category, 'label': category_label(category),
+                                   'count': self._categories[category]})
+                j += 1
+        return {'categories': categories[:3], 'products': products}
+
+    def stats(self):
+        return {'built': self._built, 'products': len(self._products),
+                'keys': len(self._keys), 'categories': len(self._categories)}
@@ -0,0 +1,473 @@
+# bench.py - Benchmark de extremo a extremo de las rutas de la tienda
+#
+#   python bench.py --storage sqlite --reset                  # en proceso (test client)
+#   python bench.py --storage mongo --mongo-uri mongodb://localhost:27017/bench --reset --gunicorn
+#   python bench.py --url http://127.0.0.1:5000 --storage mongo --mongo-uri ...   # servidor ya corriendo
+#   python bench.py ... --json resultados.json --compare base.json
+#
+# Siembra un catálogo sintético (tamaño configurable), corre recorridos de
+# usuario con varios hilos y reporta throughput y latencias p50/p95/p99 por ruta
+import argparse
+import http.client
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from collections import defaultdict
+from datetime import datetime, timedelta
+from http.cookies import SimpleCookie
+
+BENCH_PASSWORD = 'bench123'
+ADMIN_EMAIL = 'bench-admin@bench.local'
+
+_DRUGS = ['Paracetamol', 'Ibuprofeno', 'Naproxeno', 'Amoxicilina', 'Loratadina', 'Omeprazol',
+          'Metformina', 'Losartán', 'Diclofenaco', 'Ácido fólico', 'Vitamina C', 'Vitamina D',
+          'Complejo B', 'Cetirizina', 'Ambroxol', 'Salbutamol', 'Protector solar', 'Crema hidratante',
+          'Gasas', 'Vendas', 'Alcohol', 'Jabón neutro', 'Shampoo', 'Suero oral']
+_FORMS = ['tabletas', 'cápsulas', 'jarabe', 'gotas', 'crema', 'gel', 'spray', 'sobres']
+_DOSES = ['100mg', '200mg', '250mg', '400mg', '500mg', '1g', '10ml', '120ml']
+
+
+# ---------------------------------------------------------------- datos
+
+def _product(rng, i, categories, now):
+    name = f"{rng.choice(_DRUGS)} {rng.choice(_DOSES)} {rng.choice(_FORMS)}"
+    return {
+        'name': name,
+        'price': round(rng.uniform(15, 950), 2),
+        'description': f"{name}. Producto de prueba #{i} para benchmark.",
+        'category': rng.choice(categories),
+        'stock': rng.randint(0, 500),
+        'active': rng.random() > 0.05,
+        'created_at': now - timedelta(minutes=i)
+    }
+
+
+def _order(rng, email, products, now):
+    from order_export import STATUSES
+
+    items = []
+    for prod in rng.sample(products, rng.randint(1, 4)):
+        qty = rng.randint(1, 3)
+        items.append({'product_id': prod['_id'], 'name': prod['name'], 'qty': qty,
+                      'price': prod['price'], 'subtotal': prod['price'] * qty})
+    return {
+        'user_email': email,
+        'address': 'Av. Benchmark 123',
+        'items': items,
+        'total': sum(item['subtotal'] for item in items),
+        'status': rng.choice(STATUSES),
+        'created_at': now - timedelta(minutes=rng.randint(0, 365 * 24 * 60))
+    }
+
+
+def _insert_batches(collection, docs, batch=1000):
+    for start in range(0, len(docs), batch):
+        collection.insert_many(docs[start:start + batch], ordered=False)
+
+
+# Catálogo, usuarios y pedidos sintéticos; los usuarios "pesados" tienen
+# historial largo para medir order_history
+def seed_dataset(db, products=2000, users=200, heavy_users=5, heavy_orders=500,
+                 orders_per_user=3, seed=42):
+    from auth import DEFAULT_ADDRESS, DEFAULT_NOTIFICATIONS
+    from facets import CATEGORY_LABELS
+    from indexes import ensure_indexes
+
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    categories = list(CATEGORY_LABELS)
+
+    print(f"🌱 Sembrando {products} productos, {users} usuarios ({heavy_users} pesados)...")
+    ensure_indexes(db)
+    catalog = [_product(rng, i, categories, now) for i in range(products)]
+    _insert_batches(db.products, catalog)
+
+    accounts = [{'email': ADMIN_EMAIL, 'password': BENCH_PASSWORD, 'role': 'admin',
+                 'nombre': 'Admin Bench', 'created_at': now}]
+    accounts += [{'email': f'bench-user-{i}@bench.local', 'password': BENCH_PASSWORD, 'role': 'user',
+                  'nombre': f'Usuario {i}', 'created_at': now} for i in range(users)]
+    for account in accounts:
+        account['notifications'] = dict(DEFAULT_NOTIFICATIONS)
+        account['direccion'] = dict(DEFAULT_ADDRESS)
+    _insert_batches(db.users, accounts)
+
+    orders = []
+    for i in range(users):
+        count = heavy_orders if i < heavy_users else orders_per_user
+        orders.extend(_order(rng, f'bench-user-{i}@bench.local', catalog, now) for _ in range(count))
+    _insert_batches(db.orders, orders)
+    print(f"✅ {len(catalog)} productos, {len(accounts)} usuarios, {len(orders)} pedidos")
+
+
+def reset_dataset(db):
+    for name in ('products', 'users', 'orders', 'order_stats', 'prescriptions',
+                 'sessions', 'carts', 'jobs'):
+        db[name].delete_many({})
+
+
+# Datos que usan los recorridos: ids de productos, términos de búsqueda y usuarios
+class Dataset:
+    def __init__(self, db, heavy_users):
+        self.product_ids = [str(p['_id']) for p in db.products.find({'active': {'$ne': False}}, {'_id': 1})]
+        if not self.product_ids:
+            raise SystemExit("❌ La base no tiene productos; use --reset para sembrar")
+        self.terms = ['para', 'ibu', 'vitamina', 'crema 120ml', 'jarabe', 'omeprazol 20mg', 'gel']
+        self.users = [u['email'] for u in db.users.find({'email': {'$regex': '^bench-user-'}}, {'email': 1})]
+        self.heavy_users = [f'bench-user-{i}@bench.local' for i in range(heavy_users)]
+
+
+# ---------------------------------------------------------------- clientes
+
+# Cliente HTTP con conexión keep-alive y la cookie de sesión (uno por usuario virtual)
+class HttpSession:
+    def __init__(self, base_url):
+        parsed = urllib.parse.urlsplit(base_url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.cookies = {}
+        self.conn = None
+
+    def request(self, method, path, form=None):
+        body = urllib.parse.urlencode(form) if form is not None else None
+        headers = {'Accept': 'text/html'}
+        if body is not None:
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{k}={v}' for k, v in self.cookies.items())
+        for attempt in (1, 2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            try:
+                self.conn.request(method, path, body=body, headers=headers)
+                response = self.conn.getresponse()
+                response.read()
+                break
+            except (http.client.HTTPException, ConnectionError):
+                self.conn.close()
+                self.conn = None
+                if attempt == 2:
+                    raise
+        for header in response.headers.get_all('Set-Cookie') or []:
+            cookie = SimpleCookie(header)
+            for key, morsel in cookie.items():
+                if morsel['expires'] and morsel.value == '':
+                    self.cookies.pop(key, None)
+                else:
+                    self.cookies[key] = morsel.value
+        return response.status
+
+
+# Mismo contrato sobre el test client de Flask (sin red ni gunicorn)
+class FlaskSession:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, form=None):
+        return self.client.open(path, method=method, data=form).status_code
+
+
+# ---------------------------------------------------------------- recorridos
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)   # ruta -> [ms]
+        self.errors = defaultdict(int)
+        self.recording = False
+        self._lock = threading.Lock()
+
+    def timed(self, client, route, method, path, form=None):
+        start = time.perf_counter()
+        try:
+            status = client.request(method, path, form)
+        except Exception:
+            status = 599
+        elapsed = (time.perf_counter() - start) * 1000
+        if self.recording:
+            with self._lock:
+                self.latencies[route].append(elapsed)
+                if status >= 500:
+                    self.errors[route] += 1
+        return status
+
+
+def browse(client, rec, data, rng):
+    rec.timed(client, 'index', 'GET', '/')
+    rec.timed(client, 'index?q', 'GET', '/?' + urllib.parse.urlencode({'q': rng.choice(data.terms)}))
+    for pid in rng.sample(data.product_ids, 2):
+        rec.timed(client, 'product_detail', 'GET', f'/product/{pid}')
+
+
+def buy(client, rec, data, rng):
+    for pid in rng.sample(data.product_ids, rng.randint(1, 3)):
+        rec.timed(client, 'add_to_cart', 'POST', f'/cart/add/{pid}', {'cantidad': rng.randint(1, 3)})
+    rec.timed(client, 'cart', 'GET', '/cart')
+    rec.timed(client, 'checkout', 'POST', '/checkout',
+              {'email': rng.choice(data.users) if data.users else 'anon@bench.local', 'address': 'Calle 1'})
+
+
+def history(client, rec, data, rng):
+    email = rng.choice(data.heavy_users or data.users)
+    rec.timed(client, 'login', 'POST', '/login', {'email': email, 'password': BENCH_PASSWORD})
+    rec.timed(client, 'order_history', 'GET', '/profile/order-history')
+    rec.timed(client, 'logout', 'GET', '/logout')
+
+
+def admin(client, rec, data, rng):
+    rec.timed(client, 'login', 'POST', '/login', {'email': ADMIN_EMAIL, 'password': BENCH_PASSWORD})
+    rec.timed(client, 'admin_products', 'GET', '/admin/products')
+    rec.timed(client, 'logout', 'GET', '/logout')
+
+
+JOURNEYS = {'browse': browse, 'buy': buy, 'history': history, 'admin': admin}
+DEFAULT_MIX = 'browse=5,buy=2,history=1,admin=1'
+
+
+def parse_mix(text):
+    mix = []
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name not in JOURNEYS:
+            raise SystemExit(f"❌ Recorrido desconocido: {name} (opciones: {', '.join(JOURNEYS)})")
+        mix.append((JOURNEYS[name], float(weight or 1)))
+    return mix
+
+
+def run(make_client, data, mix, concurrency, duration, warmup, seed):
+    rec = Recorder()
+    stop_at = [None]
+    journeys, weights = zip(*mix)
+
+    def worker(n):
+        rng = random.Random(seed + n)
+        client = make_client()
+        while stop_at[0] is None or time.monotonic() < stop_at[0]:
+            rng.choices(journeys, weights)[0](client, rec, data, rng)
+
+    threads = [threading.Thread(target=worker, args=(n,), daemon=True) for n in range(concurrency)]
+    print(f"🔥 Calentando {warmup}s con {concurrency} usuario(s)...")
+    for thread in threads:
+        thread.start()
+    time.sleep(warmup)
+    rec.recording = True
+    started = time.monotonic()
+    stop_at[0] = started + duration
+    print(f"⏱️  Midiendo {duration}s...")
+    for thread in threads:
+        thread.join()
+    rec.recording = False
+    return rec, time.monotonic() - started
+
+
+# ---------------------------------------------------------------- reporte
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    # Rango más cercano
+    k = max(0, math.ceil(p / 100 * len(sorted_values)) - 1)
+    return sorted_values[k]
+
+
+def summarize(rec, elapsed):
+    results = {}
+    every = []
+    for route, values in sorted(rec.latencies.items()):
+        values = sorted(values)
+        every.extend(values)
+        results[route] = {
+            'requests': len(values),
+            'errors': rec.errors[route],
+            'rps': round(len(values) / elapsed, 2),
+            'p50': round(percentile(values, 50), 2),
+            'p95': round(percentile(values, 95), 2),
+            'p99': round(percentile(values, 99), 2),
+            'max': round(values[-1], 2)
+        }
+    every.sort()
+    results['TOTAL'] = {
+        'requests': len(every),
+        'errors': sum(rec.errors.values()),
+        'rps': round(len(every) / elapsed, 2),
+        'p50': round(percentile(every, 50), 2),
+        'p95': round(percentile(every, 95), 2),
+        'p99': round(percentile(every, 99), 2),
+        'max': round(every[-1], 2) if every else 0.0
+    }
+    return results
+
+
+def print_table(results, baseline=None):
+    header = f"{'ruta':<16}{'req':>8}{'err':>6}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+    if baseline:
+        header += f"{'Δp95':>9}{'Δreq/s':>9}"
+    print(header)
+    print('-' * len(header))
+    for route, r in results.items():
+        line = (f"{route:<16}{r['requests']:>8}{r['errors']:>6}{r['rps']:>10.1f}"
+                f"{r['p50']:>10.1f}{r['p95']:>10.1f}{r['p99']:>10.1f}{r['max']:>10.1f}")
+        base = (baseline or {}).get(route)
+        if base:
+            line += f"{_delta(r['p95'], base['p95']):>9}{_delta(r['rps'], base['rps']):>9}"
+        print(line)
+
+
+def _delta(value, base):
+    if not base:
+        return '-'
+    return f"{(value - base) / base * 100:+.0f}%"
+
+
+# Rutas cuyo p95 empeoró más que `threshold` (fracción) respecto a la base
+def regressions(results, baseline, threshold):
+    found = []
+    for route, r in results.items():
+        base = baseline.get(route)
+        if base and base['p95'] and r['p95'] > base['p95'] * (1 + threshold):
+            found.append(route)
+    return found
+
+
+# ---------------------------------------------------------------- arranque
+
+def configure_environment(args):
+    env = {'SEARCH_BACKEND': args.search_backend} if args.search_backend else {}
+    if args.storage == 'sqlite':
+        env.update(STORAGE_BACKEND='sqlite', MONGO_URI='',
+                   SQLITE_PATH=args.sqlite_path or os.path.join(tempfile.mkdtemp(prefix='bench-'), 'bench.db'))
+    else:
+        env.update(STORAGE_BACKEND='mongo',
+                   MONGO_URI=args.mongo_uri or 'mongodb://localhost:27017/farmacia_bench')
+    if args.storage == 'mongomock':
+        if args.gunicorn or args.url:
+            raise SystemExit("❌ mongomock solo funciona en proceso (sin --gunicorn ni --url)")
+        import mongomock
+        import pymongo
+        pymongo.MongoClient = mongomock.MongoClient
+    # Las cargas de bench no deben disparar trabajos en segundo plano
+    if 'JOB_WORKERS' not in os.environ:
+        env['JOB_WORKERS'] = '0'
+    os.environ.update(env)
+    return env
+
+
+def start_gunicorn(env, port, workers, threads):
+    cmd = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app',
+           '--bind', f'127.0.0.1:{port}', '--workers', str(workers), '--threads', str(threads),
+           '--log-level', 'warning']
+    proc = subprocess.Popen(cmd, cwd=os.path.dirname(os.path.abspath(__file__)),
+                            env=dict(os.environ, **env))
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit("❌ gunicorn terminó al arrancar")
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/')
+            conn.getresponse().read()
+            conn.close()
+            print(f"✅ gunicorn listo en 127.0.0.1:{port} ({workers} workers x {threads} hilos)")
+            return proc
+        except (ConnectionError, OSError, http.client.HTTPException):
+            time.sleep(0.3)
+    proc.terminate()
+    raise SystemExit("❌ gunicorn no respondió a tiempo")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark de las rutas de la tienda')
+    parser.add_argument('--storage', choices=['mongo', 'sqlite', 'mongomock'], default='sqlite')
+    parser.add_argument('--mongo-uri')
+    parser.add_argument('--sqlite-path')
+    parser.add_argument('--search-backend', choices=['mongo', 'local'])
+    parser.add_argument('--reset', action='store_true', help='borrar y volver a sembrar la base')
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--heavy-users', type=int, default=5)
+    parser.add_argument('--heavy-orders', type=int, default=500)
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'pesos de los recorridos ({DEFAULT_MIX})')
+    parser.add_argument('-c', '--concurrency', type=int, default=8)
+    parser.add_argument('-d', '--duration', type=float, default=30)
+    parser.add_argument('--warmup', type=float, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--gunicorn', action='store_true', help='levantar gunicorn para la prueba')
+    target.add_argument('--url', help='servidor ya en marcha (misma base que --storage)')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--json', help='guardar resultados en este archivo')
+    parser.add_argument('--compare', help='resultados base (JSON) para comparar')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='regresión tolerada en p95 con --compare (0.2 = 20%%)')
+    args = parser.parse_args(argv)
+
+    env = configure_environment(args)
+    import app as storefront   # después de configurar el entorno
+    db = storefront.db
+
+    if args.reset:
+        reset_dataset(db)
+        seed_dataset(db, products=args.products, users=args.users, heavy_users=args.heavy_users,
+                     heavy_orders=args.heavy_orders, seed=args.seed)
+    data = Dataset(db, args.heavy_users)
+    mix = parse_mix(args.mix)
+
+    server = None
+    if args.gunicorn:
+        server = start_gunicorn(env, args.port, args.workers, args.threads)
+        base_url = f'http://127.0.0.1:{args.port}'
+    else:
+        base_url = args.url
+    try:
+        if base_url:
+            make_client = lambda: HttpSession(base_url)
+        else:
+            storefront.app.config['TESTING'] = True
+            make_client = lambda: FlaskSession(storefront.app)
+        rec, elapsed = run(make_client, data, mix, args.concurrency, args.duration, args.warmup, args.seed)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(10)
+
+    results = summarize(rec, elapsed)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+    print()
+    print_table(results, baseline)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'created_at': datetime.utcnow().isoformat(),
+                'target': 'gunicorn' if args.gunicorn else (args.url or 'inprocess'),
+                'storage': args.storage,
+                'dataset': {'products': len(data.product_ids), 'users': len(data.users),
+                            'heavy_users': args.heavy_users},
+                'mix': args.mix,
+                'concurrency': args.concurrency,
+                'duration': round(elapsed, 2),
+                'results': results
+            }, f, indent=2)
+        print(f"\n💾 Resultados guardados en {args.json}")
+
+    if baseline:
+        slower = regressions(results, baseline, args.threshold)
+        if slower:
+            print(f"\n❌ Regresión de p95 > {args.threshold:.0%} en: {', '.join(slower)}")
+            return 1
+        print("\n✅ Sin regresiones de p95")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
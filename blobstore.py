@@ -0,0 +1,135 @@
+# blobstore.py - Archivos direccionados por contenido (SHA-256) con conteo de referencias
+import hashlib
+import os
+import re
+import tempfile
+import uuid
+from datetime import datetime
+
+from pymongo import ReturnDocument
+
+from uploads import ReceivedFile, discard, extension
+
+# ab/cd/<sha256>.<ext>
+_KEY_RE = re.compile(r'^[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.[a-z0-9]+$')
+
+
+def is_blob_key(name):
+    return _KEY_RE.match(name or '') is not None
+
+
+# Cada archivo se guarda una sola vez bajo root/ab/cd/<sha256>.<ext>; el
+# documento {_id: clave, refs, size, ...} de `refs` cuenta cuántos productos o
+# recetas lo usan. El archivo se borra cuando el conteo llega a cero
+class BlobStore:
+    def __init__(self, root, refs):
+        self.root = root
+        self.refs = refs
+
+    @staticmethod
+    def key_for(sha256, ext):
+        return f"{sha256[:2]}/{sha256[2:4]}/{sha256}.{ext}"
+
+    def path(self, key):
+        return os.path.join(self.root, *key.split('/'))
+
+    # Registrar un archivo recibido (uploads.ReceivedFile). La referencia se
+    # suma antes de revisar el archivo; release vuelve a mirar el conteo
+    # después de apartar el archivo y lo devuelve si llegó una referencia.
+    # Devuelve (clave, documento del blob)
+    def add(self, received):
+        key = self.key_for(received.sha256, received.ext)
+        meta = self.refs.find_one_and_update(
+            {'_id': key},
+            {'$inc': {'refs': 1},
+             '$setOnInsert': {'size': received.size, 'created_at': datetime.utcnow()}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        path = self.path(key)
+        if os.path.exists(path):
+            discard(received.path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(received.path, path)
+        return key, meta
+
+    # Pasar al blob store un archivo que ya está en disco (nombres anteriores)
+    def import_file(self, path):
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix='.upload-')
+        sha = hashlib.sha256()
+        size = 0
+        with open(path, 'rb') as src, os.fdopen(fd, 'wb') as out:
+            for chunk in iter(lambda: src.read(64 * 1024), b''):
+                sha.update(chunk)
+                size += len(chunk)
+                out.write(chunk)
+        ext = extension(path)
+        return self.add(ReceivedFile(tmp_path, size, sha.hexdigest(), 'jpg' if ext == 'jpeg' else ext))
+
+    # Sumar una referencia a un blob que ya existe (otro producto con la misma
+    # imagen). Devuelve el documento del blob, o None si la clave no existe
+    def incref(self, key):
+        return self.refs.find_one_and_update(
+            {'_id': key}, {'$inc': {'refs': 1}}, return_document=ReturnDocument.AFTER)
+
+    def set_meta(self, key, **fields):
+        self.refs.update_one({'_id': key}, {'$set': fields})
+
+    # Soltar una referencia. Devuelve True si el archivo se borró (el que llama
+    # limpia lo derivado, p. ej. variantes). Los nombres anteriores al blob
+    # store no tienen conteo y se borran directamente
+    def release(self, key):
+        if not key:
+            return False
+        if not is_blob_key(key):
+            path = os.path.join(self.root, key)
+            if os.path.exists(path):
+                os.remove(path)
+            return True
+        meta = self.refs.find_one_and_update(
+            {'_id': key}, {'$inc': {'refs': -1}}, return_document=ReturnDocument.AFTER)
+        if meta is None or meta['refs'] > 0:
+            return False
+        if not self.refs.delete_one({'_id': key, 'refs': {'$lte': 0}}).deleted_count:
+            return False
+        # Un add concurrente pudo recrear el conteo y ver el archivo todavía
+        # en su lugar (y descartar su copia). Se aparta con un rename atómico
+        # y se vuelve a revisar: si ya hay referencias se devuelve; un add
+        # posterior al rename no lo encuentra y deja su propia copia
+        path = self.path(key)
+        trash = f"{path}.deleting-{uuid.uuid4().hex}"
+        try:
+            os.replace(path, trash)
+        except FileNotFoundError:
+            return True
+        if self.refs.find_one({'_id': key}, {'_id': 1}) is not None:
+            if os.path.exists(path):
+                os.remove(trash)
+            else:
+                os.replace(trash, path)
+            return False
+        os.remove(trash)
+        return True
+
+    # Quitar los directorios de shard que quedaron vacíos (ab/cd/ y ab/)
+    def prune(self, key):
+        shard = os.path.dirname(self.path(key))
+        for directory in (shard, os.path.dirname(shard)):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break
+
+    def stats(self):
+        row = next(iter(self.refs.aggregate([{'$group': {
+            '_id': None,
+            'blobs': {'$sum': 1},
+            'refs': {'$sum': '$refs'},
+            'bytes': {'$sum': '$size'},
+            'saved_bytes': {'$sum': {'$multiply': ['$size', {'$subtract': ['$refs', 1]}]}}
+        }}])), None)
+        if row is None:
+            return {'blobs': 0, 'refs': 0, 'bytes': 0, 'saved_bytes': 0}
+        row.pop('_id')
+        return row
@@ -0,0 +1,140 @@
+# cart_service.py - Cálculo de precios del carrito con una sola consulta
+from datetime import datetime
+
+from bson.objectid import ObjectId
+from pymongo import ASCENDING, IndexModel
+
+from product_cache import TTLCache
+
+# Campos del producto que necesitan cart.html, checkout.html y la orden
+CART_PRODUCT_PROJECTION = {
+    'name': 1,
+    'price': 1,
+    'image': 1,
+    'image_variants': 1,
+    'description': 1,
+    'stock': 1
+}
+
+
+# Carrito con productos hidratados, subtotales y total
+class PricedCart:
+    def __init__(self, items, total, missing):
+        self.items = items        # [{'producto', 'cantidad', 'subtotal', 'id'}]
+        self.total = total
+        self.missing = missing    # ids del carrito que ya no existen o son inválidos
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+    # Renglones con el formato que se guarda en db.orders
+    def order_items(self):
+        return [{
+            'product_id': item['producto']['_id'],
+            'name': item['producto']['name'],
+            'qty': item['cantidad'],
+            'price': item['producto']['price'],
+            'subtotal': item['subtotal']
+        } for item in self.items]
+
+    # Carrito de sesión sin los productos faltantes
+    def as_session_cart(self):
+        return {item['id']: item['cantidad'] for item in self.items}
+
+
+# Convertir las llaves del carrito a ObjectId, separando las inválidas
+def _parse_cart(cart):
+    entries = []
+    invalid = []
+    for pid, qty in cart.items():
+        try:
+            entries.append((str(pid), ObjectId(pid), int(qty)))
+        except Exception:
+            invalid.append(str(pid))
+    return entries, invalid
+
+
+# Hidratar todo el carrito con un solo $in y calcular totales en una pasada;
+# con caché de productos solo se consultan los que no están en memoria
+def price_cart(products, cart, projection=CART_PRODUCT_PROJECTION, cache=None):
+    entries, missing = _parse_cart(cart or {})
+    if not entries:
+        return PricedCart([], 0.0, missing)
+
+    ids = [oid for _, oid, _ in entries]
+    if cache is not None:
+        found = cache.get_many(ids)
+    else:
+        found = {doc['_id']: doc for doc in products.find({'_id': {'$in': ids}}, projection)}
+
+    items = []
+    total = 0.0
+    for pid, oid, qty in entries:
+        prod = found.get(oid)
+        if not prod or qty < 1:
+            missing.append(pid)
+            continue
+        subtotal = float(prod['price']) * qty
+        total += subtotal
+        items.append({
+            'producto': prod,
+            'cantidad': qty,
+            'subtotal': subtotal,
+            'id': pid
+        })
+    return PricedCart(items, total, missing)
+
+
+# Carritos de usuarios con sesión iniciada, guardados por id de usuario para
+# que sigan ahí en otro dispositivo. Caché corta en proceso; los demás workers
+# se enteran de los cambios por el bus de invalidación
+class UserCarts:
+    def __init__(self, collection, ttl=30 * 24 * 3600, cache_ttl=30, maxsize=2048):
+        self.collection = collection
+        self.ttl = ttl
+        self.cache = TTLCache(maxsize=maxsize, ttl=cache_ttl)
+
+    def ensure_indexes(self):
+        # Carritos sin cambios en `ttl` segundos se borran solos
+        return self.collection.create_indexes([
+            IndexModel([('updated_at', ASCENDING)], name='updated_at_ttl', expireAfterSeconds=self.ttl),
+        ])
+
+    def get(self, user_id):
+        user_id = str(user_id)
+        items = self.cache.get(user_id)
+        if items is None:
+            doc = self.collection.find_one({'_id': user_id}, {'items': 1})
+            items = doc.get('items', {}) if doc else {}
+            self.cache.set(user_id, items)
+        return dict(items)
+
+    def save(self, user_id, cart):
+        user_id = str(user_id)
+        items = {str(pid): int(qty) for pid, qty in cart.items()}
+        if items:
+            self.collection.replace_one({'_id': user_id},
+                                        {'items': items, 'updated_at': datetime.utcnow()}, upsert=True)
+        else:
+            self.collection.delete_one({'_id': user_id})
+        self.cache.set(user_id, items)
+
+    # Sumar el carrito anónimo de la sesión al del usuario (al iniciar sesión)
+    def merge(self, user_id, cart):
+        merged = self.get(user_id)
+        for pid, qty in cart.items():
+            merged[str(pid)] = merged.get(str(pid), 0) + int(qty)
+        self.save(user_id, merged)
+        return merged
+
+    def invalidate(self, user_id=None):
+        if user_id is None:
+            self.cache.clear()
+        else:
+            self.cache.delete(str(user_id))
+
+    def stats(self):
+        return self.cache.stats()
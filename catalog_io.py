@@ -0,0 +1,292 @@
+# catalog_io.py - Importación y exportación masiva del catálogo (CSV / JSONL)
+import codecs
+import csv
+import io
+import json
+import time
+from datetime import datetime
+
+from bson.errors import InvalidId
+from bson.objectid import ObjectId
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from facets import CATEGORY_LABELS
+from inventory import parse_stock
+
+FORMATS = ('csv', 'jsonl')
+# Columnas de importación/exportación, en este orden. `id` es el _id del
+# producto: la exportación lo incluye para que reimportarla actualice los
+# productos creados desde el formulario (que no tienen sku) en vez de duplicarlos
+FIELDS = ['id', 'sku', 'name', 'price', 'description', 'category', 'stock', 'active', 'image']
+EXPORT_PROJECTION = {field: 1 for field in FIELDS if field != 'id'}
+MAX_REPORTED_ERRORS = 100
+# Valores de un producto nuevo para las columnas que el archivo no trae
+# (los mismos que pone el formulario de admin)
+INSERT_DEFAULTS = {'description': '', 'category': 'general', 'active': True}
+
+
+class RowError(ValueError):
+    pass
+
+
+def detect_format(filename, default='csv'):
+    name = (filename or '').lower()
+    if name.endswith(('.jsonl', '.ndjson', '.json')):
+        return 'jsonl'
+    if name.endswith('.csv'):
+        return 'csv'
+    return default
+
+
+# Renglones (número de línea, dict) leídos del archivo binario de a uno, en
+# memoria constante; el BOM de Excel se descarta
+def iter_rows(stream, fmt):
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == 'jsonl':
+        for lineno, line in enumerate(text, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield lineno, RowError(f"JSON inválido: {e}")
+                continue
+            yield lineno, row if isinstance(row, dict) else RowError('Se esperaba un objeto JSON')
+    else:
+        raise ValueError(f"Formato desconocido: {fmt}")
+
+
+def _text(row, field):
+    value = row.get(field)
+    return str(value).strip() if value is not None else ''
+
+
+def _parse_bool(value):
+    text = str(value).strip().lower()
+    if text in ('', '1', 'true', 'si', 'sí', 'yes', 'activo'):
+        return True
+    if text in ('0', 'false', 'no', 'inactivo'):
+        return False
+    raise RowError(f"Valor de active inválido: {value}")
+
+
+def _parse_id(value):
+    if not value:
+        return None
+    try:
+        return ObjectId(value)
+    except (InvalidId, TypeError):
+        raise RowError(f"Id inválido: {value!r}")
+
+
+# Validar y normalizar un renglón. Solo se escriben las columnas presentes:
+# un CSV sin columna `stock` no toca las existencias. Devuelve
+# (id, sku, producto, imagen); con id se actualiza por _id y el sku se escribe
+def parse_row(row):
+    oid = _parse_id(_text(row, 'id'))
+    name = _text(row, 'name')
+    if not name:
+        raise RowError('Falta el nombre')
+    try:
+        price = float(_text(row, 'price'))
+    except ValueError:
+        raise RowError(f"Precio inválido: {row.get('price')!r}")
+    if price <= 0:
+        raise RowError('El precio debe ser mayor a 0')
+    product = {'name': name, 'price': round(price, 2)}
+    if 'description' in row:
+        product['description'] = _text(row, 'description')
+    if 'category' in row:
+        category = _text(row, 'category') or 'general'
+        if category not in CATEGORY_LABELS:
+            raise RowError(f"Categoría desconocida: {category}")
+        product['category'] = category
+    if 'stock' in row:
+        try:
+            product['stock'] = parse_stock(_text(row, 'stock'))
+        except ValueError:
+            raise RowError(f"Existencias inválidas: {row.get('stock')!r}")
+    if 'active' in row:
+        product['active'] = row['active'] if isinstance(row['active'], bool) else _parse_bool(row['active'])
+    sku = _text(row, 'sku') or None
+    if oid is not None and sku:
+        product['sku'] = sku
+    return oid, sku, product, _text(row, 'image') or None
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.failed = 0
+        self.images = 0
+        self.errors = []                 # [(línea, mensaje)]
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def error(self, lineno, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((lineno, message))
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'inserted': self.inserted,
+            'updated': self.updated,
+            'unchanged': self.unchanged,
+            'failed': self.failed,
+            'images': self.images,
+            'errors': [{'line': line, 'error': message} for line, message in self.errors],
+            'elapsed': round(self.elapsed, 2),
+            'rows_per_sec': round(self.rows_per_sec, 1)
+        }
+
+
+# Importa en lotes de `batch_size`: upsert por `id` o si no por `sku`
+# (bulk_write no ordenado) e insert para renglones sin ninguno de los dos. `resolve_image(nombre)` devuelve
+# (clave, variantes) tomando una referencia del blob store, o None;
+# `release_image(doc)` suelta la imagen anterior de un producto reemplazada
+class CatalogImporter:
+    def __init__(self, products, batch_size=500, resolve_image=None, release_image=None,
+                 progress=None):
+        self.products = products
+        self.batch_size = batch_size
+        self.resolve_image = resolve_image
+        self.release_image = release_image
+        self.progress = progress
+
+    def run(self, stream, fmt):
+        report = ImportReport()
+        batch = []
+        for lineno, row in iter_rows(stream, fmt):
+            report.rows += 1
+            try:
+                if isinstance(row, RowError):
+                    raise row
+                oid, sku, product, image = parse_row(row)
+                if image:
+                    resolved = self.resolve_image(image) if self.resolve_image else None
+                    if resolved is None:
+                        raise RowError(f"Imagen no encontrada: {image}")
+                    product['image'], product['image_variants'] = resolved
+            except RowError as e:
+                report.error(lineno, str(e))
+                continue
+            batch.append((lineno, oid, sku, product))
+            if len(batch) >= self.batch_size:
+                self._write(batch, report)
+                batch = []
+        if batch:
+            self._write(batch, report)
+        report.elapsed = time.perf_counter() - report.started
+        return report
+
+    def _write(self, batch, report):
+        now = datetime.utcnow()
+        ids = [oid for _, oid, _, _ in batch if oid]
+        skus = [sku for _, oid, sku, _ in batch if sku and not oid]
+        # Imagen actual de cada producto (para soltar la que se reemplaza),
+        # por _id; un sku que aún no existe se identifica por el sku
+        current = {}
+        by_sku = {}
+        if self.release_image:
+            projection = {'sku': 1, 'image': 1, 'image_variants': 1}
+            if ids:
+                for doc in self.products.find({'_id': {'$in': ids}}, projection):
+                    current[doc['_id']] = doc
+            if skus:
+                for doc in self.products.find({'sku': {'$in': skus}}, projection):
+                    current[doc['_id']] = doc
+                    by_sku[doc['sku']] = doc['_id']
+        ops = []
+        # índice de op -> (op que escribió esa imagen o None, doc con la imagen
+        # anterior); un producto repetido en el lote reemplaza la del renglón previo
+        replaced = {}
+        for lineno, oid, sku, product in batch:
+            insert_only = {field: value for field, value in INSERT_DEFAULTS.items() if field not in product}
+            insert_only['created_at'] = now
+            if oid is None and sku is None:
+                ops.append(InsertOne(dict(product, **insert_only)))
+                continue
+            if 'image' in product:
+                ident = oid or by_sku.get(sku, ('sku', sku))
+                previous = current.get(ident)
+                if previous and previous.get('image'):
+                    replaced[len(ops)] = (previous.get('op'), previous)
+                current[ident] = {'op': len(ops), 'image': product['image'],
+                                  'image_variants': product['image_variants']}
+            ops.append(UpdateOne({'_id': oid} if oid else {'sku': sku},
+                                 {'$set': dict(product, updated_at=now), '$setOnInsert': insert_only},
+                                 upsert=True))
+
+        failed = set()
+        try:
+            result = self.products.bulk_write(ops, ordered=False)
+            details = result.bulk_api_result
+        except BulkWriteError as e:
+            details = e.details
+            for error in details.get('writeErrors', []):
+                failed.add(error['index'])
+                report.error(batch[error['index']][0], error.get('errmsg', 'Error de escritura'))
+        report.inserted += details.get('nInserted', 0) + details.get('nUpserted', 0)
+        report.updated += details.get('nModified', 0)
+        report.unchanged += details.get('nMatched', 0) - details.get('nModified', 0)
+        report.images += sum(1 for i, (_, _, _, p) in enumerate(batch) if 'image' in p and i not in failed)
+
+        if self.release_image:
+            for index, (source, doc) in replaced.items():
+                if index not in failed and source not in failed:
+                    self.release_image(doc)
+            # La referencia tomada para un renglón que no se escribió se devuelve
+            for index in failed:
+                product = batch[index][3]
+                if product.get('image'):
+                    self.release_image(product)
+        if self.progress:
+            self.progress(report)
+
+
+def _csv_line(values):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(values)
+    return buffer.getvalue()
+
+
+def _export_value(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    return value
+
+
+# Exportar el catálogo renglón por renglón desde el cursor (para una
+# respuesta en streaming o un archivo); mismas columnas que la importación
+def export_rows(products, fmt, batch_size=500, query=None):
+    cursor = products.find(query or {}, EXPORT_PROJECTION).sort('_id', 1).batch_size(batch_size)
+    if fmt == 'csv':
+        yield codecs.BOM_UTF8.decode('utf-8') + _csv_line(FIELDS)
+    try:
+        for doc in cursor:
+            doc['id'] = str(doc['_id'])
+            if fmt == 'csv':
+                yield _csv_line([_export_value(doc.get(field)) for field in FIELDS])
+            else:
+                yield json.dumps({field: doc.get(field) for field in FIELDS}, ensure_ascii=False) + '\n'
+    finally:
+        cursor.close()
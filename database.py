@@ -0,0 +1,154 @@
+# database.py - Conexión a MongoDB perezosa, una por proceso (seguro con fork)
+import os
+import threading
+
+import pymongo
+from pymongo import monitoring
+
+
+# Contadores del pool de conexiones (por proceso)
+class PoolStats(monitoring.ConnectionPoolListener):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.created = 0
+        self.closed = 0
+        self.checked_out = 0
+        self.checkout_failures = 0
+        self.in_use = 0
+        self.max_in_use = 0
+
+    def _bump(self, **changes):
+        with self._lock:
+            for name, delta in changes.items():
+                setattr(self, name, getattr(self, name) + delta)
+            self.max_in_use = max(self.max_in_use, self.in_use)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._bump(created=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._bump(closed=1)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._bump(checkout_failures=1)
+
+    def connection_checked_out(self, event):
+        self._bump(checked_out=1, in_use=1)
+
+    def connection_checked_in(self, event):
+        self._bump(in_use=-1)
+
+    def as_dict(self):
+        return {
+            'open': self.created - self.closed,
+            'created': self.created,
+            'closed': self.closed,
+            'checked_out': self.checked_out,
+            'checkout_failures': self.checkout_failures,
+            'in_use': self.in_use,
+            'max_in_use': self.max_in_use
+        }
+
+
+# Crea el MongoClient la primera vez que se usa en cada proceso. Los workers
+# de gunicorn heredan el objeto del master, pero nunca su cliente.
+class MongoConnection:
+    def __init__(self, uri, **client_options):
+        self.uri = uri
+        self.client_options = client_options
+        self._client = None
+        self._pid = None
+        self._stats = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._stats = PoolStats()
+                    self._client = pymongo.MongoClient(
+                        self.uri,
+                        event_listeners=[self._stats],
+                        **self.client_options
+                    )
+                    self._pid = os.getpid()
+                    print(f"✅ Cliente MongoDB creado (pid {self._pid})")
+        return self._client
+
+    @property
+    def database(self):
+        return self.client.get_database()
+
+    def ping(self):
+        self.client.admin.command('ping')
+
+    def close(self):
+        with self._lock:
+            if self._client is not None and self._pid == os.getpid():
+                self._client.close()
+            self._client = None
+            self._pid = None
+
+    def stats(self):
+        return {
+            'pid': self._pid,
+            'connected': self._client is not None and self._pid == os.getpid(),
+            'options': {k: v for k, v in self.client_options.items()},
+            'pool': self._stats.as_dict() if self._stats else None
+        }
+
+
+# Colección que se resuelve en cada uso contra el cliente del proceso actual
+class LazyCollection:
+    def __init__(self, connection, name):
+        self._connection = connection
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(self._connection.database[self._name], attr)
+
+    def __repr__(self):
+        return f"LazyCollection({self._name!r})"
+
+
+# Sustituto de `db`: db.products, db['orders'], etc. sin conectar al importar
+class LazyDatabase:
+    def __init__(self, connection):
+        self._connection = connection
+        self._collections = {}
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self[name]
+
+    def __getitem__(self, name):
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._collections[name] = LazyCollection(self._connection, name)
+        return collection
+
+    def command(self, *args, **kwargs):
+        return self._connection.database.command(*args, **kwargs)
+
+    def list_collection_names(self):
+        return self._connection.database.list_collection_names()
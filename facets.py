@@ -0,0 +1,155 @@
+# facets.py - Filtros del catálogo (categoría, precio, activo) y conteos por categoría
+from product_cache import TTLCache
+
+# Nombres para mostrar de las categorías que ofrece el formulario de productos
+CATEGORY_LABELS = {
+    'general': 'General',
+    'analgesicos': 'Analgésicos',
+    'vitaminas': 'Vitaminas',
+    'dermocosmetica': 'Dermocosmética',
+    'respiratorio': 'Respiratorio',
+    'primeros_auxilios': 'Primeros Auxilios',
+    'cuidado_personal': 'Cuidado Personal',
+}
+
+
+def category_label(category):
+    return CATEGORY_LABELS.get(category, (category or 'general').replace('_', ' ').title())
+
+
+def _parse_price(value):
+    try:
+        price = float(value)
+    except (TypeError, ValueError):
+        return None
+    return price if price >= 0 else None
+
+
+# Filtros de index() tomados de la query string; los valores inválidos se ignoran
+class ProductFilters:
+    def __init__(self, category=None, min_price=None, max_price=None, active=None):
+        self.category = category or None
+        self.min_price = min_price
+        self.max_price = max_price
+        self.active = active
+
+    @classmethod
+    def from_args(cls, args):
+        active = args.get('active')
+        return cls(
+            category=args.get('category', '').strip(),
+            min_price=_parse_price(args.get('min_price')),
+            max_price=_parse_price(args.get('max_price')),
+            active={'1': True, '0': False}.get(active)
+        )
+
+    def __bool__(self):
+        return any(v is not None for v in (self.category, self.min_price, self.max_price, self.active))
+
+    # Filtro de MongoDB; sin categoría para los conteos por categoría
+    def query(self, include_category=True):
+        query = {}
+        if include_category and self.category:
+            query['category'] = self.category
+        price = {}
+        if self.min_price is not None:
+            price['$gte'] = self.min_price
+        if self.max_price is not None:
+            price['$lte'] = self.max_price
+        if price:
+            query['price'] = price
+        if self.active is not None:
+            query['active'] = self.active
+        return query
+
+    # Parámetros para url_for (paginación conservando los filtros)
+    def args(self):
+        args = {}
+        if self.category:
+            args['category'] = self.category
+        if self.min_price is not None:
+            args['min_price'] = f"{self.min_price:g}"
+        if self.max_price is not None:
+            args['max_price'] = f"{self.max_price:g}"
+        if self.active is not None:
+            args['active'] = '1' if self.active else '0'
+        return args
+
+    def matches_category(self, product):
+        return not self.category or (product.get('category') or 'general') == self.category
+
+    def facet_key(self):
+        return (self.min_price, self.max_price, self.active)
+
+
+class Facets:
+    def __init__(self, categories, total, min_price=None, max_price=None):
+        self.categories = categories      # [(categoría, conteo)] por nombre
+        self.total = total                # productos con los filtros sin categoría
+        self.min_price = min_price
+        self.max_price = max_price
+
+    def count(self, category=None):
+        if category is None:
+            return self.total
+        return dict(self.categories).get(category, 0)
+
+
+# Conteos por categoría y rango de precios en una sola agregación $facet. La
+# categoría seleccionada no se aplica, para mostrar cuántos hay en cada una
+def compute_facets(products, filters):
+    pipeline = [
+        {'$match': filters.query(include_category=False)},
+        {'$facet': {
+            'categories': [
+                {'$group': {'_id': {'$ifNull': ['$category', 'general']}, 'count': {'$sum': 1}}},
+                {'$sort': {'_id': 1}}
+            ],
+            'summary': [
+                {'$group': {'_id': None, 'count': {'$sum': 1},
+                            'min_price': {'$min': '$price'}, 'max_price': {'$max': '$price'}}}
+            ]
+        }}
+    ]
+    row = next(iter(products.aggregate(pipeline)), {'categories': [], 'summary': []})
+    summary = row['summary'][0] if row['summary'] else {}
+    return Facets(
+        [(c['_id'], c['count']) for c in row['categories']],
+        summary.get('count', 0),
+        summary.get('min_price'),
+        summary.get('max_price')
+    )
+
+
+# Las mismas facetas calculadas sobre una lista ya cargada (resultados de
+# búsqueda), para que los conteos coincidan con lo que se muestra
+def facets_from_products(products):
+    counts = {}
+    prices = [p['price'] for p in products if p.get('price') is not None]
+    for product in products:
+        category = product.get('category') or 'general'
+        counts[category] = counts.get(category, 0) + 1
+    return Facets(sorted(counts.items()), len(products),
+                  min(prices) if prices else None, max(prices) if prices else None)
+
+
+# Facetas por combinación de filtros (sin categoría), con TTL; las escrituras
+# de productos las invalidan junto con la caché de productos
+class FacetCache:
+    def __init__(self, products, maxsize=256, ttl=60):
+        self.products = products
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, filters):
+        key = filters.facet_key()
+        facets = self.cache.get(key)
+        if facets is None:
+            facets = compute_facets(self.products, filters)
+            self.cache.set(key, facets)
+        return facets
+
+    def invalidate(self):
+        self.cache.clear()
+
+    def stats(self):
+        return self.cache.stats()
@@ -0,0 +1,18 @@
+# gunicorn.conf.py - gunicorn -c gunicorn.conf.py app:app
+import os
+
+# Importado con otro nombre: `config` es un ajuste de gunicorn y un módulo con
+# ese nombre en este archivo rompe la carga de la configuración
+import config as app_config
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = app_config.WEB_CONCURRENCY
+threads = app_config.GUNICORN_THREADS
+
+# Con el bus 'local' un logout o un cambio de carrito en un worker no llega a
+# las cachés de los otros: no arrancar así
+if workers > 1 and app_config.CACHE_BUS == 'local':
+    raise RuntimeError(f"CACHE_BUS='local' no sirve con {workers} workers; usa 'unix' o 'mongo'")
+
+# Seguro con preload: el MongoClient se crea en cada worker, no en el master
+preload_app = True
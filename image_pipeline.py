@@ -0,0 +1,135 @@
+# image_pipeline.py - Variantes redimensionadas (AVIF/WebP/JPEG) de las imágenes de producto
+import os
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:  # Pillow es opcional: sin él se sirven los originales
+    Image = None
+
+# Anchos máximos por variante (no se amplían imágenes más pequeñas)
+VARIANTS = {
+    'thumb': 320,     # tarjetas del catálogo, carrito, tabla de admin
+    'medium': 800,    # detalle de producto
+    'full': 1600      # pantallas de alta densidad
+}
+
+# (extensión, tipo MIME, formato de Pillow, opciones) en orden de preferencia;
+# JPEG es el respaldo que entiende cualquier navegador
+FORMATS = [
+    ('avif', 'image/avif', 'AVIF', {'quality': 50}),
+    ('webp', 'image/webp', 'WEBP', {'quality': 75, 'method': 4}),
+    ('jpg', 'image/jpeg', 'JPEG', {'quality': 80, 'optimize': True, 'progressive': True}),
+]
+
+
+def enabled():
+    return Image is not None
+
+
+def _supported_formats():
+    Image.init()  # registra todos los plugins de escritura (AVIF incluido si existe)
+    supported = []
+    for ext, mime, fmt, options in FORMATS:
+        if fmt == 'JPEG' or (fmt == 'WEBP' and features.check('webp')) or \
+                (fmt == 'AVIF' and fmt in Image.SAVE):
+            supported.append((ext, mime, fmt, options))
+    return supported
+
+
+def variant_name(filename, variant, ext):
+    stem = filename.rsplit('.', 1)[0]
+    return f"{stem}.{variant}.{ext}"
+
+
+def _flatten(img):
+    if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+        img = img.convert('RGBA')
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img.split()[-1])
+        return background
+    return img.convert('RGB')
+
+
+# Generar las variantes de una imagen ya guardada en `folder`. Devuelve lo que
+# se guarda en el producto como `image_variants` ({'widths': {...}, 'formats': [...]})
+# o None si Pillow no está instalado o el archivo no es una imagen válida
+def generate_variants(folder, filename):
+    if Image is None:
+        return None
+    try:
+        with Image.open(os.path.join(folder, filename)) as source:
+            source = ImageOps.exif_transpose(source)
+            source.load()
+    except (OSError, ValueError) as e:
+        print(f"⚠️  No se pudieron generar variantes de {filename}: {e}")
+        return None
+
+    has_alpha = source.mode in ('RGBA', 'LA', 'PA') or 'transparency' in source.info
+    rgba = source.convert('RGBA' if has_alpha else 'RGB')
+    flat = _flatten(source)
+    formats = _supported_formats()
+    widths = {}
+    for variant, max_width in VARIANTS.items():
+        width = min(max_width, source.width)
+        # Si la original es pequeña, no repetir variantes del mismo ancho
+        if width in widths.values():
+            continue
+        height = max(1, round(source.height * width / source.width))
+        resized = {}
+        for ext, mime, fmt, options in formats:
+            base = flat if fmt == 'JPEG' else rgba
+            if id(base) not in resized:
+                resized[id(base)] = base.resize((width, height), Image.LANCZOS) if width != source.width else base
+            path = os.path.join(folder, variant_name(filename, variant, ext))
+            tmp_path = path + '.tmp'
+            resized[id(base)].save(tmp_path, fmt, **options)
+            os.replace(tmp_path, path)
+        widths[variant] = width
+    return {'widths': widths, 'formats': [ext for ext, _, _, _ in formats]}
+
+
+# (ancho, alto) de una imagen en disco, o None si no se puede leer
+def image_size(path):
+    if Image is None:
+        return None
+    try:
+        with Image.open(path) as img:
+            return img.size
+    except (OSError, ValueError):
+        return None
+
+
+# Borrar las variantes generadas de una imagen (al editar o eliminar el producto)
+def remove_variants(folder, filename, info=None):
+    exts = (info or {}).get('formats') or [ext for ext, _, _, _ in FORMATS]
+    variants = (info or {}).get('widths') or VARIANTS
+    for variant in variants:
+        for ext in exts:
+            path = os.path.join(folder, variant_name(filename, variant, ext))
+            if os.path.exists(path):
+                os.remove(path)
+
+
+# Elegir el archivo a servir para `variant` según el encabezado Accept. Solo se
+# ofrecen AVIF/WebP a clientes que los anuncian explícitamente (no por */*)
+def pick_variant(folder, filename, variant, accept_mimetypes):
+    if variant not in VARIANTS:
+        return None
+    accepted = {mime for mime, quality in accept_mimetypes if quality > 0}
+    for ext, mime, _, _ in FORMATS:
+        if ext != 'jpg' and mime not in accepted:
+            continue
+        name = variant_name(filename, variant, ext)
+        if os.path.exists(os.path.join(folder, name)):
+            return name
+    return None
+
+
+# Valor de srcset para un producto: "url?v=thumb 320w, url?v=medium 800w, ..."
+def srcset(url_for, product):
+    info = product.get('image_variants') or {}
+    widths = info.get('widths') or {}
+    return ', '.join(
+        f"{url_for('images', filename=product['image'], v=variant)} {width}w"
+        for variant, width in sorted(widths.items(), key=lambda item: item[1])
+    )
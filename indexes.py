@@ -0,0 +1,110 @@
+# indexes.py - Declaración y verificación de índices de MongoDB
+from datetime import datetime
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import PyMongoError
+
+# Índices requeridos por las consultas de app.py, por colección.
+# El índice de texto de products lo administra search.MongoTextSearchBackend
+# y el TTL de cache_invalidations lo crea invalidation.MongoChangeStreamBus.
+INDEXES = {
+    'users': [
+        # register/login/perfil buscan por email; login filtra también por
+        # password, pero el email único ya deja un solo documento candidato
+        IndexModel([('email', ASCENDING)], name='email_unique', unique=True),
+    ],
+    'orders': [
+        # order_history/profile: pedidos del usuario, más recientes primero (keyset)
+        IndexModel([('user_email', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)],
+                   name='user_email_created_at'),
+        # checkout: la llave de idempotencia evita pedidos duplicados por doble envío
+        IndexModel([('idempotency_key', ASCENDING)], name='idempotency_key_unique',
+                   unique=True, sparse=True),
+        # exportación/reporte de admin: rango de fechas en orden cronológico
+        IndexModel([('created_at', DESCENDING), ('_id', DESCENDING)], name='created_at_id'),
+    ],
+    'prescriptions': [
+        # profile/my_prescriptions: recetas del usuario, más recientes primero
+        IndexModel([('email', ASCENDING), ('uploaded_at', DESCENDING)],
+                   name='email_uploaded_at'),
+        # /images: las recetas no se sirven por la ruta pública
+        IndexModel([('filename', ASCENDING)], name='filename'),
+    ],
+    'products': [
+        # index/admin_products: paginación keyset por fecha de creación
+        IndexModel([('created_at', DESCENDING), ('_id', DESCENDING)],
+                   name='created_at_id'),
+        # index con ?category=: misma paginación keyset dentro de la categoría
+        IndexModel([('category', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)],
+                   name='category_created_at_id'),
+        # importación del catálogo: upsert por sku (los productos sin sku no entran)
+        IndexModel([('sku', ASCENDING)], name='sku_unique', unique=True, sparse=True),
+    ],
+}
+
+# Formas de consulta calientes para revisar con explain()
+HOT_QUERIES = [
+    ('users', {'email': 'x@example.com'}, None),
+    ('users', {'email': 'x@example.com', 'password': 'x'}, None),
+    ('orders', {'user_email': 'x@example.com'}, [('created_at', -1), ('_id', -1)]),
+    ('orders', {'created_at': {'$gte': datetime(2024, 1, 1)}}, [('created_at', 1), ('_id', 1)]),
+    ('prescriptions', {'email': 'x@example.com'}, [('uploaded_at', -1)]),
+    ('products', {}, [('created_at', -1), ('_id', -1)]),
+    ('products', {'category': 'x'}, [('created_at', -1), ('_id', -1)]),
+]
+
+
+# Crear (o verificar) los índices declarados; create_indexes es idempotente
+def ensure_indexes(db, collections=None):
+    report = []
+    for name, models in INDEXES.items():
+        if collections and name not in collections:
+            continue
+        try:
+            created = db[name].create_indexes(models)
+            for index_name in created:
+                report.append((name, index_name, 'ok'))
+        except PyMongoError as e:
+            report.append((name, ', '.join(m.document['name'] for m in models), f'error: {e}'))
+    return report
+
+
+# Índices declarados que no existen en la base
+def missing_indexes(db):
+    missing = []
+    for name, models in INDEXES.items():
+        existing = set(db[name].index_information())
+        for model in models:
+            if model.document['name'] not in existing:
+                missing.append((name, model.document['name']))
+    return missing
+
+
+def _plan_stages(plan):
+    stages = [plan.get('stage')]
+    for key in ('inputStage', 'queryPlan'):
+        if key in plan:
+            stages.extend(_plan_stages(plan[key]))
+    for child in plan.get('inputStages', []):
+        stages.extend(_plan_stages(child))
+    return stages
+
+
+# Revisar con explain() que cada consulta caliente use un índice sin SORT en memoria
+def check_query_shapes(db):
+    problems = []
+    for name, query, sort in HOT_QUERIES:
+        cursor = db[name].find(query).limit(1)
+        if sort:
+            cursor = cursor.sort(sort)
+        try:
+            plan = cursor.explain()['queryPlanner']['winningPlan']
+        except Exception as e:
+            problems.append((name, query, f'explain falló: {e}'))
+            continue
+        stages = _plan_stages(plan)
+        if 'COLLSCAN' in stages:
+            problems.append((name, query, 'COLLSCAN'))
+        elif 'SORT' in stages:
+            problems.append((name, query, 'SORT en memoria'))
+    return problems
@@ -49,7 +49,7 @@ def setup_project():
     print("\n🌐 La aplicación estará en: http://localhost:5000")
     print("\n🔧 Rutas especiales:")
     print("   /admin/clean - Limpiar base de datos (solo desarrollo)")
-    print("   /admin/migrate-users - Migrar usuarios existentes")
+    print("\n🗃️  Migraciones de datos: flask --app app migrate")
 
 if __name__ == '__main__':
     setup_project()
\ No newline at end of file
@@ -0,0 +1,184 @@
+# invalidation.py - Bus de invalidación de cachés entre workers de gunicorn
+import atexit
+import glob
+import json
+import os
+import socket
+import tempfile
+import threading
+import uuid
+from collections import defaultdict
+from datetime import datetime
+
+# Canales usados por la aplicación
+PRODUCT_CHANNEL = 'product'
+USER_CHANNEL = 'user'
+SESSION_CHANNEL = 'session'
+CART_CHANNEL = 'cart'
+
+
+# Bus base: entrega en el proceso actual; las subclases reenvían al resto
+class InvalidationBus:
+    name = 'local'
+
+    def __init__(self):
+        self._handlers = defaultdict(list)
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self.origin = None
+        self.published = 0
+        self.received = 0
+
+    def subscribe(self, channel, handler):
+        self._handlers[channel].append(handler)
+
+    # Arranca el listener una vez por proceso (después del fork de gunicorn)
+    def ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self.origin = f"{socket.gethostname()}:{self._pid}:{uuid.uuid4().hex[:8]}"
+            self._start()
+
+    # Invalida localmente de inmediato y avisa a los demás workers
+    def publish(self, channel, key=None):
+        key = str(key) if key is not None else None
+        self._dispatch(channel, key)
+        self.ensure_started()
+        self.published += 1
+        try:
+            self._send({'channel': channel, 'key': key, 'origin': self.origin})
+        except Exception as e:
+            print(f"Error publicando invalidación: {e}")
+
+    def stats(self):
+        return {
+            'backend': self.name,
+            'origin': self.origin,
+            'published': self.published,
+            'received': self.received
+        }
+
+    def _receive(self, message):
+        if message.get('origin') == self.origin:
+            return
+        self.received += 1
+        self._dispatch(message.get('channel'), message.get('key'))
+
+    def _dispatch(self, channel, key):
+        for handler in self._handlers.get(channel, []):
+            try:
+                handler(key)
+            except Exception as e:
+                print(f"Error invalidando caché ({channel}:{key}): {e}")
+
+    def _start(self):
+        pass
+
+    def _send(self, message):
+        pass
+
+
+# Bus por sockets Unix de datagramas: un socket por worker en un directorio común
+class UnixSocketBus(InvalidationBus):
+    name = 'unix'
+
+    def __init__(self, directory=None):
+        super().__init__()
+        self.directory = directory or os.path.join(tempfile.gettempdir(), 'farmacia-cache-bus')
+        self._path = None
+        self._sender = None
+        self._send_lock = threading.Lock()
+
+    def _start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._path = os.path.join(self.directory, f'worker-{os.getpid()}.sock')
+        if os.path.exists(self._path):
+            os.unlink(self._path)
+
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        listener.bind(self._path)
+        self._sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sender.setblocking(False)
+        atexit.register(self._cleanup, self._path)
+
+        thread = threading.Thread(target=self._listen, args=(listener,),
+                                  name='cache-bus-listener', daemon=True)
+        thread.start()
+
+    def _listen(self, listener):
+        while True:
+            try:
+                data = listener.recv(65536)
+                self._receive(json.loads(data.decode()))
+            except Exception as e:
+                print(f"Error recibiendo invalidación: {e}")
+
+    def _send(self, message):
+        payload = json.dumps(message).encode()
+        with self._send_lock:
+            for path in glob.glob(os.path.join(self.directory, 'worker-*.sock')):
+                if path == self._path:
+                    continue
+                try:
+                    self._sender.sendto(payload, path)
+                except (ConnectionRefusedError, FileNotFoundError):
+                    # Worker muerto: su socket quedó huérfano
+                    self._cleanup(path)
+                except BlockingIOError:
+                    # Buffer lleno: el TTL de la caché acota la inconsistencia
+                    pass
+
+    @staticmethod
+    def _cleanup(path):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+# Bus sobre MongoDB: inserta eventos y los escucha con un change stream
+# (requiere replica set; sin él se degrada a invalidación por TTL)
+class MongoChangeStreamBus(InvalidationBus):
+    name = 'mongo'
+
+    def __init__(self, collection, retention=3600):
+        super().__init__()
+        self.collection = collection
+        self.retention = retention
+
+    def _start(self):
+        try:
+            self.collection.create_index('at', expireAfterSeconds=self.retention)
+        except Exception as e:
+            print(f"Error creando índice TTL del bus: {e}")
+        thread = threading.Thread(target=self._listen, name='cache-bus-listener', daemon=True)
+        thread.start()
+
+    def _listen(self):
+        pipeline = [{'$match': {'operationType': 'insert'}}]
+        try:
+            with self.collection.watch(pipeline) as stream:
+                for change in stream:
+                    self._receive(change['fullDocument'])
+        except Exception as e:
+            print(f"⚠️  Change stream no disponible, solo invalidación por TTL: {e}")
+
+    def _send(self, message):
+        self.collection.insert_one(dict(message, at=datetime.utcnow()))
+
+
+# Crear el bus según la configuración (CACHE_BUS)
+def create_bus(backend='local', db=None, directory=None):
+    if backend == 'unix':
+        return UnixSocketBus(directory)
+    if backend == 'mongo':
+        if db is None:
+            raise ValueError('El bus "mongo" requiere conexión a MongoDB')
+        return MongoChangeStreamBus(db.cache_invalidations)
+    if backend == 'local':
+        return InvalidationBus()
+    raise ValueError(f"Bus de invalidación desconocido: {backend}")
@@ -0,0 +1,99 @@
+# inventory.py - Existencias: descuento atómico y condicional al confirmar pedidos
+from pymongo import UpdateOne
+
+# Motivos por los que un renglón del pedido no se pudo confirmar
+OUT_OF_STOCK = 'out_of_stock'
+PRICE_CHANGED = 'price_changed'
+MISSING = 'missing'
+
+
+class StockError(Exception):
+    def __init__(self, product_id, name, reason, available=None):
+        super().__init__(f"{name}: {reason}")
+        self.product_id = product_id
+        self.name = name
+        self.reason = reason
+        self.available = available
+
+    def message(self):
+        if self.reason == OUT_OF_STOCK:
+            if self.available:
+                return f"Solo quedan {self.available} pieza(s) de {self.name}"
+            return f"{self.name} está agotado"
+        if self.reason == PRICE_CHANGED:
+            return f"El precio de {self.name} cambió; revisa tu carrito"
+        return f"{self.name} ya no está disponible"
+
+
+# Existencias del formulario de admin: vacío = sin control de inventario
+def parse_stock(value):
+    value = (value or '').strip()
+    if not value:
+        return None
+    stock = int(value)
+    if stock < 0:
+        raise ValueError('Las existencias no pueden ser negativas')
+    return stock
+
+
+def tracks_stock(producto):
+    return isinstance(producto.get('stock'), int)
+
+
+# Filtro y actualización de un renglón: el mismo precio con que se calculó
+# el pedido y, si el producto lleva inventario, existencias suficientes
+def _reserve_op(item):
+    producto = item['producto']
+    qty = item['cantidad']
+    query = {'_id': producto['_id'], 'price': producto['price']}
+    if tracks_stock(producto):
+        query['stock'] = {'$gte': qty}
+        return query, {'$inc': {'stock': -qty, 'sold': qty}}
+    query['stock'] = None
+    return query, {'$inc': {'sold': qty}}
+
+
+def _failure(products, item):
+    producto = item['producto']
+    current = products.find_one({'_id': producto['_id']}, {'price': 1, 'stock': 1, 'name': 1})
+    if current is None:
+        return StockError(str(producto['_id']), producto['name'], MISSING)
+    if current['price'] != producto['price']:
+        return StockError(str(producto['_id']), producto['name'], PRICE_CHANGED)
+    return StockError(str(producto['_id']), producto['name'], OUT_OF_STOCK,
+                      available=max(current.get('stock') or 0, 0))
+
+
+# Descontar existencias renglón por renglón con un update condicional (sin
+# upsert: un producto borrado no debe reaparecer). matched_count == 0 marca el
+# renglón que no alcanzó o cambió de precio; se revierten solo los que ya se
+# aplicaron y se lanza StockError, así el pedido no se crea
+def reserve(products, items):
+    applied = []
+    for item in items:
+        query, update = _reserve_op(item)
+        try:
+            matched = products.update_one(query, update).matched_count
+        except Exception:
+            _undo(products, applied)
+            raise
+        if not matched:
+            _undo(products, applied)
+            raise _failure(products, item)
+        applied.append(item)
+
+
+# Devolver existencias (pedido no creado o cancelado)
+def release(products, items):
+    _undo(products, items)
+
+
+def _undo(products, items):
+    ops = []
+    for item in items:
+        producto = item['producto']
+        qty = item['cantidad']
+        update = {'$inc': {'stock': qty, 'sold': -qty}} if tracks_stock(producto) else {'$inc': {'sold': -qty}}
+        ops.append(UpdateOne({'_id': producto['_id']}, update))
+    if ops:
+        products.bulk_write(ops, ordered=False)
@@ -0,0 +1,176 @@
+# jobs.py - Cola de trabajos persistente (colección de MongoDB o SQLite) con reintentos
+import os
+import socket
+import threading
+import traceback
+from datetime import datetime, timedelta
+
+from pymongo import ASCENDING, IndexModel, ReturnDocument
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+# Cada trabajo es un documento {name, payload, status, attempts, available_at}.
+# Tomarlo es un find_one_and_update atómico que lo marca `running` y lo oculta
+# `visibility_timeout` segundos; si el worker muere sin cerrarlo, vuelve a
+# quedar disponible al vencer ese plazo (visibility timeout)
+class JobQueue:
+    def __init__(self, collection, visibility_timeout=300, max_attempts=5,
+                 retry_delay=10, keep_seconds=7 * 24 * 3600):
+        self.collection = collection
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.keep_seconds = keep_seconds
+        self.handlers = {}
+        self.wakeup = threading.Event()
+
+    def ensure_indexes(self):
+        return self.collection.create_indexes([
+            # claim(): trabajos disponibles, el más antiguo primero
+            IndexModel([('status', ASCENDING), ('available_at', ASCENDING)], name='status_available_at'),
+            # Los terminados (done/failed) se borran solos después de keep_seconds
+            IndexModel([('finished_at', ASCENDING)], name='finished_at_ttl',
+                       expireAfterSeconds=self.keep_seconds),
+        ])
+
+    # Registrar la función que procesa los trabajos `name`
+    def handler(self, name):
+        def decorator(func):
+            self.handlers[name] = func
+            return func
+        return decorator
+
+    def enqueue(self, name, payload=None, delay=0, max_attempts=None):
+        now = datetime.utcnow()
+        job = {
+            'name': name,
+            'payload': payload or {},
+            'status': QUEUED,
+            'attempts': 0,
+            'max_attempts': max_attempts or self.max_attempts,
+            'available_at': now + timedelta(seconds=delay),
+            'created_at': now
+        }
+        self.collection.insert_one(job)
+        self.wakeup.set()
+        return job['_id']
+
+    def claim(self, worker_id):
+        now = datetime.utcnow()
+        return self.collection.find_one_and_update(
+            {'status': {'$in': [QUEUED, RUNNING]}, 'available_at': {'$lte': now}},
+            {'$set': {'status': RUNNING, 'worker': worker_id, 'started_at': now,
+                      'available_at': now + timedelta(seconds=self.visibility_timeout)},
+             '$inc': {'attempts': 1}},
+            sort=[('available_at', ASCENDING)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    # Cerrar el trabajo solo si sigue siendo nuestro (mismo intento); si el
+    # plazo venció y otro worker lo tomó, este resultado se descarta
+    def _finish(self, job, fields):
+        result = self.collection.update_one(
+            {'_id': job['_id'], 'status': RUNNING, 'attempts': job['attempts']},
+            {'$set': fields}
+        )
+        return result.modified_count == 1
+
+    # Tomar y ejecutar un trabajo. Devuelve False si no había ninguno disponible
+    def run_one(self, worker_id):
+        job = self.claim(worker_id)
+        if job is None:
+            return False
+        handler = self.handlers.get(job['name'])
+        now = datetime.utcnow()
+        if handler is None:
+            self._finish(job, {'status': FAILED, 'finished_at': now,
+                               'error': f"Sin handler para {job['name']}"})
+            return True
+        if job['attempts'] > job['max_attempts']:
+            self._finish(job, {'status': FAILED, 'finished_at': now,
+                               'error': job.get('error') or 'Plazo vencido en todos los intentos'})
+            return True
+        try:
+            result = handler(job['payload'])
+        except Exception as e:
+            print(f"❌ Trabajo {job['name']} ({job['_id']}) intento {job['attempts']}: {e}")
+            error = ''.join(traceback.format_exception_only(type(e), e)).strip()
+            if job['attempts'] >= job['max_attempts']:
+                self._finish(job, {'status': FAILED, 'error': error, 'finished_at': datetime.utcnow()})
+            else:
+                # Reintento con espera exponencial: retry_delay, 2x, 4x, ...
+                delay = self.retry_delay * 2 ** (job['attempts'] - 1)
+                self._finish(job, {'status': QUEUED, 'error': error,
+                                   'available_at': datetime.utcnow() + timedelta(seconds=delay)})
+            return True
+        self._finish(job, {'status': DONE, 'result': result, 'finished_at': datetime.utcnow()})
+        return True
+
+    # Trabajos largos: renovar el plazo de visibilidad del que está corriendo
+    # (para que no lo tome otro worker) y guardar su avance
+    def heartbeat(self, query, **fields):
+        fields['available_at'] = datetime.utcnow() + timedelta(seconds=self.visibility_timeout)
+        self.collection.update_one(dict(query, status=RUNNING), {'$set': fields})
+
+    def stats(self):
+        counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        for row in self.collection.aggregate([{'$group': {'_id': '$status', 'count': {'$sum': 1}}}]):
+            counts[row['_id']] = row['count']
+        return counts
+
+
+# Pool de hilos que consume la cola; uno por proceso (dentro de cada worker de
+# gunicorn) o en primer plano con `flask jobs --work`
+class JobWorker:
+    def __init__(self, queue, threads=1, poll_interval=2.0):
+        self.queue = queue
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self._pid = None
+        self._stop = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self._pid == os.getpid() or self.threads <= 0:
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._threads = []
+            for n in range(self.threads):
+                worker_id = f"{socket.gethostname()}:{os.getpid()}:{n}"
+                thread = threading.Thread(target=self._loop, args=(worker_id,),
+                                          name=f'job-worker-{n}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            print(f"✅ {self.threads} worker(s) de trabajos iniciados (pid {self._pid})")
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self.queue.wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def join(self):
+        for thread in self._threads:
+            while thread.is_alive():
+                thread.join(1.0)
+
+    def _loop(self, worker_id):
+        while not self._stop.is_set():
+            try:
+                worked = self.queue.run_one(worker_id)
+            except Exception as e:
+                print(f"❌ Error en el worker de trabajos {worker_id}: {e}")
+                worked = False
+            if not worked:
+                # Esperar a un enqueue de este proceso o al siguiente sondeo
+                self.queue.wakeup.wait(self.poll_interval)
+                self.queue.wakeup.clear()
@@ -0,0 +1,184 @@
+# migrations.py - Migraciones de datos versionadas y reanudables (flask migrate)
+import copy
+import os
+import socket
+from datetime import datetime, timedelta
+
+from pymongo import ASCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from auth import DEFAULT_ADDRESS, DEFAULT_NOTIFICATIONS
+from order_stats import baseline_target, baseline_update, compute_users_stats
+
+RUNNING = 'running'
+DONE = 'done'
+
+# version -> (nombre, función). Cada migración recibe (db, ctx) y debe poder
+# repetirse: un update_many filtrado (los ya migrados no coinciden) o lotes
+# por _id con checkpoint (ctx.batches)
+MIGRATIONS = {}
+
+
+def migration(version, name):
+    def decorator(func):
+        if version in MIGRATIONS:
+            raise ValueError(f"Migración {version} duplicada")
+        MIGRATIONS[version] = (name, func)
+        return func
+    return decorator
+
+
+class MigrationLocked(Exception):
+    pass
+
+
+# Estado de una migración en curso: checkpoint (último _id procesado),
+# contadores y renovación del candado en db.migrations
+class MigrationContext:
+    def __init__(self, runner, doc, progress=None):
+        self.runner = runner
+        self.version = doc['_id']
+        self.checkpoint = doc.get('checkpoint')
+        self.counts = dict(doc.get('counts') or {})
+        self.progress = progress
+
+    def save(self, checkpoint=None, **counts):
+        for name, value in counts.items():
+            self.counts[name] = self.counts.get(name, 0) + value
+        fields = {'counts': self.counts, 'locked_until': self.runner.lease_deadline()}
+        if checkpoint is not None:
+            self.checkpoint = checkpoint
+            fields['checkpoint'] = checkpoint
+        result = self.runner.collection.update_one({'_id': self.version, 'owner': self.runner.owner},
+                                                   {'$set': fields})
+        # El plazo venció y otro proceso la tomó: este se detiene
+        if not result.matched_count:
+            raise MigrationLocked(f"Migración {self.version}: el candado pasó a otro proceso")
+        if self.progress:
+            self.progress(self.version, self.counts)
+
+    # Recorrer `query` en lotes por _id a partir del checkpoint. El checkpoint
+    # se guarda cuando el que llama pide el siguiente lote, así un lote que
+    # falló a medias se repite completo al reanudar
+    def batches(self, collection, query=None, projection=None, batch_size=None):
+        batch_size = batch_size or self.runner.batch_size
+        while True:
+            page_query = dict(query or {})
+            if self.checkpoint is not None:
+                page_query['_id'] = {'$gt': self.checkpoint}
+            batch = list(collection.find(page_query, projection)
+                         .sort('_id', ASCENDING).limit(batch_size))
+            if not batch:
+                return
+            yield batch
+            self.save(batch[-1]['_id'], scanned=len(batch))
+            if len(batch) < batch_size:
+                return
+
+
+# Aplica en orden las migraciones pendientes. Cada una tiene un documento
+# {_id: versión, status, checkpoint, counts} en db.migrations; un candado
+# con plazo (locked_until) evita que dos procesos corran la misma a la vez
+class MigrationRunner:
+    def __init__(self, db, migrations=None, batch_size=1000, lease=300):
+        self.db = db
+        self.collection = db.migrations
+        self.migrations = MIGRATIONS if migrations is None else migrations
+        self.batch_size = batch_size
+        self.lease = lease
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+
+    def lease_deadline(self):
+        return datetime.utcnow() + timedelta(seconds=self.lease)
+
+    def status(self):
+        docs = {doc['_id']: doc for doc in self.collection.find({})}
+        return [(version, name, docs.get(version))
+                for version, (name, _) in sorted(self.migrations.items())]
+
+    def pending(self):
+        return [(version, name) for version, name, doc in self.status()
+                if doc is None or doc.get('status') != DONE]
+
+    def _acquire(self, version, name):
+        now = datetime.utcnow()
+        try:
+            return self.collection.find_one_and_update(
+                {'_id': version, 'status': {'$ne': DONE},
+                 '$or': [{'locked_until': None}, {'locked_until': {'$lt': now}}]},
+                {'$set': {'name': name, 'status': RUNNING, 'owner': self.owner,
+                          'locked_until': self.lease_deadline()},
+                 '$setOnInsert': {'started_at': now}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Ya existe: terminada o con el candado de otro proceso
+            raise MigrationLocked(f"Migración {version} ({name}) en curso en otro proceso")
+
+    # Correr las pendientes hasta `target` (inclusive). Devuelve las versiones aplicadas
+    def run(self, target=None, progress=None):
+        applied = []
+        for version, name in self.pending():
+            if target is not None and version > target:
+                break
+            doc = self._acquire(version, name)
+            ctx = MigrationContext(self, doc, progress)
+            try:
+                self.migrations[version][1](self.db, ctx)
+            except BaseException:
+                self.collection.update_one({'_id': version, 'owner': self.owner},
+                                           {'$set': {'locked_until': None}})
+                raise
+            self.collection.update_one(
+                {'_id': version, 'owner': self.owner},
+                {'$set': {'status': DONE, 'counts': ctx.counts, 'finished_at': datetime.utcnow(),
+                          'locked_until': None}}
+            )
+            applied.append(version)
+        return applied
+
+
+# Usuarios anteriores sin preferencias de notificación o sin dirección:
+# antes se completaban en memoria cada vez que se cargaba el usuario
+@migration(1, 'user_notifications_address')
+def user_defaults(db, ctx):
+    for field, default in (('notifications', DEFAULT_NOTIFICATIONS), ('direccion', DEFAULT_ADDRESS)):
+        result = db.users.update_many({field: {'$exists': False}},
+                                      {'$set': {field: copy.deepcopy(default)}})
+        ctx.save(**{field: result.modified_count})
+
+
+# Resumen de pedidos (order_stats) para los usuarios que aún no lo tienen,
+# así get_user_stats ya no lo calcula en el primer request del usuario. Mismo
+# criterio que get_user_stats: solo pedidos anteriores a la marca de cada
+# usuario, y el update condicional no pisa lo que sumó record_order mientras corre
+@migration(2, 'order_stats_backfill')
+def order_stats_backfill(db, ctx):
+    for batch in ctx.batches(db.users, projection={'email': 1}):
+        emails = [user['email'] for user in batch if user.get('email')]
+        existing = {doc['_id']: doc for doc in db.order_stats.find({'_id': {'$in': emails}})}
+        now = datetime.utcnow()
+        # Usuarios agrupados por marca: casi todos comparten now - SETTLE
+        by_watermark = {}
+        for email in emails:
+            target = baseline_target(existing.get(email), now)
+            if target is not None:
+                by_watermark.setdefault(target[0], []).append((email, target[1]))
+        ops = []
+        for watermark, pending in by_watermark.items():
+            summaries = compute_users_stats(db.orders, [email for email, _ in pending], before=watermark)
+            ops.extend(UpdateOne(dict(query, _id=email), baseline_update(summaries[email], watermark), upsert=True)
+                       for email, query in pending)
+        if not ops:
+            continue
+        try:
+            result = db.order_stats.bulk_write(ops, ordered=False)
+            details = result.bulk_api_result
+        except BulkWriteError as e:
+            # Choque de _id: otro proceso (o un pedido nuevo) se adelantó; ese
+            # usuario se completa en su siguiente get_user_stats
+            if any(error.get('code') != 11000 for error in e.details.get('writeErrors', [])):
+                raise
+            details = e.details
+        ctx.save(summaries=details.get('nUpserted', 0) + details.get('nModified', 0))
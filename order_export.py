@@ -0,0 +1,191 @@
+# order_export.py - Exportación de pedidos en streaming (CSV / JSONL) y reporte por día
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+from bson.objectid import ObjectId
+
+FORMATS = ('csv', 'jsonl')
+STATUSES = ('pendiente', 'completado', 'cancelado')
+# Las órdenes sin `status` cuentan como pendientes (igual que order_stats)
+DEFAULT_STATUS = 'pendiente'
+
+EXPORT_PROJECTION = {
+    'user_email': 1,
+    'address': 1,
+    'status': 1,
+    'total': 1,
+    'created_at': 1,
+    'items.product_id': 1,
+    'items.name': 1,
+    'items.qty': 1,
+    'items.price': 1,
+    'items.subtotal': 1
+}
+ORDER_FIELDS = ['order_id', 'created_at', 'user_email', 'status', 'total', 'lines', 'units',
+                'address', 'products']
+LINE_FIELDS = ['order_id', 'created_at', 'user_email', 'status', 'product_id', 'name', 'qty',
+               'price', 'subtotal']
+# Bytes que se juntan antes de entregar un pedazo de la respuesta
+CHUNK_SIZE = 64 * 1024
+
+
+def _parse_date(value, name):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f"Fecha inválida en {name}: {value} (use AAAA-MM-DD)")
+
+
+# Filtros de la exportación desde los parámetros del request o del CLI:
+# ?from=AAAA-MM-DD&to=AAAA-MM-DD (ambos inclusive) y ?status= repetible
+class OrderFilters:
+    def __init__(self, start=None, end=None, statuses=()):
+        self.start = start
+        self.end = end
+        self.statuses = list(statuses)
+
+    @classmethod
+    def parse(cls, start=None, end=None, statuses=()):
+        start = _parse_date(start, 'from') if start else None
+        end = _parse_date(end, 'to') if end else None
+        if start and end and end < start:
+            raise ValueError('La fecha final es anterior a la inicial')
+        statuses = [s for s in statuses if s]
+        unknown = [s for s in statuses if s not in STATUSES]
+        if unknown:
+            raise ValueError(f"Estado desconocido: {', '.join(unknown)}")
+        return cls(start, end, statuses)
+
+    @classmethod
+    def from_args(cls, args):
+        return cls.parse(args.get('from'), args.get('to'), args.getlist('status'))
+
+    def query(self):
+        query = {}
+        if self.start or self.end:
+            query['created_at'] = {}
+            if self.start:
+                query['created_at']['$gte'] = self.start
+            if self.end:
+                query['created_at']['$lt'] = self.end + timedelta(days=1)
+        if self.statuses:
+            statuses = list(self.statuses)
+            if DEFAULT_STATUS in statuses:
+                statuses.append(None)
+            query['status'] = {'$in': statuses}
+        return query
+
+    def filename(self, fmt):
+        parts = ['pedidos']
+        if self.start:
+            parts.append(f"{self.start:%Y%m%d}")
+        if self.end:
+            parts.append(f"{self.end:%Y%m%d}")
+        parts.extend(self.statuses)
+        return f"{'-'.join(parts)}.{fmt}"
+
+
+def _json_default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} no es serializable")
+
+
+def _order_row(order):
+    items = order.get('items') or []
+    return [
+        str(order['_id']),
+        order['created_at'].isoformat() if order.get('created_at') else '',
+        order.get('user_email', ''),
+        order.get('status') or DEFAULT_STATUS,
+        order.get('total', 0),
+        len(items),
+        sum(item.get('qty', 0) for item in items),
+        order.get('address', ''),
+        '; '.join(f"{item.get('name', '')} x{item.get('qty', 0)}" for item in items)
+    ]
+
+
+def _line_rows(order):
+    head = _order_row(order)[:4]
+    for item in order.get('items') or []:
+        yield head + [str(item.get('product_id', '')), item.get('name', ''), item.get('qty', 0),
+                      item.get('price', 0), item.get('subtotal', 0)]
+
+
+# Pedidos que cumplen los filtros, del más antiguo al más reciente, en
+# pedazos de ~CHUNK_SIZE: el cursor trae `batch_size` documentos por viaje
+# y nunca hay más de un lote en memoria. Con lines=True sale un renglón
+# por producto del pedido (solo CSV)
+def export_orders(orders, filters, fmt='csv', lines=False, batch_size=500):
+    cursor = orders.find(filters.query(), EXPORT_PROJECTION) \
+        .sort([('created_at', 1), ('_id', 1)]).batch_size(batch_size)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if fmt == 'csv':
+        # BOM para que Excel abra bien los acentos
+        buffer.write('\ufeff')
+        writer.writerow(LINE_FIELDS if lines else ORDER_FIELDS)
+    try:
+        for order in cursor:
+            if fmt == 'jsonl':
+                order['order_id'] = str(order.pop('_id'))
+                order.setdefault('status', DEFAULT_STATUS)
+                buffer.write(json.dumps(order, default=_json_default, ensure_ascii=False))
+                buffer.write('\n')
+            elif lines:
+                writer.writerows(_line_rows(order))
+            else:
+                writer.writerow(_order_row(order))
+            if buffer.tell() >= CHUNK_SIZE:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+    finally:
+        cursor.close()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+# Reporte de los mismos filtros: pedidos e ingresos por día y por estado,
+# agregados en la base (una sola consulta $facet)
+def order_report(orders, filters):
+    status = {'$ifNull': ['$status', DEFAULT_STATUS]}
+    pipeline = [
+        {'$match': filters.query()},
+        {'$facet': {
+            'days': [
+                {'$group': {
+                    '_id': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$created_at'}},
+                    'orders': {'$sum': 1},
+                    'revenue': {'$sum': {'$ifNull': ['$total', 0]}}
+                }},
+                {'$sort': {'_id': 1}}
+            ],
+            'by_status': [
+                {'$group': {
+                    '_id': status,
+                    'orders': {'$sum': 1},
+                    'revenue': {'$sum': {'$ifNull': ['$total', 0]}}
+                }}
+            ]
+        }}
+    ]
+    result = next(iter(orders.aggregate(pipeline)), {'days': [], 'by_status': []})
+    days = [{'date': row['_id'], 'orders': row['orders'], 'revenue': round(row['revenue'], 2)}
+            for row in result['days']]
+    by_status = {row['_id']: {'orders': row['orders'], 'revenue': round(row['revenue'], 2)}
+                 for row in result['by_status']}
+    return {
+        'from': filters.start.date().isoformat() if filters.start else None,
+        'to': filters.end.date().isoformat() if filters.end else None,
+        'statuses': filters.statuses,
+        'orders': sum(row['orders'] for row in days),
+        'revenue': round(sum(row['revenue'] for row in days), 2),
+        'days': days,
+        'by_status': by_status
+    }
@@ -0,0 +1,146 @@
+# order_stats.py - Resumen de pedidos por usuario mantenido de forma incremental
+from datetime import datetime, timedelta
+
+from pymongo.errors import DuplicateKeyError
+
+# Campos que usa la lista de order_history.html
+ORDER_LIST_PROJECTION = {
+    'user_email': 1,
+    'status': 1,
+    'total': 1,
+    'created_at': 1,
+    'items.product_id': 1
+}
+
+
+# Pedidos más recientes que esto pueden estar "en vuelo" (insertados pero
+# aún sin record_order): el cálculo completo nunca los cuenta
+SETTLE = timedelta(minutes=5)
+
+
+def _empty_summary():
+    return {'total_orders': 0, 'total_spent': 0.0, 'by_status': {}}
+
+
+# Calcular el resumen desde cero con un solo $group (para usuarios sin resumen)
+def compute_user_stats(orders, email, before=None):
+    return compute_users_stats(orders, [email], before)[email]
+
+
+# Lo mismo para varios usuarios en una sola agregación: {email: resumen}.
+# Con `before` solo cuentan los pedidos creados antes de esa fecha
+def compute_users_stats(orders, emails, before=None):
+    summaries = {email: _empty_summary() for email in emails}
+    match = {'user_email': {'$in': list(emails)}}
+    if before is not None:
+        match['created_at'] = {'$lt': before}
+    pipeline = [
+        {'$match': match},
+        {'$group': {
+            '_id': {'email': '$user_email', 'status': {'$ifNull': ['$status', 'pendiente']}},
+            'count': {'$sum': 1},
+            'spent': {'$sum': {'$ifNull': ['$total', 0]}}
+        }}
+    ]
+    for row in orders.aggregate(pipeline):
+        summary = summaries[row['_id']['email']]
+        summary['total_orders'] += row['count']
+        summary['total_spent'] += float(row['spent'])
+        summary['by_status'][row['_id']['status']] = row['count']
+    return summaries
+
+
+# El resumen {_id: email} se arma de dos partes que nunca se enciman:
+# - record_order suma cada pedido con upsert; `since` es la fecha del pedido
+#   más antiguo sumado así
+# - el cálculo completo cuenta los pedidos anteriores a `computed_at`
+#   (la marca: antes de `since` y de SETTLE) y la fija en el documento
+# Un pedido anterior a computed_at que llega tarde a record_order ya está en
+# el cálculo y no se vuelve a sumar
+
+
+# Marca y filtro para aplicar el cálculo completo a un resumen existente
+# (o inexistente); None si ya se calculó
+def baseline_target(doc, now=None):
+    if doc is not None and doc.get('computed_at') is not None:
+        return None
+    watermark = (now or datetime.utcnow()) - SETTLE
+    query = {'computed_at': {'$exists': False}}
+    since = doc.get('since') if doc is not None else None
+    if since is None:
+        query['since'] = {'$exists': False}
+    else:
+        query['since'] = since
+        watermark = min(watermark, since)
+    return watermark, query
+
+
+# Actualización que suma el cálculo completo al resumen y fija la marca
+def baseline_update(summary, watermark):
+    inc = {'total_orders': summary['total_orders'], 'total_spent': summary['total_spent']}
+    for status, count in summary['by_status'].items():
+        inc[f'by_status.{status}'] = count
+    return {'$inc': inc, '$set': {'computed_at': watermark}}
+
+
+# Resumen del usuario; si aún no tiene el cálculo completo se hace una vez.
+# Si otro proceso lo aplicó primero (o llegó un pedido que movió `since`)
+# el upsert choca con el _id existente: se relee y se reintenta
+def get_user_stats(db, email, attempts=3):
+    summary = db.order_stats.find_one({'_id': email})
+    for _ in range(attempts):
+        target = baseline_target(summary)
+        if target is None:
+            break
+        watermark, query = target
+        baseline = compute_user_stats(db.orders, email, before=watermark)
+        try:
+            db.order_stats.update_one(dict(query, _id=email), baseline_update(baseline, watermark), upsert=True)
+        except DuplicateKeyError:
+            pass
+        summary = db.order_stats.find_one({'_id': email})
+    summary = summary or {}
+    by_status = summary.get('by_status', {})
+    return {
+        'total_orders': summary.get('total_orders', 0),
+        'total_spent': summary.get('total_spent', 0.0),
+        'pending_orders': by_status.get('pendiente', 0),
+        'completed_orders': by_status.get('completado', 0)
+    }
+
+
+# Sumar una orden nueva al resumen (con upsert: nunca se pierde). Si el
+# resumen ya tiene una marca posterior a la orden, el cálculo completo ya la
+# contó y el upsert choca con el _id existente
+def record_order(db, order):
+    status = order.get('status', 'pendiente')
+    created_at = order['created_at']
+    try:
+        db.order_stats.update_one(
+            {'_id': order['user_email'],
+             '$or': [{'computed_at': {'$exists': False}}, {'computed_at': {'$lte': created_at}}]},
+            {'$inc': {
+                'total_orders': 1,
+                'total_spent': float(order.get('total', 0)),
+                f'by_status.{status}': 1
+            }, '$min': {'since': created_at}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        pass
+
+
+# Mover el conteo de una orden que cambió de estado. Solo si el resumen la
+# incluye: ya calculado, o la orden se sumó con record_order (no es anterior
+# a `since`); si no, el cálculo completo leerá el estado nuevo.
+# Ninguna ruta cambia todavía el estado de los pedidos: el cambio de estado
+# del admin debe llamar esto después de actualizar la orden
+def apply_status_change(db, order, old_status, new_status):
+    old_status = old_status or 'pendiente'
+    if old_status == new_status:
+        return
+    db.order_stats.update_one(
+        {'_id': order['user_email'],
+         '$or': [{'computed_at': {'$exists': True}}, {'since': {'$lte': order['created_at']}}]},
+        {'$inc': {f'by_status.{old_status}': -1, f'by_status.{new_status}': 1}}
+    )
@@ -0,0 +1,114 @@
+# pagination.py - Paginación por cursor (keyset) sobre created_at/_id
+import base64
+from datetime import datetime
+
+from bson.objectid import ObjectId
+
+# Campos que usan las tarjetas del catálogo (index.html)
+PRODUCT_CARD_PROJECTION = {
+    'name': 1,
+    'price': 1,
+    'description': 1,
+    'category': 1,
+    'image': 1,
+    'image_variants': 1
+}
+
+# Campos que usa la tabla de administración (admin_products.html)
+ADMIN_PRODUCT_PROJECTION = dict(PRODUCT_CARD_PROJECTION, active=1, created_at=1)
+
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+# Resultado de una página: documentos + cursor para la siguiente
+class Page:
+    def __init__(self, items, next_cursor=None, page_size=0):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.page_size = page_size
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+# El cursor es "<timestamp ISO>|<ObjectId>" en base64 urlsafe
+def encode_cursor(doc, sort_field='created_at'):
+    value = doc.get(sort_field)
+    stamp = value.isoformat() if isinstance(value, datetime) else ''
+    raw = f"{stamp}|{doc['_id']}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        stamp, oid = base64.urlsafe_b64decode(padded.encode()).decode().split('|', 1)
+        return (datetime.fromisoformat(stamp) if stamp else None), ObjectId(oid)
+    except Exception:
+        raise InvalidCursor(token)
+
+
+# Leer el tamaño de página de la query string, acotado a [1, MAX_PAGE_SIZE]
+def parse_page_size(value, default):
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+# Condición "después de este cursor" en orden descendente (created_at, _id)
+def _after_clause(cursor, sort_field):
+    value, oid = cursor
+    if value is None:
+        return {sort_field: None, '_id': {'$lt': oid}}
+    return {'$or': [
+        {sort_field: {'$lt': value}},
+        {sort_field: value, '_id': {'$lt': oid}},
+        {sort_field: None}
+    ]}
+
+
+# Obtener una página ordenada por (sort_field desc, _id desc) usando el índice
+def keyset_page(collection, query=None, projection=None, page_size=24, after=None,
+                sort_field='created_at'):
+    query = dict(query or {})
+    if after:
+        clause = _after_clause(decode_cursor(after), sort_field)
+        query = {'$and': [query, clause]} if query else clause
+    if projection:
+        # El cursor necesita el campo de ordenamiento aunque la vista no lo use
+        projection = dict(projection, **{sort_field: 1})
+
+    cursor = collection.find(query, projection).sort([(sort_field, -1), ('_id', -1)])
+    docs = list(cursor.limit(page_size + 1))
+
+    next_cursor = None
+    if len(docs) > page_size:
+        docs = docs[:page_size]
+        next_cursor = encode_cursor(docs[-1], sort_field)
+    return Page(docs, next_cursor, page_size)
+
+
+# Contadores de la página de administración en una sola agregación
+def product_totals(collection):
+    def has_value(field):
+        return {'$cond': [{'$gt': [{'$ifNull': [f'${field}', '']}, '']}, 1, 0]}
+
+    pipeline = [{'$group': {
+        '_id': None,
+        'total': {'$sum': 1},
+        'active': {'$sum': {'$cond': [{'$eq': ['$active', True]}, 1, 0]}},
+        'with_image': {'$sum': has_value('image')},
+        'with_category': {'$sum': has_value('category')}
+    }}]
+    result = next(iter(collection.aggregate(pipeline)), None)
+    totals = {'total': 0, 'active': 0, 'with_image': 0, 'with_category': 0}
+    if result:
+        totals.update({k: result[k] for k in totals})
+    return totals
@@ -0,0 +1,195 @@
+# product_cache.py - Caché en proceso del catálogo (LRU + TTL)
+import bisect
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from bson.objectid import ObjectId
+
+from pagination import Page, decode_cursor, encode_cursor
+
+
+# Caché LRU con expiración por entrada y contadores de aciertos/fallos
+class TTLCache:
+    def __init__(self, maxsize=1024, ttl=60, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._data = OrderedDict()   # llave -> (expira_en, valor)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at <= self.clock():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (self.clock() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_ratio': round(self.hits / total, 4) if total else 0.0
+        }
+
+
+# Llave de orden descendente del catálogo: (tiene fecha, created_at, _id)
+def _sort_key(doc):
+    created_at = doc.get('created_at')
+    return (created_at is not None, created_at or datetime.min, doc['_id'])
+
+
+def _cursor_key(cursor):
+    created_at, oid = cursor
+    return (created_at is not None, created_at or datetime.min, oid)
+
+
+# Foto completa del catálogo ordenada, para paginar sin ir a MongoDB
+class CatalogSnapshot:
+    def __init__(self, docs):
+        self.docs = sorted(docs, key=_sort_key)       # ascendente
+        self.keys = [_sort_key(d) for d in self.docs]
+
+    def __len__(self):
+        return len(self.docs)
+
+    # Misma semántica que pagination.keyset_page, pero en memoria
+    def page(self, page_size, after=None):
+        end = len(self.docs)
+        if after:
+            end = bisect.bisect_left(self.keys, _cursor_key(decode_cursor(after)))
+        start = max(0, end - page_size)
+        items = [dict(d) for d in reversed(self.docs[start:end])]
+        next_cursor = encode_cursor(items[-1]) if start > 0 and items else None
+        return Page(items, next_cursor, page_size)
+
+
+# Caché de productos: por ObjectId y una foto de todo el catálogo
+class ProductCache:
+    def __init__(self, products, maxsize=1024, ttl=60, snapshot_max=5000):
+        self.products = products
+        self.items = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.snapshot_ttl = ttl
+        self.snapshot_max = snapshot_max
+        self._snapshot = None
+        self._snapshot_expires = 0.0
+        # El catálogo no cabe en la foto: se recuerda durante el TTL para no
+        # volver a contar/cargar documentos en cada request
+        self._oversize = False
+        self._snapshot_lock = threading.Lock()
+        self.snapshot_hits = 0
+        self.snapshot_misses = 0
+
+    @staticmethod
+    def _key(pid):
+        return pid if isinstance(pid, ObjectId) else ObjectId(pid)
+
+    # Producto por id; None si no existe. Lanza error si el id es inválido
+    def get(self, pid):
+        key = self._key(pid)
+        doc = self.items.get(key)
+        if doc is None:
+            doc = self.products.find_one({'_id': key})
+            if doc is None:
+                return None
+            self.items.set(key, doc)
+        return dict(doc)
+
+    # Varios productos a la vez: los fallos se resuelven con un solo $in
+    def get_many(self, ids):
+        found = {}
+        missing = []
+        for oid in ids:
+            doc = self.items.get(oid)
+            if doc is None:
+                missing.append(oid)
+            else:
+                found[oid] = dict(doc)
+        if missing:
+            for doc in self.products.find({'_id': {'$in': missing}}):
+                self.items.set(doc['_id'], doc)
+                found[doc['_id']] = dict(doc)
+        return found
+
+    # Foto del catálogo completo; None si el catálogo excede snapshot_max
+    def snapshot(self):
+        if self._snapshot_expires > time.monotonic():
+            self.snapshot_hits += 1
+            return self._snapshot
+        with self._snapshot_lock:
+            if self._snapshot_expires > time.monotonic():
+                self.snapshot_hits += 1
+                return self._snapshot
+            self.snapshot_misses += 1
+            # Conteo estimado (metadatos) antes de traer documentos
+            docs = None
+            if self.products.estimated_document_count() <= self.snapshot_max:
+                docs = list(self.products.find().limit(self.snapshot_max + 1))
+            self._oversize = docs is None or len(docs) > self.snapshot_max
+            self._snapshot = None if self._oversize else CatalogSnapshot(docs)
+            self._snapshot_expires = time.monotonic() + self.snapshot_ttl
+            return self._snapshot
+
+    # Invalidar después de escrituras del admin (pid=None limpia todo)
+    def invalidate(self, pid=None):
+        if pid is None:
+            self.items.clear()
+        else:
+            try:
+                self.items.delete(self._key(pid))
+            except Exception:
+                pass
+        with self._snapshot_lock:
+            self._snapshot = None
+            self._snapshot_expires = 0.0
+            self._oversize = False
+
+    def stats(self):
+        total = self.snapshot_hits + self.snapshot_misses
+        return {
+            'products': self.items.stats(),
+            'snapshot': {
+                'size': len(self._snapshot) if self._snapshot is not None else 0,
+                'max': self.snapshot_max,
+                'oversize': self._oversize,
+                'hits': self.snapshot_hits,
+                'misses': self.snapshot_misses,
+                'hit_ratio': round(self.snapshot_hits / total, 4) if total else 0.0
+            }
+        }
@@ -0,0 +1,260 @@
+# profiling.py - Instrumentación opcional por request: consultas, render y perfil
+import html
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+from flask import before_render_template, g, request, template_rendered
+from pymongo import monitoring
+
+from sqlite_store import SQLiteDatabase
+
+_local = threading.local()
+
+
+def current_stats():
+    return getattr(_local, 'stats', None)
+
+
+# Métricas de un request: consultas (cuántas, tiempo, por colección), render y perfil
+class RequestStats:
+    def __init__(self, endpoint, path):
+        self.endpoint = endpoint
+        self.path = path
+        self.started = time.perf_counter()
+        self.total_ms = None
+        self.queries = 0
+        self.db_ms = 0.0
+        self.render_ms = 0.0
+        self.templates = []
+        self.by_operation = Counter()    # 'products.find' -> conteo
+        self.slowest = []                # [(ms, 'products.find')] las más lentas
+        self.profile = None
+        self._render_started = []
+        self._pending = {}               # request_id de pymongo -> colección
+
+    def add_query(self, collection, operation, ms):
+        self.queries += 1
+        self.db_ms += ms
+        key = f"{collection}.{operation}" if collection else operation
+        self.by_operation[key] += 1
+        self.slowest.append((ms, key))
+        if len(self.slowest) > 20:
+            self.slowest.sort(reverse=True)
+            del self.slowest[10:]
+
+    def as_dict(self):
+        return {
+            'endpoint': self.endpoint,
+            'path': self.path,
+            'total_ms': round(self.total_ms or 0, 2),
+            'queries': self.queries,
+            'db_ms': round(self.db_ms, 2),
+            'render_ms': round(self.render_ms, 2),
+            'templates': self.templates,
+            'by_operation': dict(self.by_operation.most_common()),
+            'slowest': [{'ms': round(ms, 2), 'op': op} for ms, op in sorted(self.slowest, reverse=True)[:10]],
+            'profile': self.profile
+        }
+
+
+# Cuenta consultas del request en curso. Sirve como CommandListener de pymongo
+# y como observador de sqlite_store (operation); los eventos llegan en el hilo
+# que hizo la consulta, así que el request se encuentra con un threading.local
+class QueryListener(monitoring.CommandListener):
+    def started(self, event):
+        stats = current_stats()
+        if stats is not None:
+            collection = event.command.get(event.command_name)
+            stats._pending[event.request_id] = collection if isinstance(collection, str) else None
+
+    def _finished(self, event):
+        stats = current_stats()
+        if stats is not None:
+            collection = stats._pending.pop(event.request_id, None)
+            stats.add_query(collection, event.command_name, event.duration_micros / 1000)
+
+    def succeeded(self, event):
+        self._finished(event)
+
+    def failed(self, event):
+        self._finished(event)
+
+    def operation(self, collection, name, seconds):
+        stats = current_stats()
+        if stats is not None:
+            stats.add_query(collection, name, seconds * 1000)
+
+
+# Perfil por muestreo: un hilo toma la pila del hilo del request cada
+# `interval` segundos; las funciones con más muestras son las que más tardan
+class Sampler:
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = 0
+        self.inclusive = Counter()
+        self.leaf = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    @staticmethod
+    def _label(frame):
+        code = frame.f_code
+        return f"{'/'.join(code.co_filename.split('/')[-2:])}:{code.co_name}:{code.co_firstlineno}"
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            self.samples += 1
+            self.leaf[self._label(frame)] += 1
+            seen = set()
+            while frame is not None:
+                label = self._label(frame)
+                if label not in seen:
+                    seen.add(label)
+                    self.inclusive[label] += 1
+                frame = frame.f_back
+
+    def as_dict(self, top=15):
+        # Los marcos presentes en todas las muestras (WSGI, dispatch) no dicen nada
+        inclusive = [(label, n) for label, n in self.inclusive.most_common()
+                     if n < self.samples or self.samples == 1]
+        return {
+            'interval_ms': self.interval * 1000,
+            'samples': self.samples,
+            'inclusive': inclusive[:top],
+            'leaf': self.leaf.most_common(top)
+        }
+
+
+_PANEL = """<div id="request-profile" style="position:fixed;bottom:0;right:0;z-index:2000;max-width:480px;
+max-height:60vh;overflow:auto;background:#212529;color:#f8f9fa;font:12px monospace;padding:8px;opacity:.92">
+<b>%(endpoint)s</b> %(total_ms).1f ms &middot; %(queries)d consulta(s) %(db_ms).1f ms &middot; render %(render_ms).1f ms
+<details><summary>Consultas</summary>%(operations)s<hr>%(slowest)s</details>%(profile)s</div>"""
+
+
+# Instrumentación de la app (INSTRUMENT=1): métricas por request en el header
+# Server-Timing, panel opcional en el HTML, aviso de presupuesto de consultas
+# y los últimos requests en memoria
+class Instrumentation:
+    def __init__(self, app, db, query_budget=20, panel=False, profile_rate=0.0,
+                 profile_interval=0.005, history=100):
+        self.app = app
+        self.query_budget = query_budget
+        self.panel = panel
+        self.profile_rate = profile_rate
+        self.profile_interval = profile_interval
+        self.recent = deque(maxlen=history)
+        self.over_budget = Counter()     # endpoint -> veces que se pasó
+        self.listener = QueryListener()
+        # SQLite recibe el observador directo; pymongo lo toma de monitoring
+        # para los clientes que se creen después (MongoConnection es perezoso)
+        if isinstance(db, SQLiteDatabase):
+            db.listeners.append(self.listener)
+        else:
+            monitoring.register(self.listener)
+
+        app.before_request(self._before)
+        app.after_request(self._after)
+        app.teardown_request(self._teardown)
+        before_render_template.connect(self._render_started, app)
+        template_rendered.connect(self._render_finished, app)
+
+    def _before(self):
+        stats = RequestStats(request.endpoint, request.full_path.rstrip('?'))
+        _local.stats = stats
+        g.request_stats = stats
+        wants = self.panel and request.args.get('_profile') == '1'
+        if wants or (self.profile_rate and random.random() < self.profile_rate):
+            g.request_sampler = Sampler(threading.get_ident(), self.profile_interval).start()
+
+    def _render_started(self, sender, template, context, **extra):
+        stats = current_stats()
+        if stats is not None:
+            stats._render_started.append(time.perf_counter())
+
+    def _render_finished(self, sender, template, context, **extra):
+        stats = current_stats()
+        if stats is not None and stats._render_started:
+            elapsed = (time.perf_counter() - stats._render_started.pop()) * 1000
+            # Un render dentro de otro ya cuenta en el externo
+            if not stats._render_started:
+                stats.render_ms += elapsed
+            stats.templates.append(template.name)
+
+    def _stop_sampler(self, stats):
+        sampler = g.pop('request_sampler', None)
+        if sampler is not None:
+            sampler.stop()
+            stats.profile = sampler.as_dict()
+
+    def _after(self, response):
+        stats = current_stats()
+        if stats is None:
+            return response
+        self._stop_sampler(stats)
+        stats.total_ms = (time.perf_counter() - stats.started) * 1000
+        response.headers['Server-Timing'] = ', '.join([
+            f'db;dur={stats.db_ms:.2f};desc="{stats.queries} consultas"',
+            f'render;dur={stats.render_ms:.2f}',
+            f'app;dur={stats.total_ms:.2f}'
+        ])
+        if self.query_budget and stats.queries > self.query_budget:
+            self.over_budget[stats.endpoint] += 1
+            top = ', '.join(f"{op} x{n}" for op, n in stats.by_operation.most_common(3))
+            print(f"⚠️  {stats.endpoint} ({stats.path}) hizo {stats.queries} consultas "
+                  f"(presupuesto {self.query_budget}, {stats.db_ms:.1f} ms): {top}")
+        self.recent.append(stats.as_dict())
+        if self.panel and response.mimetype == 'text/html' and not response.direct_passthrough:
+            self._inject_panel(response, stats)
+        return response
+
+    def _teardown(self, error=None):
+        stats = current_stats()
+        if stats is not None:
+            self._stop_sampler(stats)
+        _local.stats = None
+
+    def _inject_panel(self, response, stats):
+        body = response.get_data(as_text=True)
+        end = body.rfind('</body>')
+        if end < 0:
+            return
+        operations = '<br>'.join(f"{html.escape(op)} &times;{n}" for op, n in stats.by_operation.most_common())
+        slowest = '<br>'.join(f"{ms:.2f} ms {html.escape(op)}" for ms, op in sorted(stats.slowest, reverse=True)[:5])
+        profile = ''
+        if stats.profile:
+            rows = '<br>'.join(f"{n} {html.escape(label)}" for label, n in stats.profile['inclusive'])
+            profile = (f"<details><summary>Perfil ({stats.profile['samples']} muestras)</summary>"
+                       f"{rows}</details>")
+        panel = _PANEL % {
+            'endpoint': html.escape(stats.endpoint or '-'),
+            'total_ms': stats.total_ms,
+            'queries': stats.queries,
+            'db_ms': stats.db_ms,
+            'render_ms': stats.render_ms,
+            'operations': operations or '-',
+            'slowest': slowest or '-',
+            'profile': profile
+        }
+        response.set_data(body[:end] + panel + body[end:])
+
+    def stats(self):
+        return {
+            'query_budget': self.query_budget,
+            'over_budget': dict(self.over_budget),
+            'recent': list(self.recent)
+        }
@@ -0,0 +1,291 @@
+# search.py - Motor de búsqueda del catálogo de productos
+import bisect
+import heapq
+import math
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+
+from bson.objectid import ObjectId
+
+# Pesos por campo: un término en el nombre pesa más que en la descripción
+FIELD_WEIGHTS = {
+    'name': 3.0,
+    'category': 2.0,
+    'description': 1.0
+}
+
+# Palabras vacías del español que no aportan a la búsqueda
+STOPWORDS = {
+    'a', 'al', 'con', 'de', 'del', 'el', 'en', 'es', 'la', 'las', 'lo', 'los',
+    'para', 'por', 'que', 'se', 'sin', 'su', 'sus', 'un', 'una', 'unos',
+    'unas', 'y', 'o', 'u', 'e'
+}
+
+# Máximo de términos en que se expande el prefijo de la última palabra
+MAX_PREFIX_EXPANSIONS = 50
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+# Quitar acentos y pasar a minúsculas ("Analgésico" -> "analgesico")
+def fold_accents(text):
+    if not text:
+        return ''
+    decomposed = unicodedata.normalize('NFD', str(text).lower())
+    return ''.join(c for c in decomposed if unicodedata.category(c) != 'Mn')
+
+
+# Stemmer ligero para español: quita plurales y la vocal final de género
+# ("analgésicos", "analgésica" y "analgésico" comparten la raíz "analgesic")
+def stem(token):
+    if token.isdigit() or len(token) <= 3:
+        return token
+    if token.endswith('ces') and len(token) > 4:
+        token = token[:-3] + 'z'
+    elif token.endswith('es') and len(token) > 4 and token[-3] not in 'aeiou':
+        token = token[:-2]
+    elif token.endswith('s'):
+        token = token[:-1]
+    if len(token) > 4 and token[-1] in 'aeo':
+        token = token[:-1]
+    return token
+
+
+# Convertir texto libre en la lista de términos indexables
+def analyze(text):
+    return [stem(t) for t in _TOKEN_RE.findall(fold_accents(text)) if t not in STOPWORDS]
+
+
+# Índice invertido en memoria para el modo sin base de datos
+class InvertedIndex:
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings = defaultdict(dict)   # término -> {doc_id: tf ponderado}
+        self._doc_terms = {}                 # doc_id -> set de términos
+        self._doc_lengths = {}               # doc_id -> longitud ponderada
+        self._vocabulary = []                # términos ordenados para prefijos
+        self._total_length = 0.0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._doc_lengths)
+
+    def clear(self):
+        with self._lock:
+            self._postings.clear()
+            self._doc_terms.clear()
+            self._doc_lengths.clear()
+            self._vocabulary = []
+            self._total_length = 0.0
+
+    def add(self, doc_id, fields):
+        with self._lock:
+            self.remove(doc_id)
+            weights = defaultdict(float)
+            length = 0.0
+            for field, weight in FIELD_WEIGHTS.items():
+                for term in analyze(fields.get(field)):
+                    weights[term] += weight
+                    length += weight
+            for term, tf in weights.items():
+                if term not in self._postings:
+                    bisect.insort(self._vocabulary, term)
+                self._postings[term][doc_id] = tf
+            self._doc_terms[doc_id] = set(weights)
+            self._doc_lengths[doc_id] = length
+            self._total_length += length
+
+    def remove(self, doc_id):
+        with self._lock:
+            terms = self._doc_terms.pop(doc_id, None)
+            if terms is None:
+                return
+            self._total_length -= self._doc_lengths.pop(doc_id, 0.0)
+            for term in terms:
+                postings = self._postings.get(term)
+                if postings is None:
+                    continue
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+                    i = bisect.bisect_left(self._vocabulary, term)
+                    if i < len(self._vocabulary) and self._vocabulary[i] == term:
+                        del self._vocabulary[i]
+
+    def _expand_prefix(self, prefix):
+        i = bisect.bisect_left(self._vocabulary, prefix)
+        expanded = []
+        while i < len(self._vocabulary) and len(expanded) < MAX_PREFIX_EXPANSIONS:
+            term = self._vocabulary[i]
+            if not term.startswith(prefix):
+                break
+            expanded.append(term)
+            i += 1
+        return expanded
+
+    # Regresa [(doc_id, score)] ordenado por relevancia (BM25); limit=None: todos
+    def search(self, query, limit=50):
+        # Las palabras vacías se descartan solo si están completas: la última
+        # puede ser el inicio de otra ("para" -> "paracetamol")
+        tokens = _TOKEN_RE.findall(fold_accents(query))
+        raw_tokens = [t for t in tokens[:-1] if t not in STOPWORDS] + tokens[-1:]
+        if not raw_tokens:
+            return []
+
+        with self._lock:
+            n_docs = len(self._doc_lengths)
+            if not n_docs:
+                return []
+            avg_length = self._total_length / n_docs
+
+            # Cada palabra de la consulta se convierte en un grupo de términos;
+            # la última se expande por prefijo para búsquedas mientras se escribe
+            groups = []
+            for pos, token in enumerate(raw_tokens):
+                terms = set() if token in STOPWORDS else {stem(token)}
+                if pos == len(raw_tokens) - 1:
+                    terms.update(self._expand_prefix(token))
+                terms = [t for t in terms if t in self._postings]
+                # Una palabra vacía que no es prefijo de nada no cuenta
+                if terms or token not in STOPWORDS:
+                    groups.append(terms)
+            if not groups:
+                return []
+
+            scores = defaultdict(float)
+            matched = defaultdict(int)
+            for terms in groups:
+                seen = set()
+                for term in terms:
+                    postings = self._postings[term]
+                    idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for doc_id, tf in postings.items():
+                        norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[doc_id] / avg_length)
+                        scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+                        seen.add(doc_id)
+                for doc_id in seen:
+                    matched[doc_id] += 1
+
+        # Premiar documentos que cubren todas las palabras de la consulta
+        total = len(groups)
+        ranked = ((doc_id, score * matched[doc_id] / total) for doc_id, score in scores.items())
+        if limit is None:
+            return sorted(ranked, key=lambda item: item[1], reverse=True)
+        return heapq.nlargest(limit, ranked, key=lambda item: item[1])
+
+
+# Backend en memoria: índice invertido construido a partir de la colección
+class LocalSearchBackend:
+    name = 'local'
+
+    def __init__(self, db):
+        self.db = db
+        self.index = InvertedIndex()
+        self._built = False
+        self._lock = threading.Lock()
+
+    def _ensure_built(self):
+        if self._built:
+            return
+        with self._lock:
+            if self._built:
+                return
+            self.rebuild()
+
+    def rebuild(self):
+        self.index.clear()
+        projection = {field: 1 for field in FIELD_WEIGHTS}
+        for prod in self.db.products.find({}, projection):
+            self.index.add(str(prod['_id']), prod)
+        self._built = True
+
+    # Releer un producto de la base y actualizar su entrada (pid=None: reconstruir)
+    def refresh_product(self, pid):
+        if not self._built:
+            return
+        if pid is None:
+            self._built = False
+            return
+        projection = {field: 1 for field in FIELD_WEIGHTS}
+        prod = self.db.products.find_one({'_id': ObjectId(pid)}, projection)
+        if prod:
+            self.index.add(str(prod['_id']), prod)
+        else:
+            self.index.remove(str(pid))
+
+    # Con `filter` el índice no sabe de precios ni categorías: se recorren los
+    # resultados por relevancia en tandas y la base aplica el filtro
+    def search(self, query, limit, filter=None):
+        self._ensure_built()
+        ranked = self.index.search(query, None if filter else limit)
+        results = []
+        step = max(limit, 200)
+        for start in range(0, len(ranked), step):
+            window = ranked[start:start + step]
+            ids = [ObjectId(doc_id) for doc_id, _ in window]
+            by_id = {str(p['_id']): p for p in self.db.products.find(dict(filter or {}, _id={'$in': ids}))}
+            results.extend(by_id[doc_id] for doc_id, _ in window if doc_id in by_id)
+            if len(results) >= limit:
+                break
+        return results[:limit]
+
+
+# Backend MongoDB: índice de texto con stemming en español y sin acentos
+class MongoTextSearchBackend:
+    name = 'mongo'
+    index_name = 'products_text'
+
+    def __init__(self, db):
+        self.db = db
+        self._index_ready = False
+
+    def ensure_index(self):
+        if self._index_ready:
+            return
+        self.db.products.create_index(
+            [(field, 'text') for field in FIELD_WEIGHTS],
+            name=self.index_name,
+            weights={field: int(weight * 10) for field, weight in FIELD_WEIGHTS.items()},
+            default_language='spanish'
+        )
+        self._index_ready = True
+
+    def refresh_product(self, pid):
+        pass
+
+    def search(self, query, limit, filter=None):
+        self.ensure_index()
+        cursor = self.db.products.find(
+            dict(filter or {}, **{'$text': {'$search': fold_accents(query)}}),
+            {'score': {'$meta': 'textScore'}}
+        ).sort([('score', {'$meta': 'textScore'})]).limit(limit)
+        return list(cursor)
+
+
+SEARCH_BACKENDS = {
+    LocalSearchBackend.name: LocalSearchBackend,
+    MongoTextSearchBackend.name: MongoTextSearchBackend
+}
+
+
+# Fachada usada por las rutas: elige backend y limita resultados
+class ProductSearch:
+    def __init__(self, db, backend='mongo', limit=60):
+        if backend not in SEARCH_BACKENDS:
+            raise ValueError(f"Backend de búsqueda desconocido: {backend}")
+        self.backend = SEARCH_BACKENDS[backend](db)
+        self.limit = limit
+
+    # `filter`: condiciones extra de MongoDB (ProductFilters.query())
+    def search(self, query, limit=None, filter=None):
+        query = (query or '').strip()
+        if not query:
+            return []
+        return self.backend.search(query, limit or self.limit, filter)
+
+    # Mantener el índice al día cuando el admin crea/edita/elimina productos
+    def refresh_product(self, pid):
+        self.backend.refresh_product(pid)
@@ -1,75 +1,51 @@
-# seed.py
-from pymongo import MongoClient
-from datetime import datetime
+# seed.py - Datos de ejemplo y generador de datos sintéticos a escala
+#
+#   python seed.py                      usuarios de prueba (admin y cliente)
+#   python seed.py --preset large       100k productos, 1M usuarios, 10M pedidos
+#   python seed.py --products 5000 --users 20000 --orders 200000 --workers 4
+#
+# Usa el mismo almacenamiento que la app (MONGO_URI o SQLite, ver config.py).
+# Con la misma --seed y --until los documentos (incluidos sus _id) son
+# idénticos en cada corrida, sin importar cuántos procesos se usen
+import argparse
+import multiprocessing
 import os
+import random
+import struct
+import sys
+import time
+from datetime import datetime, timedelta
 
-# Crear cliente MongoDB
-client = MongoClient('mongodb://localhost:27017/')
-db = client.farmacia
+from bson.objectid import ObjectId
 
-# Datos de ejemplo para productos
-products = []
+import config
+from auth import DEFAULT_ADDRESS, DEFAULT_NOTIFICATIONS
+from facets import CATEGORY_LABELS
 
-# Usuario administrador de ejemplo
-users = [
-    {
-        'email': 'admin@farmacia.com',
-        'password': 'admin123',  # En producción usar hashing!
-        'role': 'admin',
-        'created_at': datetime.utcnow()
-    },
-    {
-        'email': 'cliente@ejemplo.com', 
-        'password': 'cliente123',
-        'role': 'user',
-        'created_at': datetime.utcnow()
-    }
-]
-
-def seed_database():
-    print("🧹 Limpiando base de datos existente...")
-    db.products.delete_many({})
-    db.users.delete_many({})
-    db.orders.delete_many({})
-    db.prescriptions.delete_many({})
-    
-    print("🌱 Insertando productos de ejemplo...")
-    result_products = db.products.insert_many(products)
-    print(f"✅ {len(result_products.inserted_ids)} productos insertados")
-    
-    print("👤 Insertando usuarios de ejemplo...")
-    result_users = db.users.insert_many(users)
-    print(f"✅ {len(result_users.inserted_ids)} usuarios insertados")
-    
-    print("\n📊 Resumen de la base de datos:")
-    print(f"   Products: {db.products.count_documents({})}")
-    print(f"   Users: {db.users.count_documents({})}")
-    print(f"   Orders: {db.orders.count_documents({})}")
-    print(f"   Prescriptions: {db.prescriptions.count_documents({})}")
-    
-    print("\n🔑 Credenciales para prueba:")
-    print("   Admin: admin@farmacia.com / admin123")
-    print("   Cliente: cliente@ejemplo.com / cliente123")
-    print("\n🎯 ¡Base de datos lista! Ejecuta 'python app.py' para iniciar el servidor.")
+PRESETS = {
+    'small': {'products': 2000, 'users': 10000, 'orders': 100000, 'prescriptions': 2000},
+    'medium': {'products': 20000, 'users': 100000, 'orders': 1000000, 'prescriptions': 20000},
+    'large': {'products': 100000, 'users': 1000000, 'orders': 10000000, 'prescriptions': 200000},
+}
 
-if __name__ == '__main__':
-    seed_database()
-    # Añadir al seed.py existente, en la sección de usuarios:
+# Colecciones que se borran con --reset
+SEED_COLLECTIONS = ('products', 'users', 'orders', 'order_stats', 'prescriptions', 'migrations')
 
-users = [
+# Usuarios de prueba
+DEMO_USERS = [
     {
         'email': 'admin@farmacia.com',
-        'password': 'admin123',
+        'password': 'admin123',  # En producción usar hashing!
         'role': 'admin',
         'nombre': 'María',
         'apellido': 'González',
         'telefono': '3312345678',
         'fecha_nacimiento': '1985-06-15',
         'genero': 'femenino',
-        'created_at': datetime.utcnow(),
         'direccion': {
             'calle': 'Av. Chapultepec',
             'numero_exterior': '123',
+            'numero_interior': '',
             'colonia': 'Centro',
             'ciudad': 'Guadalajara',
             'estado': 'Jalisco',
@@ -92,7 +68,6 @@ users = [
         'telefono': '3356789012',
         'fecha_nacimiento': '1990-03-22',
         'genero': 'masculino',
-        'created_at': datetime.utcnow(),
         'direccion': {
             'calle': 'Calzada Independencia',
             'numero_exterior': '456',
@@ -110,4 +85,387 @@ users = [
             'sms_notificaciones': True
         }
     }
-]
\ No newline at end of file
+]
+
+# Vocabulario del catálogo por categoría (las de edit_product.html)
+_CATALOG = {
+    'analgesicos': (['Paracetamol', 'Ibuprofeno', 'Naproxeno', 'Diclofenaco', 'Ketorolaco', 'Aspirina'],
+                    ['tabletas', 'cápsulas', 'suspensión', 'gel']),
+    'vitaminas': (['Vitamina C', 'Vitamina D3', 'Complejo B', 'Ácido fólico', 'Omega 3', 'Hierro'],
+                  ['tabletas', 'cápsulas', 'gomitas', 'sobres']),
+    'dermocosmetica': (['Protector solar', 'Crema hidratante', 'Gel limpiador', 'Sérum', 'Agua micelar'],
+                       ['crema', 'gel', 'loción', 'spray']),
+    'respiratorio': (['Ambroxol', 'Loratadina', 'Cetirizina', 'Salbutamol', 'Dextrometorfano'],
+                     ['jarabe', 'tabletas', 'inhalador', 'gotas']),
+    'primeros_auxilios': (['Gasas', 'Vendas', 'Alcohol', 'Agua oxigenada', 'Curitas', 'Suero oral'],
+                          ['paquete', 'rollo', 'botella', 'caja']),
+    'cuidado_personal': (['Jabón neutro', 'Shampoo', 'Pasta dental', 'Desodorante', 'Enjuague bucal'],
+                         ['barra', 'botella', 'tubo', 'spray']),
+    'general': (['Termómetro', 'Cubrebocas', 'Guantes', 'Baumanómetro', 'Glucómetro'],
+                ['pieza', 'caja', 'paquete']),
+}
+_SIZES = ['10 pzas', '20 pzas', '30 pzas', '100mg', '250mg', '500mg', '1g', '60ml', '120ml', '250ml']
+_BRANDS = ['Genérico', 'Bayer', 'Pfizer', 'Sanofi', 'Genomma', 'Liomont', 'Senosiain', 'Kener']
+_NAMES = ['María', 'José', 'Guadalupe', 'Juan', 'Ana', 'Luis', 'Sofía', 'Carlos', 'Fernanda', 'Miguel',
+          'Daniela', 'Jorge', 'Valeria', 'Ricardo', 'Camila', 'Alejandro']
+_SURNAMES = ['García', 'Hernández', 'López', 'Martínez', 'González', 'Pérez', 'Rodríguez', 'Sánchez',
+             'Ramírez', 'Flores', 'Torres', 'Díaz']
+_COLONIAS = ['Centro', 'Americana', 'Providencia', 'Chapalita', 'Santa Tere', 'Oblatos', 'Tlaquepaque',
+             'Zapopan Centro', 'Jardines del Bosque', 'Miravalle']
+_STREETS = ['Av. Vallarta', 'Av. Chapultepec', 'Calz. Independencia', 'Av. México', 'Av. Patria',
+            'Av. Hidalgo', 'Av. Juárez', 'Av. López Mateos']
+
+_CATEGORIES = list(CATEGORY_LABELS)
+
+# Byte de tipo dentro del ObjectId determinista
+_KINDS = {'products': 1, 'users': 2, 'orders': 3, 'prescriptions': 4, 'demo': 255}
+
+
+# ObjectId reproducible: 4 bytes de fecha (created_at) + tipo + índice. Los
+# pedidos pueden apuntar a productos y usuarios por índice sin consultarlos
+def _object_id(kind, index, when):
+    return ObjectId(struct.pack('>IB', int(when.timestamp()), _KINDS[kind]) + index.to_bytes(7, 'big'))
+
+
+def _rng(seed, kind, batch):
+    return random.Random(f"{seed}:{kind}:{batch}")
+
+
+# Índice sesgado en [0, n): el 10% de los índices más bajos se lleva
+# 0.1 ** (1 / exponent) de las elecciones (~27% con 1.75, ~32% con 2):
+# clientes frecuentes con historial largo y productos estrella
+USER_SKEW = 1.75
+PRODUCT_SKEW = 2
+
+
+def _skewed(rng, n, exponent):
+    return min(int(n * rng.random() ** exponent), n - 1)
+
+
+# Altas repartidas en el periodo, en el orden del índice
+def _base_time(spec, index, total):
+    return spec['start'] + (spec['until'] - spec['start']) * (index / max(total, 1))
+
+
+def product_batch(spec, batch):
+    rng = _rng(spec['seed'], 'products', batch)
+    start = batch * spec['batch_size']
+    docs = []
+    for i in range(start, min(start + spec['batch_size'], spec['products'])):
+        category = rng.choice(_CATEGORIES)
+        names, forms = _CATALOG[category]
+        name = f"{rng.choice(names)} {rng.choice(_SIZES)} {rng.choice(forms)} {rng.choice(_BRANDS)}"
+        created_at = _base_time(spec, i, spec['products'])
+        docs.append({
+            '_id': _object_id('products', i, created_at),
+            'sku': f"SEED-{i:07d}",
+            'name': name,
+            'price': round(rng.lognormvariate(4.5, 0.8), 2),
+            'description': f"{name}. Presentación de {rng.choice(_SIZES)}.",
+            'category': category,
+            'stock': rng.choice([None, rng.randint(0, 20), rng.randint(20, 500)]),
+            'active': rng.random() > 0.03,
+            'image': None,
+            'image_variants': None,
+            'created_at': created_at
+        })
+    return 'products', docs
+
+
+def user_email(i):
+    return f"usuario{i}@seed.local"
+
+
+def user_batch(spec, batch):
+    rng = _rng(spec['seed'], 'users', batch)
+    start = batch * spec['batch_size']
+    docs = []
+    for i in range(start, min(start + spec['batch_size'], spec['users'])):
+        created_at = _base_time(spec, i, spec['users'])
+        direccion = dict(DEFAULT_ADDRESS,
+                         calle=rng.choice(_STREETS),
+                         numero_exterior=str(rng.randint(1, 4000)),
+                         colonia=rng.choice(_COLONIAS),
+                         codigo_postal=f"44{rng.randint(100, 990)}")
+        docs.append({
+            '_id': _object_id('users', i, created_at),
+            'email': user_email(i),
+            'password': 'seed123',
+            'role': 'user',
+            'nombre': rng.choice(_NAMES),
+            'apellido': rng.choice(_SURNAMES),
+            'telefono': f"33{rng.randint(10000000, 99999999)}",
+            'created_at': created_at,
+            'notifications': dict(DEFAULT_NOTIFICATIONS, email_promociones=rng.random() < 0.6),
+            'direccion': direccion
+        })
+    return 'users', docs
+
+
+# Tabla de productos (id, nombre, precio) para los renglones de los pedidos;
+# se regenera en cada proceso a partir de la semilla, sin leer la base
+_catalog = None
+
+
+def _catalog_table(spec):
+    global _catalog
+    if _catalog is None:
+        _catalog = []
+        batches = (spec['products'] + spec['batch_size'] - 1) // spec['batch_size']
+        for batch in range(batches):
+            _catalog.extend((p['_id'], p['name'], p['price']) for p in product_batch(spec, batch)[1])
+    return _catalog
+
+
+def _order_status(rng, age):
+    roll = rng.random()
+    if age > timedelta(days=14):
+        return 'completado' if roll < 0.9 else 'cancelado'
+    return 'pendiente' if roll < 0.7 else 'completado' if roll < 0.9 else 'cancelado'
+
+
+def order_batch(spec, batch):
+    rng = _rng(spec['seed'], 'orders', batch)
+    catalog = _catalog_table(spec)
+    period = (spec['until'] - spec['start']).total_seconds()
+    start = batch * spec['batch_size']
+    docs = []
+    for i in range(start, min(start + spec['batch_size'], spec['orders'])):
+        # Más pedidos recientes que antiguos (crecimiento)
+        created_at = spec['start'] + timedelta(seconds=period * rng.random() ** 0.7)
+        user = _skewed(rng, spec['users'], USER_SKEW)
+        items = []
+        for _ in range(min(1 + int(rng.expovariate(0.8)), 8)):
+            pid, name, price = catalog[_skewed(rng, len(catalog), PRODUCT_SKEW)]
+            qty = rng.choice((1, 1, 1, 2, 2, 3))
+            items.append({'product_id': pid, 'name': name, 'qty': qty, 'price': price,
+                          'subtotal': round(price * qty, 2)})
+        docs.append({
+            '_id': _object_id('orders', i, created_at),
+            'user_email': user_email(user),
+            'address': f"{rng.choice(_STREETS)} {rng.randint(1, 4000)}, {rng.choice(_COLONIAS)}",
+            'items': items,
+            'total': round(sum(item['subtotal'] for item in items), 2),
+            'status': _order_status(rng, spec['until'] - created_at),
+            'created_at': created_at
+        })
+    return 'orders', docs
+
+
+def prescription_batch(spec, batch):
+    rng = _rng(spec['seed'], 'prescriptions', batch)
+    period = (spec['until'] - spec['start']).total_seconds()
+    start = batch * spec['batch_size']
+    docs = []
+    for i in range(start, min(start + spec['batch_size'], spec['prescriptions'])):
+        uploaded_at = spec['start'] + timedelta(seconds=period * rng.random() ** 0.7)
+        ext = rng.choice(('jpg', 'jpg', 'png', 'pdf'))
+        docs.append({
+            '_id': _object_id('prescriptions', i, uploaded_at),
+            'email': user_email(_skewed(rng, spec['users'], USER_SKEW)),
+            'filename': f"seed/receta-{i}.{ext}",
+            'original_filename': f"receta_{i}.{ext}",
+            'notes': rng.choice(['', '', 'Tratamiento mensual', 'Urgente', 'Receta de seguimiento']),
+            'uploaded_at': uploaded_at,
+            'status': 'processed' if rng.random() < 0.85 else 'pending'
+        })
+    return 'prescriptions', docs
+
+
+GENERATORS = {
+    'products': product_batch,
+    'users': user_batch,
+    'orders': order_batch,
+    'prescriptions': prescription_batch,
+}
+
+
+# Base de la configuración, o la indicada por (backend, URI de MongoDB / ruta de SQLite)
+def open_database(backend=None, location=None):
+    backend = backend or config.STORAGE_BACKEND
+    if backend == 'mongo':
+        from database import LazyDatabase, MongoConnection
+        return LazyDatabase(MongoConnection(location or config.MONGO_URI,
+                                            serverSelectionTimeoutMS=config.MONGO_SERVER_SELECTION_TIMEOUT_MS))
+    from sqlite_store import SQLiteDatabase
+    return SQLiteDatabase(location or config.SQLITE_PATH)
+
+
+# (backend, ubicación) de una base abierta con open_database, para que los
+# procesos de inserción abran exactamente la misma
+def database_location(db):
+    from database import LazyDatabase
+    from sqlite_store import SQLiteDatabase
+    if isinstance(db, SQLiteDatabase):
+        return 'sqlite', db.path
+    if isinstance(db, LazyDatabase):
+        return 'mongo', db._connection.uri
+    raise ValueError('Con varios procesos la base debe abrirse con open_database()')
+
+
+# Cada proceso abre su propia conexión (MongoConnection y SQLite son por proceso)
+_worker_db = None
+_worker_spec = None
+
+
+def _init_worker(spec, location=None, db=None):
+    global _worker_db, _worker_spec
+    _worker_db = db if db is not None else open_database(*location)
+    _worker_spec = spec
+
+
+# Generar e insertar un lote. ordered=False: el servidor no se detiene ni
+# serializa por un error y puede repartir la escritura
+def _insert_batch(task):
+    kind, batch = task
+    name, docs = GENERATORS[kind](_worker_spec, batch)
+    if docs:
+        _worker_db[name].insert_many(docs, ordered=False)
+    return len(docs)
+
+
+def reset_database(db):
+    print("🧹 Limpiando base de datos existente...")
+    for name in SEED_COLLECTIONS:
+        db[name].drop()
+
+
+def seed_demo(db, spec):
+    created_at = spec['until']
+    for i, user in enumerate(DEMO_USERS):
+        db.users.update_one(
+            {'email': user['email']},
+            {'$set': user, '$setOnInsert': {'_id': _object_id('demo', i, created_at), 'created_at': created_at}},
+            upsert=True
+        )
+    print(f"👤 {len(DEMO_USERS)} usuarios de prueba")
+
+
+def check_volumes(products=0, users=0, orders=0, prescriptions=0):
+    if orders and not products:
+        raise SystemExit('❌ Los pedidos necesitan productos (--products)')
+    if (orders or prescriptions) and not users:
+        raise SystemExit('❌ Los pedidos y recetas necesitan usuarios (--users)')
+
+
+# Sembrar `db`. Con workers > 1 cada proceso reabre la misma base a partir de
+# su ubicación (database_location), no desde config
+def seed_database(db, products=0, users=0, orders=0, prescriptions=0, seed=42, workers=1,
+                  batch_size=5000, days=365, until=None):
+    until = until or datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    spec = {
+        'seed': seed,
+        'products': products,
+        'users': users,
+        'orders': orders,
+        'prescriptions': prescriptions,
+        'batch_size': batch_size,
+        'until': until,
+        'start': until - timedelta(days=days)
+    }
+    check_volumes(products, users, orders, prescriptions)
+    location = database_location(db) if workers > 1 else None
+
+    seed_demo(db, spec)
+    for kind in ('products', 'users', 'orders', 'prescriptions'):
+        total = spec[kind]
+        if not total:
+            continue
+        # Los _id son deterministas: sembrar encima de datos previos chocaría
+        if db[kind].count_documents({}) > (len(DEMO_USERS) if kind == 'users' else 0):
+            raise SystemExit(f"❌ La colección {kind} ya tiene datos; use --reset")
+        tasks = [(kind, batch) for batch in range((total + batch_size - 1) // batch_size)]
+        started = time.perf_counter()
+        done = 0
+        print(f"🌱 {kind}: {total:,} en {len(tasks)} lotes con {workers} proceso(s)")
+        if workers > 1:
+            with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(spec, location)) as pool:
+                for count in pool.imap_unordered(_insert_batch, tasks):
+                    done += count
+                    _progress(kind, done, total, started)
+        else:
+            _init_worker(spec, db=db)
+            for task in tasks:
+                done += _insert_batch(task)
+                _progress(kind, done, total, started)
+        elapsed = time.perf_counter() - started
+        print(f"\n✅ {done:,} {kind} en {elapsed:.1f}s ({done / elapsed if elapsed else 0:,.0f}/s)")
+    return spec
+
+
+def _progress(kind, done, total, started):
+    elapsed = time.perf_counter() - started
+    rate = done / elapsed if elapsed else 0
+    sys.stdout.write(f"\r   {kind}: {done:,}/{total:,} ({done * 100 // total}%) {rate:,.0f}/s")
+    sys.stdout.flush()
+
+
+def _parse_until(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"fecha inválida: {value} (use AAAA-MM-DD)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Datos de ejemplo y datos sintéticos a escala')
+    parser.add_argument('--preset', choices=sorted(PRESETS), help='volúmenes predefinidos')
+    parser.add_argument('--products', type=int)
+    parser.add_argument('--users', type=int)
+    parser.add_argument('--orders', type=int)
+    parser.add_argument('--prescriptions', type=int)
+    parser.add_argument('--seed', type=int, default=42, help='misma semilla = mismos datos')
+    parser.add_argument('--until', type=_parse_until,
+                        help='fecha final del periodo (AAAA-MM-DD, por defecto hoy)')
+    parser.add_argument('--days', type=int, default=365, help='días de historial')
+    parser.add_argument('--workers', type=int,
+                        help='procesos de inserción (por defecto: núcleos con MongoDB, 1 con SQLite)')
+    parser.add_argument('--batch-size', type=int, default=5000, help='documentos por insert_many')
+    parser.add_argument('--reset', action='store_true', help='borrar los datos existentes primero')
+    parser.add_argument('--no-migrate', action='store_true',
+                        help='no aplicar migraciones (resumen de pedidos) al terminar')
+    args = parser.parse_args(argv)
+
+    volumes = dict(PRESETS.get(args.preset, {}))
+    for kind in ('products', 'users', 'orders', 'prescriptions'):
+        if getattr(args, kind) is not None:
+            volumes[kind] = getattr(args, kind)
+    workers = args.workers or (os.cpu_count() if config.STORAGE_BACKEND == 'mongo' else 1)
+
+    check_volumes(**volumes)
+
+    db = open_database()
+    if args.reset:
+        reset_database(db)
+    started = time.perf_counter()
+    seed_database(db, seed=args.seed, workers=workers, batch_size=args.batch_size,
+                  days=args.days, until=args.until, **volumes)
+
+    # Índices al final: construirlos una vez es más rápido que mantenerlos
+    # durante la carga masiva
+    from indexes import ensure_indexes
+    print("🗂️  Creando índices...")
+    for collection, name, status in ensure_indexes(db):
+        if status != 'ok':
+            print(f"⚠️  Índice {collection}.{name}: {status}")
+
+    if not args.no_migrate:
+        from migrations import MigrationRunner
+        print("🗃️  Aplicando migraciones...")
+        MigrationRunner(db, batch_size=config.MIGRATION_BATCH_SIZE).run()
+
+    print("\n📊 Resumen de la base de datos:")
+    for name in ('products', 'users', 'orders', 'prescriptions', 'order_stats'):
+        print(f"   {name.capitalize()}: {db[name].estimated_document_count():,}")
+    print(f"   Tiempo total: {time.perf_counter() - started:.1f}s")
+
+    print("\n🔑 Credenciales para prueba:")
+    print("   Admin: admin@farmacia.com / admin123")
+    print("   Cliente: cliente@ejemplo.com / cliente123")
+    if volumes.get('users'):
+        print("   Usuarios sintéticos: usuario<N>@seed.local / seed123")
+    print("\n🎯 ¡Base de datos lista! Ejecuta 'python app.py' para iniciar el servidor.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+# server_session.py - Sesiones guardadas en la base (la cookie solo lleva el id)
+import copy
+import re
+import secrets
+from datetime import datetime, timedelta
+
+from flask.sessions import SessionInterface, SessionMixin
+from pymongo import ASCENDING, IndexModel
+from werkzeug.datastructures import CallbackDict
+
+from product_cache import TTLCache
+
+_SID_RE = re.compile(r'^[A-Za-z0-9_-]{43}$')
+
+
+def new_sid():
+    return secrets.token_urlsafe(32)
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, new=False, expires_at=None):
+        def on_update(self):
+            self.modified = True
+            self.accessed = True
+        super().__init__(initial, on_update)
+        self.sid = sid or new_sid()
+        self.new = new
+        self.expires_at = expires_at
+        self.modified = False
+        self.accessed = False
+        self.previous_sid = None
+
+    # Leer la sesión también cuenta como acceso (Vary: Cookie)
+    def __getitem__(self, key):
+        self.accessed = True
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self.accessed = True
+        return super().get(key, default)
+
+    def setdefault(self, key, default=None):
+        self.accessed = True
+        return super().setdefault(key, default)
+
+    # Cambiar el id al iniciar sesión (evita fijación de sesión)
+    def regenerate(self):
+        if self.previous_sid is None and not self.new:
+            self.previous_sid = self.sid
+        self.sid = new_sid()
+        self.modified = True
+
+
+# Documentos {_id: sid, data, expires_at} con expiración deslizante (TTL) y
+# caché en proceso; `publish(sid)` avisa a los demás workers al guardar
+class ServerSessionInterface(SessionInterface):
+    def __init__(self, collection, ttl=24 * 3600, cache_ttl=30, maxsize=4096, publish=None):
+        self.collection = collection
+        self.ttl = ttl
+        self.cache = TTLCache(maxsize=maxsize, ttl=cache_ttl)
+        self.publish = publish
+
+    def ensure_indexes(self):
+        return self.collection.create_indexes([
+            IndexModel([('expires_at', ASCENDING)], name='expires_at_ttl', expireAfterSeconds=0),
+        ])
+
+    def invalidate(self, sid=None):
+        if sid is None:
+            self.cache.clear()
+        else:
+            self.cache.delete(sid)
+
+    def _load(self, sid):
+        cached = self.cache.get(sid)
+        if cached is None:
+            doc = self.collection.find_one({'_id': sid})
+            if doc is None:
+                return None
+            cached = (doc.get('data') or {}, doc['expires_at'])
+            self.cache.set(sid, cached)
+        return cached
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid and _SID_RE.match(sid):
+            found = self._load(sid)
+            # El TTL de la base borra con retraso; la expiración se revisa aquí
+            if found is not None and found[1] > datetime.utcnow():
+                # Copia profunda: las rutas modifican el carrito en su lugar
+                return ServerSession(copy.deepcopy(found[0]), sid=sid, expires_at=found[1])
+        return ServerSession(new=True)
+
+    def _notify(self, sid):
+        self.cache.delete(sid)
+        if self.publish:
+            self.publish(sid)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if session.previous_sid:
+            self.collection.delete_one({'_id': session.previous_sid})
+            self._notify(session.previous_sid)
+
+        # Sesión vaciada: borrar documento y cookie
+        if not session:
+            if not session.new:
+                self.collection.delete_one({'_id': session.sid})
+                self._notify(session.sid)
+            if session.modified or not session.new:
+                response.delete_cookie(name, domain=domain, path=path,
+                                       secure=self.get_cookie_secure(app),
+                                       httponly=self.get_cookie_httponly(app),
+                                       samesite=self.get_cookie_samesite(app))
+            return
+
+        # Solo se escribe si cambió o si ya pasó la mitad del TTL (renovación)
+        now = datetime.utcnow()
+        refresh = session.expires_at is None or session.expires_at - now < timedelta(seconds=self.ttl / 2)
+        if not (session.modified or refresh):
+            return
+        expires_at = now + timedelta(seconds=self.ttl)
+        data = dict(session)
+        self.collection.replace_one(
+            {'_id': session.sid},
+            {'data': data, 'user': data.get('user'), 'expires_at': expires_at, 'updated_at': now},
+            upsert=True
+        )
+        self._notify(session.sid)
+        self.cache.set(session.sid, (data, expires_at))
+
+        if session.new or session.previous_sid:
+            response.set_cookie(
+                name, session.sid,
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app)
+            )
+
+    def stats(self):
+        return self.cache.stats()
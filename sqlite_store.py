@@ -0,0 +1,1336 @@
+# sqlite_store.py - Almacenamiento embebido en SQLite para el modo sin MongoDB
+#
+# Expone la misma interfaz de colecciones que pymongo (find, insert_*, update_*,
+# delete_*, find_one_and_*, bulk_write, aggregate, create_index/es...) para que
+# las rutas de app.py funcionen igual con cualquiera de los dos backends.
+#
+# Cada colección es una tabla con el documento en BSON. Los campos que aparecen
+# en un índice (create_index) se copian a columnas propias con índice SQL; los
+# filtros y ordenamientos sobre esas columnas se resuelven en SQLite y el resto
+# del filtro se evalúa en Python sobre los candidatos.
+import copy
+import functools
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+import bson
+from bson.objectid import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from pymongo.operations import DeleteMany, DeleteOne, InsertOne, ReplaceOne, UpdateMany, UpdateOne
+from pymongo.results import (BulkWriteResult, DeleteResult, InsertManyResult,
+                             InsertOneResult, UpdateResult)
+
+_MISSING = object()
+_NAME_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+_SQL_OPS = {'$gt': '>', '$gte': '>=', '$lt': '<', '$lte': '<='}
+TTL_PURGE_INTERVAL = 1.0
+
+
+# ---------------------------------------------------------------------------
+# Semántica de documentos (rutas con punto, comparación y orden tipo MongoDB)
+# ---------------------------------------------------------------------------
+
+# Valores que toma una ruta con punto ("items.product_id" recorre arreglos)
+def _resolve(value, parts):
+    if not parts:
+        yield value
+        return
+    key, rest = parts[0], parts[1:]
+    if isinstance(value, dict):
+        if key in value:
+            yield from _resolve(value[key], rest)
+        else:
+            yield _MISSING
+    elif isinstance(value, list):
+        if key.isdigit():
+            index = int(key)
+            yield from _resolve(value[index], rest) if index < len(value) else iter([_MISSING])
+            return
+        found = False
+        for item in value:
+            if isinstance(item, dict):
+                for v in _resolve(item, parts):
+                    if v is not _MISSING:
+                        found = True
+                        yield v
+        if not found:
+            yield _MISSING
+    else:
+        yield _MISSING
+
+
+def _values(doc, path):
+    return list(_resolve(doc, path.split('.')))
+
+
+def _first(doc, path, default=None):
+    for value in _resolve(doc, path.split('.')):
+        if value is not _MISSING:
+            return value
+    return default
+
+
+# Incluir los elementos de los arreglos (igualdad "contiene" de MongoDB)
+def _expand(values):
+    out = []
+    for v in values:
+        out.append(v)
+        if isinstance(v, list):
+            out.extend(v)
+    return out
+
+
+# Orden de tipos de MongoDB: null < números < strings < objetos < arreglos <
+# binarios < ObjectId < booleanos < fechas
+def _bracket(v):
+    if v is None or v is _MISSING:
+        return 1
+    if isinstance(v, bool):
+        return 8
+    if isinstance(v, (int, float)):
+        return 2
+    if isinstance(v, str):
+        return 3
+    if isinstance(v, dict):
+        return 4
+    if isinstance(v, list):
+        return 5
+    if isinstance(v, bytes):
+        return 6
+    if isinstance(v, ObjectId):
+        return 7
+    if isinstance(v, datetime):
+        return 9
+    return 10
+
+
+def _sort_value(v):
+    bracket = _bracket(v)
+    if bracket in (2, 3, 6, 7, 8, 9):
+        return (bracket, v)
+    if bracket == 1:
+        return (bracket, 0)
+    return (bracket, repr(v))
+
+
+def _eq(a, b):
+    if _bracket(a) != _bracket(b):
+        return False
+    return a == b
+
+
+def _compare(a, b, op):
+    if _bracket(a) != _bracket(b) or _bracket(a) in (1, 4, 5, 10):
+        return False
+    if op == '$gt':
+        return a > b
+    if op == '$gte':
+        return a >= b
+    if op == '$lt':
+        return a < b
+    return a <= b
+
+
+def _regex(pattern, options=''):
+    if isinstance(pattern, re.Pattern):
+        return pattern
+    flags = 0
+    if 'i' in options:
+        flags |= re.IGNORECASE
+    if 'm' in options:
+        flags |= re.MULTILINE
+    if 's' in options:
+        flags |= re.DOTALL
+    return re.compile(pattern, flags)
+
+
+def _is_operator_dict(cond):
+    return isinstance(cond, dict) and cond and all(k.startswith('$') for k in cond)
+
+
+def _any_equal(values, target):
+    expanded = _expand(values)
+    if target is None:
+        return any(v is _MISSING or v is None for v in expanded)
+    if isinstance(target, re.Pattern):
+        return any(isinstance(v, str) and target.search(v) for v in expanded)
+    return any(v is not _MISSING and _eq(v, target) for v in expanded)
+
+
+def _match_ops(values, ops):
+    for op, target in ops.items():
+        if op == '$eq':
+            ok = _any_equal(values, target)
+        elif op == '$ne':
+            ok = not _any_equal(values, target)
+        elif op in _SQL_OPS:
+            ok = any(v is not _MISSING and _compare(v, target, op) for v in _expand(values))
+        elif op == '$in':
+            ok = any(_any_equal(values, t) for t in target)
+        elif op == '$nin':
+            ok = not any(_any_equal(values, t) for t in target)
+        elif op == '$exists':
+            ok = any(v is not _MISSING for v in values) == bool(target)
+        elif op == '$regex':
+            pattern = _regex(target, ops.get('$options', ''))
+            ok = _any_equal(values, pattern)
+        elif op == '$options':
+            continue
+        elif op == '$not':
+            ok = not (_any_equal(values, target) if isinstance(target, re.Pattern)
+                      else _match_ops(values, target))
+        elif op == '$all':
+            ok = all(_any_equal(values, t) for t in target)
+        elif op == '$size':
+            ok = any(isinstance(v, list) and len(v) == target for v in values)
+        elif op == '$elemMatch':
+            ok = any(isinstance(v, list) and any(
+                _matches(item, target) if isinstance(item, dict) and not _is_operator_dict(target)
+                else _match_ops([item], target)
+                for item in v) for v in values)
+        else:
+            raise OperationFailure(f"Operador no soportado en SQLite: {op}")
+        if not ok:
+            return False
+    return True
+
+
+# ¿El documento cumple el filtro? (subconjunto del lenguaje de consultas de MongoDB)
+def _matches(doc, query):
+    for key, cond in (query or {}).items():
+        if key == '$and':
+            ok = all(_matches(doc, q) for q in cond)
+        elif key == '$or':
+            ok = any(_matches(doc, q) for q in cond)
+        elif key == '$nor':
+            ok = not any(_matches(doc, q) for q in cond)
+        elif key == '$expr':
+            ok = bool(_eval(cond, doc))
+        elif key == '$text':
+            raise OperationFailure('$text requiere MongoDB; use SEARCH_BACKEND=local')
+        elif key.startswith('$'):
+            raise OperationFailure(f"Operador no soportado en SQLite: {key}")
+        elif _is_operator_dict(cond):
+            ok = _match_ops(_values(doc, key), cond)
+        else:
+            ok = _any_equal(_values(doc, key), cond)
+        if not ok:
+            return False
+    return True
+
+
+def _sort_docs(docs, spec):
+    for field, direction in reversed(spec):
+        docs.sort(key=lambda d: _sort_value(_first(d, field)), reverse=direction < 0)
+    return docs
+
+
+# ---------------------------------------------------------------------------
+# Proyecciones y operadores de actualización
+# ---------------------------------------------------------------------------
+
+def _copy_path(src, dst, parts):
+    key = parts[0]
+    if not isinstance(src, dict) or key not in src:
+        return
+    value = src[key]
+    if len(parts) == 1:
+        dst[key] = value
+    elif isinstance(value, dict):
+        _copy_path(value, dst.setdefault(key, {}), parts[1:])
+    elif isinstance(value, list):
+        items = [item for item in value if isinstance(item, dict)]
+        targets = dst.setdefault(key, [{} for _ in items])
+        for item, target in zip(items, targets):
+            _copy_path(item, target, parts[1:])
+
+
+def _delete_path(doc, parts):
+    if isinstance(doc, list):
+        for item in doc:
+            _delete_path(item, parts)
+        return
+    if not isinstance(doc, dict) or parts[0] not in doc:
+        return
+    if len(parts) == 1:
+        del doc[parts[0]]
+    else:
+        _delete_path(doc[parts[0]], parts[1:])
+
+
+def _project(doc, projection):
+    if not projection:
+        return doc
+    if isinstance(projection, (list, tuple)):
+        projection = {field: 1 for field in projection}
+    spec = {k: v for k, v in projection.items() if not isinstance(v, dict)}
+    include_id = bool(spec.pop('_id', 1))
+    inclusion = bool(spec) and all(spec.values())
+    if inclusion or (not spec and projection.get('_id') and len(projection) == 1):
+        out = {}
+        if include_id and '_id' in doc:
+            out['_id'] = doc['_id']
+        for path in spec:
+            _copy_path(doc, out, path.split('.'))
+        return out
+    for path in spec:
+        _delete_path(doc, path.split('.'))
+    if not include_id:
+        doc.pop('_id', None)
+    return doc
+
+
+def _set_path(doc, path, value):
+    parts = path.split('.')
+    target = doc
+    for key in parts[:-1]:
+        if isinstance(target, list):
+            target = target[int(key)]
+            continue
+        if not isinstance(target.get(key), (dict, list)):
+            target[key] = {}
+        target = target[key]
+    if isinstance(target, list):
+        target[int(parts[-1])] = value
+    else:
+        target[parts[-1]] = value
+
+
+def _apply_update(doc, update, is_insert=False):
+    if not any(key.startswith('$') for key in update):
+        replacement = copy.deepcopy(update)
+        replacement['_id'] = doc.get('_id', replacement.get('_id'))
+        return replacement
+    for op, fields in update.items():
+        if op == '$setOnInsert' and not is_insert:
+            continue
+        for path, value in fields.items():
+            current = _first(doc, path, _MISSING)
+            if op in ('$set', '$setOnInsert'):
+                _set_path(doc, path, copy.deepcopy(value))
+            elif op == '$unset':
+                _delete_path(doc, path.split('.'))
+            elif op == '$inc':
+                _set_path(doc, path, (0 if current is _MISSING else current) + value)
+            elif op == '$mul':
+                _set_path(doc, path, (0 if current is _MISSING else current) * value)
+            elif op == '$min':
+                if current is _MISSING or _sort_value(value) < _sort_value(current):
+                    _set_path(doc, path, value)
+            elif op == '$max':
+                if current is _MISSING or _sort_value(value) > _sort_value(current):
+                    _set_path(doc, path, value)
+            elif op == '$currentDate':
+                _set_path(doc, path, datetime.utcnow())
+            elif op in ('$push', '$addToSet'):
+                items = value['$each'] if isinstance(value, dict) and '$each' in value else [value]
+                array = [] if current is _MISSING else list(current)
+                for item in items:
+                    if op == '$push' or not any(_eq(item, existing) for existing in array):
+                        array.append(copy.deepcopy(item))
+                _set_path(doc, path, array)
+            elif op == '$pull':
+                if isinstance(current, list):
+                    if _is_operator_dict(value):
+                        kept = [item for item in current if not _match_ops([item], value)]
+                    elif isinstance(value, dict):
+                        kept = [item for item in current
+                                if not (isinstance(item, dict) and _matches(item, value))]
+                    else:
+                        kept = [item for item in current if not _eq(item, value)]
+                    _set_path(doc, path, kept)
+            else:
+                raise OperationFailure(f"Operador de actualización no soportado: {op}")
+    return doc
+
+
+# Documento base de un upsert: los campos de igualdad del filtro
+def _upsert_seed(query):
+    doc = {}
+    for key, cond in (query or {}).items():
+        if key == '$and':
+            for sub in cond:
+                doc.update(_upsert_seed(sub))
+        elif key.startswith('$'):
+            continue
+        elif _is_operator_dict(cond):
+            if '$eq' in cond:
+                _set_path(doc, key, copy.deepcopy(cond['$eq']))
+        elif not isinstance(cond, re.Pattern):
+            _set_path(doc, key, copy.deepcopy(cond))
+    return doc
+
+
+# ---------------------------------------------------------------------------
+# Agregaciones ($match, $group, $sort, $limit, $skip, $project, $addFields,
+# $unwind, $count, $facet, $sortByCount)
+# ---------------------------------------------------------------------------
+
+def _eval(expr, doc):
+    if isinstance(expr, str) and expr.startswith('$'):
+        if expr == '$$ROOT':
+            return doc
+        value = _first(doc, expr[1:], _MISSING)
+        if value is _MISSING:
+            values = [v for v in _values(doc, expr[1:]) if v is not _MISSING]
+            return values if len(values) > 1 else None
+        return value
+    if isinstance(expr, list):
+        return [_eval(e, doc) for e in expr]
+    if not isinstance(expr, dict):
+        return expr
+    if len(expr) == 1:
+        op, args = next(iter(expr.items()))
+        if op.startswith('$'):
+            return _eval_operator(op, args, doc)
+    return {k: _eval(v, doc) for k, v in expr.items()}
+
+
+def _eval_operator(op, args, doc):
+    if op == '$literal':
+        return args
+    if op == '$cond':
+        if isinstance(args, dict):
+            args = [args['if'], args['then'], args['else']]
+        return _eval(args[1], doc) if _eval(args[0], doc) else _eval(args[2], doc)
+    if op == '$ifNull':
+        for arg in args:
+            value = _eval(arg, doc)
+            if value is not None:
+                return value
+        return None
+    values = _eval(args, doc) if isinstance(args, list) else [_eval(args, doc)]
+    if op == '$eq':
+        return _eq(values[0], values[1])
+    if op == '$ne':
+        return not _eq(values[0], values[1])
+    if op in _SQL_OPS:
+        return _sort_value(values[0]) > _sort_value(values[1]) if op == '$gt' else \
+            _sort_value(values[0]) >= _sort_value(values[1]) if op == '$gte' else \
+            _sort_value(values[0]) < _sort_value(values[1]) if op == '$lt' else \
+            _sort_value(values[0]) <= _sort_value(values[1])
+    if op == '$and':
+        return all(values)
+    if op == '$or':
+        return any(values)
+    if op == '$not':
+        return not values[0]
+    if op == '$in':
+        return any(_eq(values[0], v) for v in (values[1] or []))
+    if op == '$add':
+        return sum(v or 0 for v in values)
+    if op == '$subtract':
+        return (values[0] or 0) - (values[1] or 0)
+    if op == '$multiply':
+        result = 1
+        for v in values:
+            result *= v or 0
+        return result
+    if op == '$divide':
+        return (values[0] or 0) / values[1] if values[1] else None
+    if op == '$size':
+        return len(values[0] or [])
+    if op == '$toLower':
+        return (values[0] or '').lower()
+    if op == '$toUpper':
+        return (values[0] or '').upper()
+    if op == '$toString':
+        return None if values[0] is None else str(values[0])
+    if op == '$concat':
+        return ''.join(str(v) for v in values if v is not None)
+    if op == '$sum':
+        flat = values[0] if len(values) == 1 and isinstance(values[0], list) else values
+        return sum(v for v in flat if isinstance(v, (int, float)) and not isinstance(v, bool))
+    if op == '$dateToString':
+        value = _eval(args['date'], doc)
+        return value.strftime(args.get('format', '%Y-%m-%dT%H:%M:%S.%LZ').replace('%L', '000')) if value else None
+    raise OperationFailure(f"Expresión no soportada en SQLite: {op}")
+
+
+def _accumulate(spec, docs):
+    op, expr = next(iter(spec.items()))
+    if op == '$count':
+        return len(docs)
+    values = [_eval(expr, d) for d in docs]
+    if op == '$sum':
+        return sum(v for v in values if isinstance(v, (int, float)) and not isinstance(v, bool))
+    if op == '$avg':
+        numbers = [v for v in values if isinstance(v, (int, float)) and not isinstance(v, bool)]
+        return sum(numbers) / len(numbers) if numbers else None
+    present = [v for v in values if v is not None]
+    if op == '$min':
+        return min(present, key=_sort_value) if present else None
+    if op == '$max':
+        return max(present, key=_sort_value) if present else None
+    if op == '$first':
+        return values[0] if values else None
+    if op == '$last':
+        return values[-1] if values else None
+    if op == '$push':
+        return values
+    if op == '$addToSet':
+        unique = []
+        for v in values:
+            if not any(_eq(v, u) for u in unique):
+                unique.append(v)
+        return unique
+    raise OperationFailure(f"Acumulador no soportado en SQLite: {op}")
+
+
+def _group_key(value):
+    return bson.encode({'k': value}) if isinstance(value, (dict, list)) else (_bracket(value), value)
+
+
+def _run_pipeline(docs, pipeline):
+    for stage in pipeline:
+        name, spec = next(iter(stage.items()))
+        if name == '$match':
+            docs = [d for d in docs if _matches(d, spec)]
+        elif name == '$group':
+            groups = {}
+            for d in docs:
+                key = _eval(spec['_id'], d)
+                groups.setdefault(_group_key(key), (key, []))[1].append(d)
+            docs = []
+            for key, members in groups.values():
+                row = {'_id': key}
+                for field, acc in spec.items():
+                    if field != '_id':
+                        row[field] = _accumulate(acc, members)
+                docs.append(row)
+        elif name == '$sort':
+            docs = _sort_docs(list(docs), list(spec.items()))
+        elif name == '$limit':
+            docs = docs[:spec]
+        elif name == '$skip':
+            docs = docs[spec:]
+        elif name in ('$addFields', '$set'):
+            for d in docs:
+                for field, expr in spec.items():
+                    _set_path(d, field, _eval(expr, d))
+        elif name == '$project':
+            computed = {k: v for k, v in spec.items() if not isinstance(v, (int, bool)) or k == '_id' and not isinstance(v, (int, bool))}
+            plain = {k: v for k, v in spec.items() if k not in computed}
+            out = []
+            for d in docs:
+                row = _project(copy.deepcopy(d), plain) if plain else ({'_id': d.get('_id')} if '_id' in d else {})
+                for field, expr in computed.items():
+                    _set_path(row, field, _eval(expr, d))
+                out.append(row)
+            docs = out
+        elif name == '$unwind':
+            path = spec if isinstance(spec, str) else spec['path']
+            keep_empty = isinstance(spec, dict) and spec.get('preserveNullAndEmptyArrays')
+            field = path[1:]
+            out = []
+            for d in docs:
+                value = _first(d, field)
+                if isinstance(value, list) and value:
+                    for item in value:
+                        row = copy.deepcopy(d)
+                        _set_path(row, field, item)
+                        out.append(row)
+                elif keep_empty or (value is not None and not isinstance(value, list)):
+                    out.append(d)
+            docs = out
+        elif name == '$count':
+            docs = [{spec: len(docs)}] if docs else []
+        elif name == '$sortByCount':
+            docs = _run_pipeline(docs, [{'$group': {'_id': spec, 'count': {'$sum': 1}}},
+                                        {'$sort': {'count': -1}}])
+        elif name == '$facet':
+            docs = [{field: _run_pipeline(copy.deepcopy(docs), sub) for field, sub in spec.items()}]
+        else:
+            raise OperationFailure(f"Etapa de agregación no soportada en SQLite: {name}")
+    return docs
+
+
+# ---------------------------------------------------------------------------
+# Codificación de columnas indexadas
+# ---------------------------------------------------------------------------
+
+def _iso(value):
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    value = value.replace(microsecond=value.microsecond // 1000 * 1000)
+    return value.strftime('%Y-%m-%dT%H:%M:%S.%f')
+
+
+def _id_key(value):
+    if isinstance(value, ObjectId):
+        return 'o' + str(value)
+    if isinstance(value, str):
+        return 's' + value
+    if isinstance(value, bool):
+        return 'b' + str(int(value))
+    if isinstance(value, (int, float)):
+        return 'n' + repr(value)
+    return 'x' + bson.encode({'v': value}).hex()
+
+
+def _is_scalar(value):
+    return value is None or isinstance(value, (bool, int, float, str, datetime, ObjectId))
+
+
+# Valor SQL de un escalar; None si el valor no cabe en una columna
+def _sql_value(value):
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (int, float, str)):
+        return value
+    if isinstance(value, datetime):
+        return _iso(value)
+    if isinstance(value, ObjectId):
+        return str(value)
+    return None
+
+
+def _column_name(field):
+    digest = hashlib.md5(field.encode()).hexdigest()[:6]
+    return 'f_' + re.sub(r'\W', '_', field) + '_' + digest
+
+
+# Índices declarados sobre una colección (cacheado por versión de esquema)
+class _Schema:
+    def __init__(self, columns, multikey, indexes):
+        self.columns = columns          # campo -> columna
+        self.multikey = multikey        # campos con arreglos (sin pushdown)
+        self.indexes = indexes          # nombre -> spec
+
+    def column(self, field):
+        if field == '_id':
+            return 'id'
+        if field in self.multikey:
+            return None
+        return self.columns.get(field)
+
+    def ttl_fields(self):
+        return [(spec['key'][0][0], spec['expireAfterSeconds'])
+                for spec in self.indexes.values() if 'expireAfterSeconds' in spec]
+
+
+# ---------------------------------------------------------------------------
+# Cursores y colecciones
+# ---------------------------------------------------------------------------
+
+# Avisar a los observadores (db.listeners) la duración de cada operación de
+# colección; solo la más externa, así find_one -> find cuenta una vez
+def _observed(operation):
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            database = self.database
+            if not database.listeners:
+                return method(self, *args, **kwargs)
+            local = database._local
+            depth = getattr(local, 'op_depth', 0)
+            local.op_depth = depth + 1
+            start = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                local.op_depth = depth
+                if not depth:
+                    database._notify(self.name, operation, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+class SQLiteCursor:
+    def __init__(self, collection, query=None, projection=None, sort=None, limit=0, skip=0):
+        self._collection = collection
+        self._query = query or {}
+        self._projection = projection
+        self._sort = list(sort or [])
+        self._limit = limit
+        self._skip = skip
+        self._iterator = None
+
+    def sort(self, key_or_list, direction=None):
+        if isinstance(key_or_list, str):
+            self._sort = [(key_or_list, direction or 1)]
+        else:
+            self._sort = list(key_or_list)
+        return self
+
+    def limit(self, limit):
+        self._limit = limit
+        return self
+
+    def skip(self, skip):
+        self._skip = skip
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    def __iter__(self):
+        rows = self._collection._iter_find(self._query, self._projection, self._sort,
+                                           self._limit, self._skip)
+        database = self._collection.database
+        if database.listeners and not getattr(database._local, 'op_depth', 0):
+            return self._observed_iter(rows)
+        return rows
+
+    # Un find() recorrido fuera de otra operación: se mide el tiempo dentro del cursor
+    def _observed_iter(self, rows):
+        database = self._collection.database
+        elapsed = 0.0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    doc = next(rows)
+                except StopIteration:
+                    return
+                finally:
+                    elapsed += time.perf_counter() - start
+                yield doc
+        finally:
+            rows.close()
+            database._notify(self._collection.name, 'find', elapsed)
+
+    def __next__(self):
+        if self._iterator is None:
+            self._iterator = iter(self)
+        return next(self._iterator)
+
+    def close(self):
+        if self._iterator is not None:
+            self._iterator.close()
+
+    def explain(self):
+        return self._collection._explain(self._query, self._sort)
+
+
+class SQLiteCollection:
+    def __init__(self, database, name):
+        if not _NAME_RE.match(name):
+            raise OperationFailure(f"Nombre de colección inválido: {name}")
+        self.database = database
+        self.name = name
+        self.table = f'c_{name}'
+        self._last_purge = 0.0
+
+    def __repr__(self):
+        return f"SQLiteCollection({self.name!r})"
+
+    # -- planeación --------------------------------------------------------
+
+    def _schema(self):
+        return self.database._schema(self.name)
+
+    def _where(self, schema, query):
+        clauses, params = [], []
+        for key, cond in (query or {}).items():
+            sql = self._clause(schema, key, cond)
+            if sql:
+                clauses.append(sql[0])
+                params.extend(sql[1])
+        if not clauses:
+            return None
+        return ' AND '.join(clauses), params
+
+    # Traducción a SQL de una condición; siempre un superconjunto del filtro
+    def _clause(self, schema, key, cond):
+        if key == '$and':
+            parts = [self._where(schema, sub) for sub in cond]
+            parts = [p for p in parts if p]
+            if not parts:
+                return None
+            return ' AND '.join(f'({p[0]})' for p in parts), [v for p in parts for v in p[1]]
+        if key == '$or':
+            parts = [self._where(schema, sub) for sub in cond]
+            if not parts or any(p is None for p in parts):
+                return None
+            return '(' + ' OR '.join(f'({p[0]})' for p in parts) + ')', [v for p in parts for v in p[1]]
+        if key.startswith('$'):
+            return None
+        column = schema.column(key)
+        if column is None:
+            return None
+        encode = _id_key if key == '_id' else _sql_value
+
+        def equals(value):
+            if value is None:
+                return f'{column} IS NULL', []
+            return f'{column} = ?', [encode(value)]
+
+        if _is_operator_dict(cond):
+            clauses, params = [], []
+            for op, value in cond.items():
+                if op == '$eq' and _is_scalar(value):
+                    sql, args = equals(value)
+                elif op in _SQL_OPS and _is_scalar(value) and value is not None:
+                    sql, args = f'{column} {_SQL_OPS[op]} ?', [encode(value)]
+                elif op == '$in' and all(_is_scalar(v) for v in value):
+                    values = [v for v in value if v is not None]
+                    ors = []
+                    if values:
+                        ors.append(f"{column} IN ({', '.join('?' * len(values))})")
+                    if len(values) != len(value):
+                        ors.append(f'{column} IS NULL')
+                    if not ors:
+                        sql, args = '0', []
+                    else:
+                        sql, args = '(' + ' OR '.join(ors) + ')', [encode(v) for v in values]
+                else:
+                    continue
+                clauses.append(sql)
+                params.extend(args)
+            if not clauses:
+                return None
+            return ' AND '.join(clauses), params
+        if _is_scalar(cond):
+            return equals(cond)
+        return None
+
+    def _order_by(self, schema, sort):
+        columns = []
+        for field, direction in sort:
+            column = schema.column(field)
+            if column is None:
+                return None
+            columns.append(f"{column} {'DESC' if direction < 0 else 'ASC'}")
+        return ', '.join(columns)
+
+    def _candidates(self, conn, schema, query, order_by=None, extra=''):
+        where = self._where(schema, query)
+        sql = f'SELECT rowid, doc FROM "{self.table}"'
+        params = []
+        if where:
+            sql += ' WHERE ' + where[0]
+            params = where[1]
+        if order_by:
+            sql += ' ORDER BY ' + order_by
+        return conn.execute(sql + extra, params)
+
+    def _explain(self, query, sort):
+        schema = self._schema()
+        where = self._where(schema, query)
+        order_by = self._order_by(schema, sort) if sort else None
+        stages = {'stage': 'IXSCAN' if where or order_by else 'COLLSCAN'}
+        if sort and order_by is None:
+            stages = {'stage': 'SORT', 'inputStage': stages}
+        return {'queryPlanner': {'winningPlan': stages}}
+
+    # -- lectura -----------------------------------------------------------
+
+    def _iter_find(self, query, projection, sort, limit, skip):
+        self.database._purge_expired(self)
+        schema = self._schema()
+        conn = self.database._reader()
+        order_by = self._order_by(schema, sort) if sort else None
+        rows = self._candidates(conn, schema, query, order_by)
+        try:
+            if sort and order_by is None:
+                docs = [d for d in (bson.decode(r[1]) for r in rows) if _matches(d, query)]
+                docs = _sort_docs(docs, sort)
+                end = skip + limit if limit else None
+                for doc in docs[skip:end]:
+                    yield _project(doc, projection)
+                return
+            skipped = returned = 0
+            for _, blob in rows:
+                doc = bson.decode(blob)
+                if not _matches(doc, query):
+                    continue
+                if skipped < skip:
+                    skipped += 1
+                    continue
+                yield _project(doc, projection)
+                returned += 1
+                if limit and returned >= limit:
+                    return
+        finally:
+            rows.close()
+
+    def find(self, filter=None, projection=None, sort=None, limit=0, skip=0, **kwargs):
+        return SQLiteCursor(self, filter, projection, sort, limit, skip)
+
+    @_observed('find_one')
+    def find_one(self, filter=None, projection=None, sort=None, **kwargs):
+        if filter is not None and not isinstance(filter, dict):
+            filter = {'_id': filter}
+        cursor = iter(self.find(filter, projection, sort=sort, limit=1))
+        try:
+            return next(cursor, None)
+        finally:
+            cursor.close()
+
+    @_observed('count_documents')
+    def count_documents(self, filter=None, **kwargs):
+        if not filter:
+            return self.estimated_document_count()
+        return sum(1 for _ in self.find(filter, {'_id': 1}))
+
+    @_observed('estimated_document_count')
+    def estimated_document_count(self, **kwargs):
+        self.database._purge_expired(self)
+        self.database._schema(self.name)
+        return self.database._reader().execute(f'SELECT COUNT(*) FROM "{self.table}"').fetchone()[0]
+
+    @_observed('distinct')
+    def distinct(self, key, filter=None):
+        values = []
+        for doc in self.find(filter):
+            for value in _expand(_values(doc, key)):
+                if value is not _MISSING and not isinstance(value, list) \
+                        and not any(_eq(value, v) for v in values):
+                    values.append(value)
+        return values
+
+    @_observed('aggregate')
+    def aggregate(self, pipeline, **kwargs):
+        pipeline = list(pipeline)
+        query = {}
+        if pipeline and '$match' in pipeline[0]:
+            query = pipeline.pop(0)['$match']
+        return iter(_run_pipeline(list(self.find(query)), pipeline))
+
+    def watch(self, *args, **kwargs):
+        raise OperationFailure('Los change streams requieren MongoDB (replica set)')
+
+    # -- escritura ---------------------------------------------------------
+
+    def _row_values(self, schema, doc):
+        values = {'id': _id_key(doc['_id']), 'doc': bson.encode(doc)}
+        for field, column in schema.columns.items():
+            found = _values(doc, field)
+            value = found[0] if len(found) == 1 else _MISSING
+            if value is _MISSING and len(found) == 1:
+                values[column] = None
+            elif _is_scalar(value) and not isinstance(value, list):
+                values[column] = None if value is None else _sql_value(value)
+            else:
+                values[column] = None
+                if field not in schema.multikey:
+                    self.database._mark_multikey(self.name, field)
+        return values
+
+    def _write_row(self, conn, schema, doc, rowid=None):
+        values = self._row_values(schema, doc)
+        columns = list(values)
+        try:
+            if rowid is None:
+                conn.execute(
+                    f'INSERT INTO "{self.table}" ({", ".join(columns)}) '
+                    f'VALUES ({", ".join("?" * len(columns))})',
+                    [values[c] for c in columns])
+            else:
+                conn.execute(
+                    f'UPDATE "{self.table}" SET {", ".join(f"{c} = ?" for c in columns)} WHERE rowid = ?',
+                    [values[c] for c in columns] + [rowid])
+        except sqlite3.IntegrityError as e:
+            raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} ({e})", 11000)
+
+    def _insert(self, conn, schema, doc):
+        if '_id' not in doc:
+            doc['_id'] = ObjectId()
+        self._write_row(conn, schema, doc)
+        return doc['_id']
+
+    @_observed('insert_one')
+    def insert_one(self, document, **kwargs):
+        with self.database._transaction() as conn:
+            inserted_id = self._insert(conn, self._schema(), document)
+        return InsertOneResult(inserted_id, True)
+
+    @_observed('insert_many')
+    def insert_many(self, documents, ordered=True, **kwargs):
+        # Se recorre dos veces (insertar y devolver los _id): un generador se agotaría
+        documents = list(documents)
+        result = self.bulk_write([InsertOne(d) for d in documents], ordered=ordered)
+        return InsertManyResult([d['_id'] for d in documents if '_id' in d][:result.inserted_count], True)
+
+    def _matching_rows(self, conn, schema, query, sort=None, first=False):
+        order_by = self._order_by(schema, sort) if sort else None
+        rows = self._candidates(conn, schema, query, order_by)
+        try:
+            found = [(rowid, doc) for rowid, doc in ((r[0], bson.decode(r[1])) for r in rows)
+                     if _matches(doc, query)] if not first or (sort and order_by is None) else []
+            if first and not (sort and order_by is None):
+                for rowid, blob in rows:
+                    doc = bson.decode(blob)
+                    if _matches(doc, query):
+                        return [(rowid, doc)]
+                return []
+        finally:
+            rows.close()
+        if sort and order_by is None:
+            ordered = _sort_docs([doc for _, doc in found], sort)
+            by_id = {id(doc): rowid for rowid, doc in found}
+            found = [(by_id[id(doc)], doc) for doc in ordered]
+        return found[:1] if first else found
+
+    def _update(self, conn, query, update, upsert=False, multi=False, sort=None):
+        schema = self._schema()
+        matched = modified = 0
+        before_after = []
+        for rowid, doc in self._matching_rows(conn, schema, query, sort, first=not multi):
+            before = copy.deepcopy(doc)
+            after = _apply_update(doc, update)
+            matched += 1
+            if bson.encode(before) != bson.encode(after):
+                self._write_row(conn, schema, after, rowid)
+                modified += 1
+            before_after.append((before, after))
+        upserted_id = None
+        if not matched and upsert:
+            doc = _upsert_seed(query)
+            doc = _apply_update(doc, update, is_insert=True)
+            upserted_id = self._insert(conn, schema, doc)
+            before_after.append((None, doc))
+        return matched, modified, upserted_id, before_after
+
+    def _update_result(self, matched, modified, upserted_id):
+        raw = {'n': matched + (1 if upserted_id is not None else 0), 'nModified': modified}
+        if upserted_id is not None:
+            raw['upserted'] = upserted_id
+        return UpdateResult(raw, True)
+
+    @_observed('update_one')
+    def update_one(self, filter, update, upsert=False, **kwargs):
+        with self.database._transaction() as conn:
+            matched, modified, upserted_id, _ = self._update(conn, filter, update, upsert)
+        return self._update_result(matched, modified, upserted_id)
+
+    @_observed('update_many')
+    def update_many(self, filter, update, upsert=False, **kwargs):
+        with self.database._transaction() as conn:
+            matched, modified, upserted_id, _ = self._update(conn, filter, update, upsert, multi=True)
+        return self._update_result(matched, modified, upserted_id)
+
+    @_observed('replace_one')
+    def replace_one(self, filter, replacement, upsert=False, **kwargs):
+        return self.update_one(filter, replacement, upsert=upsert)
+
+    def _delete(self, conn, query, multi=False):
+        rows = self._matching_rows(conn, self._schema(), query, first=not multi)
+        for rowid, _ in rows:
+            conn.execute(f'DELETE FROM "{self.table}" WHERE rowid = ?', (rowid,))
+        return rows
+
+    @_observed('delete_one')
+    def delete_one(self, filter, **kwargs):
+        with self.database._transaction() as conn:
+            deleted = self._delete(conn, filter)
+        return DeleteResult({'n': len(deleted)}, True)
+
+    @_observed('delete_many')
+    def delete_many(self, filter, **kwargs):
+        with self.database._transaction() as conn:
+            deleted = self._delete(conn, filter, multi=True)
+        return DeleteResult({'n': len(deleted)}, True)
+
+    @_observed('find_one_and_update')
+    def find_one_and_update(self, filter, update, projection=None, sort=None, upsert=False,
+                            return_document=ReturnDocument.BEFORE, **kwargs):
+        with self.database._transaction() as conn:
+            _, _, _, changes = self._update(conn, filter, update, upsert, sort=sort)
+        if not changes:
+            return None
+        before, after = changes[0]
+        doc = after if return_document == ReturnDocument.AFTER else before
+        return _project(copy.deepcopy(doc), projection) if doc is not None else None
+
+    @_observed('find_one_and_delete')
+    def find_one_and_delete(self, filter, projection=None, sort=None, **kwargs):
+        with self.database._transaction() as conn:
+            schema = self._schema()
+            rows = self._matching_rows(conn, schema, filter, sort, first=True)
+            for rowid, _ in rows:
+                conn.execute(f'DELETE FROM "{self.table}" WHERE rowid = ?', (rowid,))
+        return _project(rows[0][1], projection) if rows else None
+
+    # Operaciones en lote dentro de una transacción de SQLite
+    @_observed('bulk_write')
+    def bulk_write(self, requests, ordered=True, **kwargs):
+        totals = {'nInserted': 0, 'nUpserted': 0, 'nMatched': 0, 'nModified': 0,
+                  'nRemoved': 0, 'upserted': [], 'writeErrors': []}
+        with self.database._transaction() as conn:
+            schema = self._schema()
+            for index, op in enumerate(requests):
+                try:
+                    conn.execute('SAVEPOINT op')
+                    if isinstance(op, InsertOne):
+                        self._insert(conn, schema, op._doc)
+                        totals['nInserted'] += 1
+                    elif isinstance(op, (UpdateOne, UpdateMany, ReplaceOne)):
+                        matched, modified, upserted_id, _ = self._update(
+                            conn, op._filter, op._doc, op._upsert, multi=isinstance(op, UpdateMany))
+                        totals['nMatched'] += matched
+                        totals['nModified'] += modified
+                        if upserted_id is not None:
+                            totals['nUpserted'] += 1
+                            totals['upserted'].append({'index': index, '_id': upserted_id})
+                    elif isinstance(op, (DeleteOne, DeleteMany)):
+                        totals['nRemoved'] += len(self._delete(conn, op._filter, isinstance(op, DeleteMany)))
+                    else:
+                        raise OperationFailure(f"Operación no soportada: {op!r}")
+                    conn.execute('RELEASE op')
+                except DuplicateKeyError as e:
+                    conn.execute('ROLLBACK TO op')
+                    conn.execute('RELEASE op')
+                    totals['writeErrors'].append({'index': index, 'code': 11000, 'errmsg': str(e), 'op': op})
+                    if ordered:
+                        break
+        if totals['writeErrors']:
+            raise BulkWriteError(totals)
+        return BulkWriteResult(totals, True)
+
+    # -- índices -----------------------------------------------------------
+
+    def create_index(self, keys, **kwargs):
+        if isinstance(keys, str):
+            keys = [(keys, 1)]
+        keys = [(k, d) for k, d in keys]
+        name = kwargs.get('name') or '_'.join(f'{k}_{d}' for k, d in keys)
+        spec = {'key': keys}
+        for option in ('unique', 'expireAfterSeconds', 'sparse'):
+            if option in kwargs:
+                spec[option] = kwargs[option]
+        self.database._create_index(self.name, name, spec)
+        return name
+
+    def create_indexes(self, indexes, **kwargs):
+        names = []
+        for model in indexes:
+            document = dict(model.document)
+            keys = list(document.pop('key').items())
+            names.append(self.create_index(keys, **document))
+        return names
+
+    def index_information(self):
+        info = {'_id_': {'key': [('_id', 1)]}}
+        for name, spec in self._schema().indexes.items():
+            info[name] = dict(spec, key=[tuple(k) for k in spec['key']])
+        return info
+
+    def drop_index(self, name):
+        self.database._drop_index(self.name, name)
+
+    def drop(self):
+        self.database.drop_collection(self.name)
+
+
+# ---------------------------------------------------------------------------
+# Base de datos
+# ---------------------------------------------------------------------------
+
+class SQLiteDatabase:
+    name = 'sqlite'
+
+    def __init__(self, path, event_listeners=None):
+        self.path = path
+        # Observadores con operation(collection, name, seconds), p. ej. profiling.QueryListener
+        self.listeners = list(event_listeners or [])
+        self._local = threading.local()
+        self._collections = {}
+        self._schemas = {}
+        self._schema_version = None
+        self._lock = threading.RLock()
+
+    # Conexiones por hilo y por proceso (seguro con fork de gunicorn)
+    def _connect(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA busy_timeout=30000')
+        return conn
+
+    def _connections(self):
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            local.reader = self._connect()
+            local.writer = self._connect()
+            local.depth = 0
+            local.pid = os.getpid()
+            self._bootstrap(local.writer)
+        return local
+
+    def _reader(self):
+        local = self._connections()
+        # Dentro de una transacción se lee con la misma conexión (lee lo propio)
+        return local.writer if local.depth else local.reader
+
+    @contextmanager
+    def _transaction(self):
+        local = self._connections()
+        conn = local.writer
+        if local.depth:
+            local.depth += 1
+            try:
+                yield conn
+            finally:
+                local.depth -= 1
+            return
+        conn.execute('BEGIN IMMEDIATE')
+        local.depth = 1
+        try:
+            yield conn
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            local.depth = 0
+
+    def _notify(self, collection, operation, seconds):
+        for listener in self.listeners:
+            try:
+                listener.operation(collection, operation, seconds)
+            except Exception:
+                pass
+
+    def _bootstrap(self, conn):
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS _collections (name TEXT PRIMARY KEY);
+            CREATE TABLE IF NOT EXISTS _fields (
+                collection TEXT, field TEXT, col TEXT, multikey INTEGER DEFAULT 0,
+                PRIMARY KEY (collection, field));
+            CREATE TABLE IF NOT EXISTS _indexes (
+                collection TEXT, name TEXT, spec TEXT, PRIMARY KEY (collection, name));
+            CREATE TABLE IF NOT EXISTS _meta (key TEXT PRIMARY KEY, value INTEGER);
+            INSERT OR IGNORE INTO _meta VALUES ('version', 0);
+        ''')
+
+    def _bump_version(self, conn):
+        conn.execute("UPDATE _meta SET value = value + 1 WHERE key = 'version'")
+
+    # Esquema de una colección; se recarga si otro proceso creó índices
+    def _schema(self, name):
+        conn = self._reader()
+        version = conn.execute("SELECT value FROM _meta WHERE key = 'version'").fetchone()[0]
+        with self._lock:
+            if version != self._schema_version:
+                self._schemas = {}
+                self._schema_version = version
+            schema = self._schemas.get(name)
+            if schema is not None:
+                return schema
+        exists = conn.execute('SELECT 1 FROM _collections WHERE name = ?', (name,)).fetchone()
+        if not exists:
+            with self._transaction() as wconn:
+                wconn.execute(f'CREATE TABLE IF NOT EXISTS "c_{name}" (id TEXT PRIMARY KEY, doc BLOB NOT NULL)')
+                wconn.execute('INSERT OR IGNORE INTO _collections VALUES (?)', (name,))
+                self._bump_version(wconn)
+            return self._schema(name)
+        columns, multikey, indexes = {}, set(), {}
+        for field, col, multi in conn.execute(
+                'SELECT field, col, multikey FROM _fields WHERE collection = ?', (name,)):
+            columns[field] = col
+            if multi:
+                multikey.add(field)
+        for index_name, spec in conn.execute(
+                'SELECT name, spec FROM _indexes WHERE collection = ?', (name,)):
+            indexes[index_name] = json.loads(spec)
+        schema = _Schema(columns, multikey, indexes)
+        with self._lock:
+            if version == self._schema_version:
+                self._schemas[name] = schema
+        return schema
+
+    def _mark_multikey(self, name, field):
+        conn = self._connections().writer
+        conn.execute('UPDATE _fields SET multikey = 1 WHERE collection = ? AND field = ?', (name, field))
+        self._bump_version(conn)
+
+    def _create_index(self, name, index_name, spec):
+        collection = self[name]
+        with self._transaction() as conn:
+            schema = self._schema(name)
+            existing = schema.indexes.get(index_name)
+            if existing is not None:
+                if existing != json.loads(json.dumps(spec)):
+                    raise OperationFailure(f"Ya existe el índice {index_name} con otras opciones", 85)
+                return
+            fields = [k for k, d in spec['key'] if d != 'text']
+            new_fields = [f for f in fields if f != '_id' and f not in schema.columns]
+            for field in new_fields:
+                column = _column_name(field)
+                conn.execute(f'ALTER TABLE "{collection.table}" ADD COLUMN {column}')
+                conn.execute('INSERT INTO _fields (collection, field, col) VALUES (?, ?, ?)',
+                             (name, field, column))
+                schema.columns[field] = column
+            if new_fields:
+                for rowid, blob in conn.execute(f'SELECT rowid, doc FROM "{collection.table}"').fetchall():
+                    collection._write_row(conn, schema, bson.decode(blob), rowid)
+            if fields:
+                columns = ', '.join(schema.column(f) or schema.columns[f] for f in fields)
+                unique = 'UNIQUE ' if spec.get('unique') else ''
+                try:
+                    conn.execute(f'CREATE {unique}INDEX IF NOT EXISTS "ix_{name}_{index_name}" '
+                                 f'ON "{collection.table}" ({columns})')
+                except sqlite3.IntegrityError as e:
+                    raise DuplicateKeyError(f"E11000 no se pudo crear {index_name}: {e}", 11000)
+            conn.execute('INSERT INTO _indexes VALUES (?, ?, ?)', (name, index_name, json.dumps(spec)))
+            self._bump_version(conn)
+
+    def _drop_index(self, name, index_name):
+        with self._transaction() as conn:
+            conn.execute(f'DROP INDEX IF EXISTS "ix_{name}_{index_name}"')
+            conn.execute('DELETE FROM _indexes WHERE collection = ? AND name = ?', (name, index_name))
+            self._bump_version(conn)
+
+    # Índices TTL: borrar documentos vencidos (a lo más una vez por segundo)
+    def _purge_expired(self, collection):
+        now = time.monotonic()
+        if now - collection._last_purge < TTL_PURGE_INTERVAL:
+            return
+        collection._last_purge = now
+        schema = self._schema(collection.name)
+        for field, seconds in schema.ttl_fields():
+            column = schema.column(field)
+            if column is None:
+                continue
+            cutoff = _iso(datetime.utcnow() - timedelta(seconds=seconds))
+            with self._transaction() as conn:
+                conn.execute(f'DELETE FROM "{collection.table}" WHERE {column} < ?', (cutoff,))
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self[name]
+
+    def __getitem__(self, name):
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._collections[name] = SQLiteCollection(self, name)
+        return collection
+
+    def list_collection_names(self):
+        return [row[0] for row in self._reader().execute('SELECT name FROM _collections')]
+
+    def drop_collection(self, name):
+        with self._transaction() as conn:
+            conn.execute(f'DROP TABLE IF EXISTS "c_{name}"')
+            conn.execute('DELETE FROM _collections WHERE name = ?', (name,))
+            conn.execute('DELETE FROM _fields WHERE collection = ?', (name,))
+            conn.execute('DELETE FROM _indexes WHERE collection = ?', (name,))
+            self._bump_version(conn)
+
+    def command(self, command, *args, **kwargs):
+        if command == 'ping':
+            return {'ok': 1.0}
+        raise OperationFailure(f"Comando no soportado en SQLite: {command}")
+
+    def stats(self):
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        return {
+            'backend': 'sqlite',
+            'path': self.path,
+            'size_bytes': size,
+            'collections': self.list_collection_names(),
+            'connected': getattr(self._local, 'pid', None) == os.getpid()
+        }
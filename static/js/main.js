@@ -20,6 +20,9 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // Configurar filtros de productos
     initProductFilters();
+
+    // Sugerencias del buscador
+    initSearchSuggestions();
 });
 
 /**
@@ -135,15 +138,129 @@ function initProductGallery() {
  * Filtros de productos
  */
 function initProductFilters() {
-    const categoryRadios = document.querySelectorAll('input[name="category"]');
-    
-    categoryRadios.forEach(radio => {
-        radio.addEventListener('change', function() {
-            // En una implementación real, aquí se filtrarían los productos
-            console.log('Categoría seleccionada:', this.value);
-            // showLoadingState();
-            // filterProducts(this.value);
+    const form = document.getElementById('product-filters');
+    if (!form) return;
+
+    // El filtrado lo hace el servidor: al cambiar la categoría o la
+    // disponibilidad se envía el formulario (GET) y se recarga el catálogo
+    form.querySelectorAll('input[name="category"], input[name="active"]').forEach(input => {
+        input.addEventListener('change', function() {
+            showLoadingState();
+            form.submit();
+        });
+    });
+
+    // No enviar parámetros vacíos (URLs limpias y cacheables)
+    form.addEventListener('submit', function() {
+        form.querySelectorAll('input').forEach(input => {
+            if ((input.type === 'number' || input.type === 'radio') && !input.value) {
+                input.disabled = true;
+            }
+        });
+    });
+}
+
+/**
+ * Sugerencias del buscador mientras se escribe
+ */
+function initSearchSuggestions() {
+    const input = document.querySelector('input[data-suggest-url]');
+    if (!input) return;
+
+    const list = document.createElement('div');
+    list.className = 'list-group position-absolute w-100 shadow-sm d-none';
+    list.style.top = '100%';
+    list.style.zIndex = 1050;
+    input.form.appendChild(list);
+
+    let timer = null;
+    let controller = null;
+    let active = -1;
+
+    function hide() {
+        list.classList.add('d-none');
+        list.innerHTML = '';
+        active = -1;
+    }
+
+    function render(data) {
+        list.innerHTML = '';
+        active = -1;
+        data.categories.forEach(cat => {
+            const item = document.createElement('a');
+            item.className = 'list-group-item list-group-item-action';
+            item.href = cat.url;
+            item.innerHTML = '<i class="bi bi-tag me-2"></i>';
+            item.append(cat.label + ' ');
+            const count = document.createElement('span');
+            count.className = 'text-muted small';
+            count.textContent = `(${cat.count})`;
+            item.appendChild(count);
+            list.appendChild(item);
+        });
+        data.products.forEach(prod => {
+            const item = document.createElement('a');
+            item.className = 'list-group-item list-group-item-action d-flex justify-content-between';
+            item.href = prod.url;
+            const name = document.createElement('span');
+            name.textContent = prod.name;
+            item.appendChild(name);
+            if (prod.price != null) {
+                const price = document.createElement('span');
+                price.className = 'text-muted small';
+                price.textContent = formatPrice(prod.price);
+                item.appendChild(price);
+            }
+            list.appendChild(item);
         });
+        list.classList.toggle('d-none', !list.children.length);
+    }
+
+    function fetchSuggestions() {
+        const query = input.value.trim();
+        if (!query) {
+            hide();
+            return;
+        }
+        // Cancelar la petición anterior si aún no respondió
+        if (controller) controller.abort();
+        controller = new AbortController();
+        fetch(`${input.dataset.suggestUrl}?q=${encodeURIComponent(query)}`, { signal: controller.signal })
+            .then(response => response.json())
+            .then(data => {
+                if (data.query === input.value.trim()) render(data);
+            })
+            .catch(error => {
+                if (error.name !== 'AbortError') hide();
+            });
+    }
+
+    // Esperar a que el usuario deje de escribir (debounce) antes de consultar
+    input.addEventListener('input', function() {
+        clearTimeout(timer);
+        timer = setTimeout(fetchSuggestions, 150);
+    });
+
+    // Navegación con teclado
+    input.addEventListener('keydown', function(e) {
+        const items = list.querySelectorAll('a');
+        if (!items.length) return;
+        if (e.key === 'ArrowDown' || e.key === 'ArrowUp') {
+            e.preventDefault();
+            if (active >= 0) items[active].classList.remove('active');
+            active = (active + (e.key === 'ArrowDown' ? 1 : -1) + items.length) % items.length;
+            items[active].classList.add('active');
+        } else if (e.key === 'Enter' && active >= 0) {
+            e.preventDefault();
+            window.location = items[active].href;
+        } else if (e.key === 'Escape') {
+            hide();
+        }
+    });
+
+    input.addEventListener('blur', function() {
+        // Dejar que el clic en una sugerencia se procese antes de ocultarla
+        setTimeout(hide, 200);
     });
 }
 
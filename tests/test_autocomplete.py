@@ -0,0 +1,30 @@
+# tests/test_autocomplete.py - Índice de sugerencias del buscador
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from autocomplete import SuggestionIndex
+from sqlite_store import SQLiteDatabase
+
+
+def test_rebuild_twice_then_empty_category(tmp_path):
+    db = SQLiteDatabase(str(tmp_path / 'farmacia.db'))
+    db.products.insert_many([
+        {'name': 'Paracetamol 500mg', 'price': 20.0, 'category': 'analgesicos'},
+        {'name': 'Ibuprofeno 400mg', 'price': 35.0, 'category': 'analgesicos'},
+        {'name': 'Vitamina C', 'price': 50.0, 'category': 'vitaminas'},
+    ])
+    index = SuggestionIndex(db)
+    index.rebuild()
+    index.rebuild()
+    assert len(index._category_keys) == 2
+
+    vitamin = db.products.find_one({'category': 'vitaminas'})
+    db.products.delete_one({'_id': vitamin['_id']})
+    index.refresh_product(str(vitamin['_id']))
+
+    assert index.suggest('vit') == {'categories': [], 'products': []}
+    analgesics = index.suggest('analg')['categories']
+    assert [c['category'] for c in analgesics] == ['analgesicos']
+    assert analgesics[0]['count'] == 2
@@ -0,0 +1,79 @@
+# uploads.py - Recepción de archivos subidos por bloques, con tope de tamaño y firma
+import hashlib
+import os
+import tempfile
+from collections import namedtuple
+
+CHUNK_SIZE = 64 * 1024
+
+# Firmas (magic bytes) por extensión permitida
+SIGNATURES = {
+    'png': (b'\x89PNG\r\n\x1a\n',),
+    'jpg': (b'\xff\xd8\xff',),
+    'jpeg': (b'\xff\xd8\xff',),
+    'gif': (b'GIF87a', b'GIF89a'),
+    'webp': (b'RIFF',),
+    'pdf': (b'%PDF-',),
+}
+
+# Archivo ya recibido en un temporal: ruta, tamaño, SHA-256 y extensión
+ReceivedFile = namedtuple('ReceivedFile', 'path size sha256 ext')
+
+
+class UploadError(ValueError):
+    pass
+
+
+def extension(filename):
+    return filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+
+
+def _check_signature(ext, head):
+    signatures = SIGNATURES.get(ext)
+    if not signatures or not any(head.startswith(sig) for sig in signatures):
+        return False
+    if ext == 'webp':
+        return head[8:12] == b'WEBP'
+    return True
+
+
+# Copiar el archivo subido a un temporal dentro de `folder` en bloques de
+# CHUNK_SIZE: memoria constante, rechazo en cuanto se pasa de max_bytes o la
+# firma no corresponde a la extensión, y SHA-256 calculado al vuelo. El que
+# llama mueve el temporal a su lugar (os.replace, atómico) o lo descarta
+def receive_upload(file, folder, max_bytes, allowed):
+    ext = extension(file.filename or '')
+    if ext not in allowed:
+        raise UploadError(f"Tipo de archivo no permitido. Use {', '.join(sorted(e.upper() for e in allowed))}")
+    # El navegador suele declarar el tamaño de la parte; rechazar sin leerla
+    if file.content_length and file.content_length > max_bytes:
+        raise UploadError(f"El archivo supera el máximo de {max_bytes // (1024 * 1024)}MB")
+
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix='.upload-')
+    sha = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            head = file.stream.read(CHUNK_SIZE)
+            if not _check_signature(ext, head):
+                raise UploadError('El contenido del archivo no corresponde a su extensión')
+            chunk = head
+            while chunk:
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadError(f"El archivo supera el máximo de {max_bytes // (1024 * 1024)}MB")
+                sha.update(chunk)
+                out.write(chunk)
+                chunk = file.stream.read(CHUNK_SIZE)
+            out.flush()
+            os.fsync(out.fileno())
+    except BaseException:
+        discard(tmp_path)
+        raise
+    return ReceivedFile(tmp_path, size, sha.hexdigest(), 'jpg' if ext == 'jpeg' else ext)
+
+
+def discard(path):
+    if path and os.path.exists(path):
+        os.remove(path)